@@ -0,0 +1 @@
+"""Benchmarks package - load/latency tooling (not imported by the app)"""
@@ -0,0 +1,155 @@
+"""
+BM25 benchmark - build, query and incremental update costs of the embedded BM25 index
+Indexes a synthetic PT/EN corpus with a Zipfian vocabulary (100k chunks by default)
+and reports query latency for the NumPy and pure Python scoring paths.
+
+Run (from backend/):
+    python -m benchmarks.bm25_bench
+    python -m benchmarks.bm25_bench --chunks 20000 --queries 500 --json
+"""
+import json
+import time
+import random
+import argparse
+import statistics
+import resource
+from itertools import accumulate
+from typing import Dict, Any, List, Optional
+
+from services import bm25_index
+from services.bm25_index import BM25Index
+
+# Frequent domain words first - they get the heaviest Zipf weights
+SEED_WORDS = """
+marketing digital produto produtos campanha campanhas email emails vendas cliente clientes
+conversão conversões oferta ofertas desconto promoção promoções curso cursos ebook template templates
+landing página páginas anúncio anúncios criativo criativos público estratégia estratégias
+fitness receitas finanças produtividade negócio negócios lançamento funil tráfego orgânico
+launch strategy strategies audience conversion conversions offer offers sales funnel traffic
+content creator creators newsletter checklist guide guides course courses growth brand
+""".split()
+FILLER = "de para com em o a os as que um uma the and of to for with".split()
+
+
+def build_vocabulary(size: int, rng: random.Random) -> List[str]:
+    syllables = ["ma", "ke", "ti", "ng", "pro", "du", "to", "ven", "da", "cli", "en", "te", "ca",
+                 "pa", "nha", "str", "at", "egy", "con", "ver", "sao", "of", "fer", "gro", "wth"]
+    vocabulary = list(SEED_WORDS)
+    seen = set(vocabulary)
+    while len(vocabulary) < size:
+        word = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+
+def build_corpus(chunks: int, words_per_chunk: int, vocabulary_size: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = build_vocabulary(vocabulary_size, rng)
+    cum_weights = list(accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+    words = rng.choices(vocabulary, cum_weights=cum_weights, k=chunks * words_per_chunk)
+    corpus = []
+    for i in range(chunks):
+        chunk = words[i * words_per_chunk:(i + 1) * words_per_chunk]
+        # Sprinkle stopwords so the analyzer has something to drop
+        for j in range(0, len(chunk), 4):
+            chunk[j] = rng.choice(FILLER)
+        corpus.append(" ".join(chunk))
+    return corpus
+
+
+def build_queries(count: int, vocabulary_size: int, seed: int = 11) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = build_vocabulary(vocabulary_size, random.Random(7))
+    # Mostly mid-frequency terms, like real queries ("estratégias email lançamento curso")
+    return [" ".join(rng.choice(vocabulary[:2000]) for _ in range(rng.randint(2, 5))) for _ in range(count)]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))]
+    return {"mean_ms": round(statistics.fmean(samples) * 1000, 3), "p50_ms": round(pick(0.50) * 1000, 3),
+            "p95_ms": round(pick(0.95) * 1000, 3), "p99_ms": round(pick(0.99) * 1000, 3)}
+
+
+def bench_queries(index: BM25Index, queries: List[str], top_k: int, use_numpy: bool) -> Dict[str, float]:
+    for query in queries[:20]:
+        index.search(query, top_k, use_numpy=use_numpy)
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, top_k, use_numpy=use_numpy)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the embedded BM25 index")
+    parser.add_argument("--chunks", type=int, default=100_000, help="Chunks to index")
+    parser.add_argument("--words", type=int, default=80, help="Words per chunk")
+    parser.add_argument("--vocabulary", type=int, default=30_000, help="Distinct words in the corpus")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries per scoring path")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.chunks, args.words, args.vocabulary)
+    queries = build_queries(args.queries, args.vocabulary)
+    ids = [f"chunk_{i}" for i in range(len(corpus))]
+    docs = [{"content": text, "source": f"bench/{i // 20}.md", "metadata": {}} for i, text in enumerate(corpus)]
+
+    # Peak RSS growth; the corpus already exists, so this is postings + bookkeeping + chunk dicts
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = BM25Index()
+    started = time.perf_counter()
+    index.add(ids, docs)
+    build_seconds = time.perf_counter() - started
+    index_bytes = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    status = index.get_status()
+
+    results: Dict[str, Any] = {
+        "chunks": args.chunks,
+        "build_seconds": round(build_seconds, 2),
+        "chunks_per_second": round(args.chunks / build_seconds),
+        "terms": status["terms"],
+        "postings": status["postings"],
+        "postings_mb": round(status["postings_bytes"] / 1e6, 1),
+        "index_rss_mb": round(index_bytes / 1e6, 1),
+        "query": {}
+    }
+    if bm25_index.np is not None:
+        results["query"]["numpy"] = bench_queries(index, queries, args.top_k, use_numpy=True)
+    results["query"]["python"] = bench_queries(index, queries, args.top_k, use_numpy=False)
+
+    # Incremental updates: re-save existing chunks (replace) and delete some
+    updates = [(f"chunk_{i}", {"content": corpus[(i * 7) % len(corpus)], "source": "bench/updated.md",
+                               "metadata": {}}) for i in range(200)]
+    started = time.perf_counter()
+    for doc_id, doc in updates:
+        index.add([doc_id], [doc])
+    results["update_ms_per_doc"] = round((time.perf_counter() - started) / len(updates) * 1000, 3)
+    started = time.perf_counter()
+    index.delete([f"chunk_{i}" for i in range(200, 400)])
+    results["delete_ms_per_doc"] = round((time.perf_counter() - started) / 200 * 1000, 3)
+    started = time.perf_counter()
+    index.compact()
+    results["compact_seconds"] = round(time.perf_counter() - started, 2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"Indexed {results['chunks']} chunks in {results['build_seconds']}s "
+          f"({results['chunks_per_second']}/s): {results['terms']} terms, {results['postings']} postings "
+          f"({results['postings_mb']} MB), RSS +{results['index_rss_mb']} MB")
+    print(f"\n{'scoring':<10}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for path, stats in results["query"].items():
+        print(f"{path:<10}" + "".join(f"{stats[key]:>8.2f}ms" for key in ("mean_ms", "p50_ms", "p95_ms", "p99_ms")))
+    print(f"\nUpdate {results['update_ms_per_doc']}ms/doc, delete {results['delete_ms_per_doc']}ms/doc, "
+          f"full compaction {results['compact_seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,313 @@
+"""
+LLM Stand-in Server
+Deterministic OpenAI-compatible server with realistic latency for load testing
+
+Point the backend at it with:
+    LLM_PROVIDER=local_llm LOCAL_LLM_BASE_URL=http://localhost:5002
+
+Run:
+    python -m benchmarks.llm_standin --port 5002 --ttft-ms 400 --tokens-per-sec 40 --error-rate 0.01
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from typing import Dict, Any, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+STANDIN_TTFT_MS = float(os.environ.get('STANDIN_TTFT_MS', '300'))             # time to first token
+STANDIN_TOKENS_PER_SEC = float(os.environ.get('STANDIN_TOKENS_PER_SEC', '50'))  # decode speed (0 = instant)
+STANDIN_JITTER = float(os.environ.get('STANDIN_JITTER', '0.1'))               # +/- fraction applied to delays
+STANDIN_ERROR_RATE = float(os.environ.get('STANDIN_ERROR_RATE', '0'))         # fraction of requests that fail
+STANDIN_ERROR_STATUS = int(os.environ.get('STANDIN_ERROR_STATUS', '500'))
+STANDIN_SEED = int(os.environ.get('STANDIN_SEED', '42'))
+STANDIN_MODEL = os.environ.get('STANDIN_MODEL', 'local-model')
+
+
+class StandinConfig:
+    """Runtime knobs; mutable so benchmarks can reconfigure via /standin/config"""
+
+    def __init__(self):
+        self.ttft_ms = STANDIN_TTFT_MS
+        self.tokens_per_sec = STANDIN_TOKENS_PER_SEC
+        self.jitter = STANDIN_JITTER
+        self.error_rate = STANDIN_ERROR_RATE
+        self.error_status = STANDIN_ERROR_STATUS
+        self.seed = STANDIN_SEED
+        self.model = STANDIN_MODEL
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+config = StandinConfig()
+_rng = random.Random(config.seed)
+_stats = {"requests": 0, "errors": 0, "completion_tokens": 0}
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+INSTRUCTION_PATTERN = re.compile(r"^Cria\b", re.MULTILINE)  # first line of every backend instruction
+
+# ==================== CONTENT ====================
+
+def _instruction(prompt: str) -> str:
+    """The backend's request without the retrieved context prepended to it (starts at the last 'Cria' line)"""
+    starts = [match.start() for match in INSTRUCTION_PATTERN.finditer(prompt)]
+    return prompt[starts[-1]:] if starts else prompt
+
+
+def _field(prompt: str, label: str, default: str) -> str:
+    """Extract a '- Label: value' line from a CampaignBuilder prompt"""
+    match = re.search(rf"-\s*{label}:\s*(.+)", prompt)
+    return match.group(1).strip() if match else default
+
+
+def _landing(product: str, offer: str) -> Dict[str, Any]:
+    return {
+        "headline": f"Transforma resultados com {product}",
+        "subheadline": f"{offer} - tudo o que precisas para começar hoje, sem complicações.",
+        "hero_text": f"{product} foi criado para quem quer resultados reais. Método testado, passo a passo.",
+        "bullets": [f"Benefício {i} de {product}" for i in range(1, 6)],
+        "social_proof": "Mais de 1.000 clientes satisfeitos",
+        "cta_primary": "Quero começar agora",
+        "cta_secondary": "Saber mais",
+        "urgency": "Oferta válida apenas esta semana",
+        "guarantee": "Garantia de 30 dias ou o teu dinheiro de volta",
+        "faq": [{"q": f"Pergunta {i} sobre {product}?", "a": f"Resposta {i}."} for i in range(1, 4)]
+    }
+
+
+def _ads(product: str) -> List[Dict[str, str]]:
+    styles = ["curiosidade", "dor", "benefício", "prova social", "urgência"]
+    return [
+        {
+            "hook": f"Ainda não conheces {product}?",
+            "body": f"Descobre como {product} resolve o teu problema ({style}). Resultados em poucos dias.",
+            "cta": "Clica e descobre",
+            "style": style
+        }
+        for style in styles
+    ]
+
+
+def _creatives(product: str) -> List[Dict[str, str]]:
+    formats = ["carrossel", "vídeo curto", "imagem única", "stories", "reels"]
+    return [
+        {
+            "concept": f"Conceito {i} para {product}",
+            "visual_description": f"Pessoa a usar {product} num ambiente real, luz natural.",
+            "text_overlay": f"{product}: resultado {i}",
+            "format": fmt
+        }
+        for i, fmt in enumerate(formats, 1)
+    ]
+
+
+def _emails(product: str, offer: str) -> List[Dict[str, Any]]:
+    purposes = ["Boas-vindas", "Educação", "Solução", "Prova social", "Última chamada"]
+    return [
+        {
+            "day": day,
+            "purpose": purpose,
+            "subject_line": f"{purpose}: {product}",
+            "preview_text": f"{offer}",
+            "body": "\n\n".join(f"Parágrafo {p} sobre {product}." for p in range(1, 4)),
+            "cta": "Ver oferta"
+        }
+        for day, purpose in enumerate(purposes, 1)
+    ]
+
+
+def _checklist() -> List[Dict[str, Any]]:
+    priorities = ["alta", "média", "baixa"]
+    return [
+        {
+            "step": step,
+            "task": f"Tarefa {step}",
+            "details": f"Detalhes da tarefa {step}",
+            "priority": priorities[step % 3]
+        }
+        for step in range(1, 13)
+    ]
+
+
+def build_content(prompt: str, json_mode: bool = False) -> str:
+    """Return a deterministic response matching what the backend expects for this prompt"""
+    instruction = _instruction(prompt)  # keywords in retrieved documents must not pick the response shape
+    product = _field(instruction, "Produto", "o produto")
+    offer = _field(instruction, "Oferta", "Oferta especial")
+    lowered = instruction.lower()
+
+    if "landing page" in lowered:
+        data: Any = _landing(product, offer)
+    elif "variações de anúncios" in lowered:
+        data = _ads(product)
+    elif "ideias de criativos" in lowered:
+        data = _creatives(product)
+    elif "sequência de 5 emails" in lowered:
+        data = _emails(product, offer)
+    elif "checklist" in lowered:
+        data = _checklist()
+    elif json_mode:
+        data = {"content": f"Resposta para: {prompt[:80]}"}
+    else:
+        sections = "\n\n".join(
+            f"## Secção {i}\n\n" + " ".join(f"Conteúdo detalhado {j} da secção {i}." for j in range(1, 12))
+            for i in range(1, 6)
+        )
+        return f"# Guia Completo\n\n## Introdução\n\nIntrodução ao tema.\n\n{sections}\n\n## Conclusão\n\nComeça hoje!"
+
+    # Wrapped in a fence like real models often do; _parse_json_response strips it
+    return f"```json\n{json.dumps(data, ensure_ascii=False, indent=2)}\n```"
+
+
+def tokenize(text: str) -> List[str]:
+    """Whitespace-preserving pseudo-tokens (joined back they equal the input)"""
+    return TOKEN_PATTERN.findall(text)
+
+# ==================== SERVER ====================
+
+app = FastAPI(title="LLM Stand-in")
+
+
+def _jittered(seconds: float) -> float:
+    if config.jitter <= 0:
+        return seconds
+    return max(0.0, seconds * (1 + _rng.uniform(-config.jitter, config.jitter)))
+
+
+def _token_delay() -> float:
+    return 1.0 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": config.model, "object": "model", "owned_by": "standin"}]}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/standin/config")
+async def get_config():
+    return {**config.to_dict(), "stats": _stats}
+
+
+@app.post("/standin/config")
+async def update_config(request: Request):
+    global _rng
+    updates = await request.json()
+    for key, value in updates.items():
+        if hasattr(config, key):
+            setattr(config, key, type(getattr(config, key))(value))
+    if "seed" in updates:
+        _rng = random.Random(config.seed)
+    return config.to_dict()
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    _stats["requests"] += 1
+    request_id = f"chatcmpl-{_stats['requests']:08d}"
+    created = int(time.time())
+
+    if _rng.random() < config.error_rate:
+        _stats["errors"] += 1
+        await asyncio.sleep(_jittered(config.ttft_ms / 1000))
+        return JSONResponse(
+            status_code=config.error_status,
+            content={"error": {"message": "Injected failure", "type": "standin_error"}}
+        )
+
+    messages = body.get("messages", [])
+    prompt = _prompt_text(messages)
+    json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+    tokens = tokenize(build_content(prompt, json_mode))
+
+    max_tokens = body.get("max_tokens")
+    billed = min(len(tokens), max_tokens) if max_tokens else len(tokens)
+    _stats["completion_tokens"] += billed
+    usage = {
+        "prompt_tokens": len(tokenize(prompt)),
+        "completion_tokens": billed,
+        "total_tokens": len(tokenize(prompt)) + billed
+    }
+
+    if body.get("stream"):
+        async def event_stream():
+            await asyncio.sleep(_jittered(config.ttft_ms / 1000))
+            delay = _token_delay()
+            for i, token in enumerate(tokens):
+                if i and delay:
+                    await asyncio.sleep(_jittered(delay))
+                chunk = {
+                    "id": request_id, "object": "chat.completion.chunk", "created": created, "model": config.model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            final = {
+                "id": request_id, "object": "chat.completion.chunk", "created": created, "model": config.model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    await asyncio.sleep(_jittered(config.ttft_ms / 1000 + billed * _token_delay()))
+    return {
+        "id": request_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": config.model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": "stop"
+        }],
+        "usage": usage
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Deterministic OpenAI-compatible LLM stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--ttft-ms", type=float, default=config.ttft_ms)
+    parser.add_argument("--tokens-per-sec", type=float, default=config.tokens_per_sec)
+    parser.add_argument("--jitter", type=float, default=config.jitter)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--error-status", type=int, default=config.error_status)
+    parser.add_argument("--seed", type=int, default=config.seed)
+    args = parser.parse_args(argv)
+
+    global _rng
+    config.ttft_ms = args.ttft_ms
+    config.tokens_per_sec = args.tokens_per_sec
+    config.jitter = args.jitter
+    config.error_rate = args.error_rate
+    config.error_status = args.error_status
+    config.seed = args.seed
+    _rng = random.Random(config.seed)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+End-to-end Load Benchmark
+Boots the API against a local MongoDB and the mock/stand-in LLM, drives a
+weighted mix of realistic requests and reports per-route latency as JSON.
+
+Run (from backend/):
+    python -m benchmarks.load_test --llm standin --concurrency 20 --duration 60 --output bench.json
+
+Against an already running deployment:
+    python -m benchmarks.load_test --base-url http://localhost:8001 --mongo-url mongodb://localhost:27017 --db-name noxloop
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import logging
+from pathlib import Path
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logger = logging.getLogger("load_test")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Scenario weights (relative); override with --mix "catalog=40,generate_product=1"
+DEFAULT_MIX = {
+    "login": 5,
+    "me": 10,
+    "catalog": 25,
+    "product_page": 15,
+    "list_products": 15,
+    "list_campaigns": 10,
+    "generate_product": 2,
+    "generate_campaign": 1,
+    "export": 5,
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Collects latency samples per route template"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    async def call(self, client: httpx.AsyncClient, method: str, route: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        label = f"{method} {route}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            if self.recording:
+                self.errors[label] += 1
+            logger.debug(f"{label} failed: {e}")
+            return None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if self.recording:
+            self.samples[label].append(elapsed_ms)
+            self.statuses[label][response.status_code] += 1
+            if response.status_code >= 400:
+                self.errors[label] += 1
+        return response
+
+    def report(self, duration: float) -> Dict[str, Any]:
+        routes = {}
+        total = 0
+        for label in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples.get(label, []))
+            count = len(values)
+            total += count
+            routes[label] = {
+                "count": count,
+                "errors": self.errors.get(label, 0),
+                "throughput_rps": round(count / duration, 2) if duration else 0,
+                "mean_ms": round(sum(values) / count, 2) if count else 0,
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(values[-1], 2) if values else 0,
+                "status_codes": {str(k): v for k, v in sorted(self.statuses[label].items())}
+            }
+        return {
+            "total_requests": total,
+            "total_errors": sum(self.errors.values()),
+            "throughput_rps": round(total / duration, 2) if duration else 0,
+            "routes": routes
+        }
+
+
+class BenchUser:
+    def __init__(self, email: str, password: str, token: str, workspace_id: str):
+        self.email = email
+        self.password = password
+        self.token = token
+        self.workspace_id = workspace_id
+        self.campaign_ids: List[str] = []
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.base_url = args.base_url.rstrip("/") if args.base_url else f"http://127.0.0.1:{args.app_port}"
+        self.recorder = Recorder()
+        self.rng = random.Random(args.seed)
+        self.users: List[BenchUser] = []
+        self.slugs: List[str] = []
+        self.processes: List[subprocess.Popen] = []
+        self.mix = parse_mix(args.mix)
+
+    # ==================== ENVIRONMENT ====================
+
+    def _spawn(self, cmd: List[str], env: Dict[str, str]) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            cmd, cwd=str(BACKEND_DIR), env={**os.environ, **env},
+            stdout=subprocess.DEVNULL if not self.args.verbose else None,
+            stderr=subprocess.DEVNULL if not self.args.verbose else None
+        )
+        self.processes.append(proc)
+        return proc
+
+    async def _wait_for(self, url: str, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            while time.monotonic() < deadline:
+                try:
+                    if (await client.get(url)).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.25)
+        raise RuntimeError(f"Timed out waiting for {url}")
+
+    async def boot(self):
+        """Start the stand-in LLM and the API unless --base-url points elsewhere"""
+        if self.args.base_url:
+            return
+
+        env = {
+            "MONGO_URL": self.args.mongo_url,
+            "DB_NAME": self.args.db_name,
+            "JWT_SECRET_KEY": "load-test-secret",
+            "RATE_LIMIT_ENABLED": "false",
+            "MAX_CREDITS_PER_DAY": "1000000000",
+            "MAX_GENERATIONS_PER_HOUR": "1000000000",
+            "UPLOAD_DIR": tempfile.mkdtemp(prefix="noxloop_bench_uploads_"),
+            "EXPORT_CACHE_DIR": tempfile.mkdtemp(prefix="noxloop_bench_export_cache_"),
+            "WORKSPACE_EXPORT_DIR": tempfile.mkdtemp(prefix="noxloop_bench_workspace_exports_"),
+            "LLM_PROVIDER": "mock",
+        }
+
+        if self.args.llm == "standin":
+            self._spawn([
+                sys.executable, "-m", "benchmarks.llm_standin",
+                "--port", str(self.args.standin_port),
+                "--ttft-ms", str(self.args.ttft_ms),
+                "--tokens-per-sec", str(self.args.tokens_per_sec),
+                "--error-rate", str(self.args.llm_error_rate),
+                "--seed", str(self.args.seed),
+            ], {})
+            await self._wait_for(f"http://127.0.0.1:{self.args.standin_port}/v1/models")
+            env["LLM_PROVIDER"] = "local_llm"
+            env["LOCAL_LLM_BASE_URL"] = f"http://127.0.0.1:{self.args.standin_port}"
+
+        self._spawn([
+            sys.executable, "-m", "uvicorn", "server:app",
+            "--host", "127.0.0.1", "--port", str(self.args.app_port),
+            "--workers", str(self.args.workers), "--log-level", "warning",
+        ], env)
+        await self._wait_for(f"{self.base_url}/api/status")
+
+    def shutdown(self):
+        for proc in reversed(self.processes):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    # ==================== SEEDING ====================
+
+    async def seed(self, client: httpx.AsyncClient):
+        """Create users with ample credits, published products and campaigns to export"""
+        run_id = f"{int(time.time())}{self.rng.randint(0, 9999):04d}"
+        for i in range(self.args.users):
+            email = f"bench_{run_id}_{i}@loadtest.local"
+            password = "bench-password-123"
+            response = await client.post(f"{self.base_url}/api/auth/register", json={
+                "email": email, "password": password, "name": f"Bench User {i}"
+            })
+            response.raise_for_status()
+            data = response.json()
+            self.users.append(BenchUser(email, password, data["token"], data["default_workspace_id"]))
+
+        mongo = AsyncIOMotorClient(self.args.mongo_url)
+        try:
+            await mongo[self.args.db_name].workspaces.update_many(
+                {"workspace_id": {"$in": [u.workspace_id for u in self.users]}},
+                {"$set": {"credits": 10 ** 9}}
+            )
+        finally:
+            mongo.close()
+
+        for i, user in enumerate(self.users[:self.args.seed_products]):
+            response = await client.post(
+                f"{self.base_url}/api/workspaces/{user.workspace_id}/products/generate",
+                headers=user.headers, json=product_payload(i)
+            )
+            response.raise_for_status()
+            product_id = response.json()["product_id"]
+            response = await client.put(
+                f"{self.base_url}/api/workspaces/{user.workspace_id}/products/{product_id}",
+                headers=user.headers, json={"status": "published", "price": 9.99}
+            )
+            response.raise_for_status()
+            self.slugs.append(response.json()["slug"])
+
+        for i, user in enumerate(self.users[:self.args.seed_campaigns]):
+            response = await client.post(
+                f"{self.base_url}/api/workspaces/{user.workspace_id}/campaigns/generate",
+                headers=user.headers, json=campaign_payload(i)
+            )
+            response.raise_for_status()
+            user.campaign_ids.append(response.json()["campaign_id"])
+
+    async def cleanup(self):
+        if self.args.keep_db or self.args.base_url:
+            return
+        mongo = AsyncIOMotorClient(self.args.mongo_url)
+        try:
+            await mongo.drop_database(self.args.db_name)
+        finally:
+            mongo.close()
+
+    # ==================== SCENARIOS ====================
+
+    async def s_login(self, client: httpx.AsyncClient, user: BenchUser):
+        await self.recorder.call(client, "POST", "/api/auth/login", f"{self.base_url}/api/auth/login",
+                                 json={"email": user.email, "password": user.password})
+
+    async def s_me(self, client, user):
+        await self.recorder.call(client, "GET", "/api/auth/me", f"{self.base_url}/api/auth/me", headers=user.headers)
+
+    async def s_catalog(self, client, user):
+        await self.recorder.call(client, "GET", "/api/public/products", f"{self.base_url}/api/public/products",
+                                 params={"limit": 20})
+
+    async def s_product_page(self, client, user):
+        if not self.slugs:
+            return await self.s_catalog(client, user)
+        slug = self.rng.choice(self.slugs)
+        await self.recorder.call(client, "GET", "/api/public/product/slug/{slug}",
+                                 f"{self.base_url}/api/public/product/slug/{slug}")
+
+    async def s_list_products(self, client, user):
+        await self.recorder.call(client, "GET", "/api/workspaces/{workspace_id}/products",
+                                 f"{self.base_url}/api/workspaces/{user.workspace_id}/products", headers=user.headers)
+
+    async def s_list_campaigns(self, client, user):
+        await self.recorder.call(client, "GET", "/api/workspaces/{workspace_id}/campaigns",
+                                 f"{self.base_url}/api/workspaces/{user.workspace_id}/campaigns", headers=user.headers)
+
+    async def s_generate_product(self, client, user):
+        await self.recorder.call(client, "POST", "/api/workspaces/{workspace_id}/products/generate",
+                                 f"{self.base_url}/api/workspaces/{user.workspace_id}/products/generate",
+                                 headers=user.headers, json=product_payload(self.rng.randint(0, 999)))
+
+    async def s_generate_campaign(self, client, user):
+        response = await self.recorder.call(client, "POST", "/api/workspaces/{workspace_id}/campaigns/generate",
+                                            f"{self.base_url}/api/workspaces/{user.workspace_id}/campaigns/generate",
+                                            headers=user.headers, json=campaign_payload(self.rng.randint(0, 999)))
+        if response is not None and response.status_code == 200:
+            user.campaign_ids.append(response.json()["campaign_id"])
+
+    async def s_export(self, client, user):
+        if not user.campaign_ids:
+            return await self.s_list_campaigns(client, user)
+        campaign_id = self.rng.choice(user.campaign_ids)
+        await self.recorder.call(client, "GET", "/api/workspaces/{workspace_id}/campaigns/{campaign_id}/export",
+                                 f"{self.base_url}/api/workspaces/{user.workspace_id}/campaigns/{campaign_id}/export",
+                                 headers=user.headers)
+
+    # ==================== DRIVER ====================
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float):
+        names = list(self.mix)
+        weights = [self.mix[n] for n in names]
+        while time.monotonic() < deadline:
+            scenario: Callable[..., Awaitable] = getattr(self, f"s_{self.rng.choices(names, weights)[0]}")
+            await scenario(client, self.rng.choice(self.users))
+
+    async def _drive(self, client: httpx.AsyncClient, seconds: float):
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(*(self._worker(client, deadline) for _ in range(self.args.concurrency)))
+
+    async def run(self) -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=self.args.concurrency * 2, max_keepalive_connections=self.args.concurrency)
+        try:
+            await self.boot()
+            async with httpx.AsyncClient(timeout=self.args.timeout, limits=limits) as client:
+                await self.seed(client)
+                if self.args.warmup > 0:
+                    await self._drive(client, self.args.warmup)
+                self.recorder.recording = True
+                started = time.monotonic()
+                await self._drive(client, self.args.duration)
+                elapsed = time.monotonic() - started
+            return {
+                "config": {
+                    "base_url": self.base_url,
+                    "llm": self.args.llm,
+                    "concurrency": self.args.concurrency,
+                    "duration_s": self.args.duration,
+                    "warmup_s": self.args.warmup,
+                    "users": self.args.users,
+                    "workers": self.args.workers,
+                    "mix": self.mix,
+                    "seed": self.args.seed,
+                },
+                "elapsed_s": round(elapsed, 2),
+                **self.recorder.report(elapsed)
+            }
+        finally:
+            try:
+                await self.cleanup()
+            finally:
+                self.shutdown()
+
+
+def product_payload(i: int) -> Dict[str, Any]:
+    return {
+        "title": f"Guia de Produtividade {i}",
+        "description": "Produto gerado pelo benchmark",
+        "product_type": "guide",
+        "topic": "produtividade pessoal",
+        "target_audience": "profissionais remotos",
+        "tone": "profissional",
+        "language": "pt"
+    }
+
+
+def campaign_payload(i: int) -> Dict[str, Any]:
+    return {
+        "niche": "fitness",
+        "product": f"Plano de Treino {i}",
+        "offer": "50% desconto",
+        "price": "19€",
+        "objective": "vendas",
+        "tone": "motivacional",
+        "channel": "IG",
+        "language": "pt",
+        "use_rag": True
+    }
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, float]:
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown scenario '{name}'. Available: {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="NOXLOOP end-to-end load benchmark")
+    parser.add_argument("--base-url", help="Benchmark an already running API instead of booting one")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="noxloop_bench")
+    parser.add_argument("--app-port", type=int, default=8101)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the booted API")
+    parser.add_argument("--llm", choices=["mock", "standin"], default="standin")
+    parser.add_argument("--standin-port", type=int, default=5102)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=200)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--seed-products", type=int, default=5)
+    parser.add_argument("--seed-campaigns", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before recording")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--mix", help="Scenario weights, e.g. 'catalog=40,login=5'")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-db", action="store_true", help="Do not drop the benchmark database afterwards")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    report = asyncio.run(LoadTest(args).run())
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Microbenchmarks for pure functions on request paths
+Stores per-benchmark baselines and flags regressions above a threshold.
+
+Run (from backend/):
+    python -m benchmarks.microbench                      # measure and print
+    python -m benchmarks.microbench --save-baseline      # measure and store baselines
+    python -m benchmarks.microbench --compare            # measure, compare, exit 1 on regression
+    python -m benchmarks.microbench --compare --threshold 0.15 -k markdown
+"""
+import sys
+import json
+import time
+import timeit
+import platform
+import argparse
+import statistics
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "microbench.json"
+DEFAULT_THRESHOLD = 0.20  # 20% slower than baseline = regression
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str):
+    """Register a factory that does the setup and returns the callable to time"""
+    def decorator(factory: Callable[[], Callable[[], Any]]):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+# ==================== FIXTURES ====================
+
+def _campaign_prompt(kind: str) -> str:
+    prompts = {
+        "landing": "Cria copy para uma landing page de venda",
+        "ads": "Cria 5 variações de anúncios para IG",
+        "creatives": "Cria 5 ideias de criativos/visuais",
+        "emails": "Cria uma sequência de 5 emails de vendas",
+        "checklist": "Cria um checklist passo-a-passo",
+    }
+    return f"{prompts[kind]}\n- Produto: Plano de Treino 12 Semanas\n- Oferta: 50% desconto"
+
+
+def _llm_response(kind: str) -> str:
+    from benchmarks.llm_standin import build_content
+    return build_content(_campaign_prompt(kind))
+
+
+def _campaign_assets() -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    from services.campaign_builder import campaign_builder
+    assets = {
+        kind: campaign_builder._parse_json_response(_llm_response(kind))
+        for kind in ("landing", "ads", "creatives", "emails", "checklist")
+    }
+    config = {"product": "Plano de Treino 12 Semanas", "offer": "50% desconto", "channel": "IG", "objective": "vendas"}
+    return assets, config
+
+
+def _rag_documents(count: int = 5) -> List[Dict[str, Any]]:
+    paragraph = "Estratégias de marketing digital para produtos de fitness com foco em conversão. " * 12
+    return [{"content": paragraph, "source": f"kb/fitness_{i}.md", "score": 0.9 - i * 0.05} for i in range(count)]
+
+# ==================== BENCHMARKS ====================
+
+@benchmark("generate_slug")
+def bench_generate_slug():
+    from server import generate_slug
+    title = "Guia Completo de Produtividade para Profissionais Remotos -- Edição 2026!"
+    return lambda: generate_slug(title)
+
+
+@benchmark("rag.format_context")
+def bench_format_context():
+    from services.rag_client import rag_client
+    docs = _rag_documents()
+    return lambda: rag_client.format_context(docs)
+
+
+@benchmark("campaign._parse_json_response")
+def bench_parse_json_response():
+    from services.campaign_builder import campaign_builder
+    response = _llm_response("emails")
+    return lambda: campaign_builder._parse_json_response(response)
+
+
+def _markdown_benchmark(method: str, kind: str):
+    def factory():
+        from services.campaign_builder import campaign_builder
+        assets, config = _campaign_assets()
+        render = getattr(campaign_builder, method)
+        data = assets[kind]
+        return lambda: render(data, config)
+    return factory
+
+
+for _method, _kind in (
+    ("_landing_to_markdown", "landing"),
+    ("_ads_to_markdown", "ads"),
+    ("_creatives_to_markdown", "creatives"),
+    ("_emails_to_markdown", "emails"),
+    ("_checklist_to_markdown", "checklist"),
+):
+    benchmark(f"campaign.{_method}")(_markdown_benchmark(_method, _kind))
+
+
+@benchmark("rate_limiter.check_rate_limit")
+def bench_check_rate_limit():
+    from services.security_service import RateLimiter
+    limiter = RateLimiter()
+    limiter.enabled = True
+    # api_global tier near its limit (100/min) - the worst case for per-request work
+    for _ in range(90):
+        limiter.record_request("api_global", "203.0.113.7")
+    return lambda: limiter.check_rate_limit("api_global", "203.0.113.7")
+
+
+@benchmark("jwt.create_token")
+def bench_create_jwt_token():
+    from server import create_jwt_token
+    return lambda: create_jwt_token("user_0123456789ab", "bench@noxloop.pt", False)
+
+
+@benchmark("jwt.decode")
+def bench_jwt_decode():
+    import jwt
+    from server import create_jwt_token, JWT_SECRET, JWT_ALGORITHM
+    token = create_jwt_token("user_0123456789ab", "bench@noxloop.pt", False)
+    return lambda: jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+
+
+@benchmark("credit_protection.check_credit_abuse")
+def bench_check_credit_abuse():
+    from services.security_service import CreditProtection
+    protection = CreditProtection()
+    protection.record_credit_usage("user_0123456789ab", 5)
+    return lambda: protection.check_credit_abuse("user_0123456789ab")
+
+
+
+@benchmark("campaign.create_zip")
+def bench_create_zip():
+    from services.campaign_builder import campaign_builder
+    assets, config = _campaign_assets()
+    campaign = {
+        "campaign_id": "camp_bench", "config": config, "created_at": "2026-01-01T00:00:00+00:00",
+        "assets": {"landing_copy": assets["landing"], "ad_variations": assets["ads"],
+                   "creative_ideas": assets["creatives"], "email_sequence": assets["emails"],
+                   "checklist": assets["checklist"]}
+    }
+    return lambda: campaign_builder.create_zip(campaign)
+
+
+@benchmark("rag.vector_search")
+def bench_vector_search():
+    import tempfile
+    from services.vector_index import VectorIndex, HashingEmbedder
+    embedder = HashingEmbedder()
+    workdir = tempfile.TemporaryDirectory(prefix="noxloop-bench-")
+    index = VectorIndex(workdir.name, embedder.dim, embedder.fingerprint)
+    # 5k chunks x 384 dims (7.5MB) - the single-box sizing the embedded backend targets
+    texts = [f"Capítulo {i}: marketing digital, tema {i % 97}, público {i % 13}" for i in range(5000)]
+    index.add([f"chunk_{i}" for i in range(len(texts))], [{"content": text} for text in texts], embedder.embed_sync(texts))
+    query = embedder.embed_sync(["marketing digital fitness conversão"])
+
+    def search():
+        workdir  # keep the index files alive while timing
+        return index.search(query, 5)
+    return search
+
+# ==================== RUNNER ====================
+
+def measure(fn: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, float]:
+    """Time fn; returns per-call nanoseconds (best and median over repeats)"""
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    runs = [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+    return {"best_ns": round(min(runs), 1), "median_ns": round(statistics.median(runs), 1), "loops": number}
+
+
+def run_benchmarks(names: List[str], repeat: int, min_time: float) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name in names:
+        fn = BENCHMARKS[name]()
+        fn()  # warm caches / lazy imports
+        results[name] = measure(fn, repeat, min_time)
+    return results
+
+
+def load_baseline(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, results: Dict[str, Dict[str, float]]):
+    existing = load_baseline(path)
+    benchmarks = {**existing.get("benchmarks", {}), **results}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine()
+        },
+        "benchmarks": dict(sorted(benchmarks.items()))
+    }, indent=2) + "\n")
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> Tuple[List[Dict[str, Any]], bool]:
+    """Compare best-of-N timings; returns rows and whether any regression exceeded the threshold"""
+    rows = []
+    regressed = False
+    for name, result in results.items():
+        base = baseline.get("benchmarks", {}).get(name)
+        row = {"name": name, "best_ns": result["best_ns"], "baseline_ns": None, "change": None, "status": "new"}
+        if base:
+            change = result["best_ns"] / base["best_ns"] - 1
+            row.update(baseline_ns=base["best_ns"], change=round(change, 4))
+            if change > threshold:
+                row["status"] = "REGRESSION"
+                regressed = True
+            elif change < -threshold:
+                row["status"] = "improved"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows, regressed
+
+
+def _format_ns(ns: Optional[float]) -> str:
+    if ns is None:
+        return "-"
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    width = max(len(r["name"]) for r in rows)
+    print(f"{'benchmark':<{width}}  {'best':>10}  {'baseline':>10}  {'change':>8}  status")
+    for r in rows:
+        change = f"{r['change'] * 100:+.1f}%" if r["change"] is not None else "-"
+        print(f"{r['name']:<{width}}  {_format_ns(r['best_ns']):>10}  {_format_ns(r['baseline_ns']):>10}  {change:>8}  {r['status']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for hot pure functions")
+    parser.add_argument("-k", dest="filter", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--list", action="store_true", help="List benchmarks and exit")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="Exit 1 if any benchmark regressed beyond --threshold")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    names = [n for n in BENCHMARKS if not args.filter or args.filter in n]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    results = run_benchmarks(names, args.repeat, args.min_time)
+    rows, regressed = compare(results, load_baseline(args.baseline), args.threshold)
+
+    if args.json:
+        print(json.dumps({"threshold": args.threshold, "results": rows, "regressed": regressed}, indent=2))
+    else:
+        print_table(rows)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+
+    return 1 if args.compare and regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
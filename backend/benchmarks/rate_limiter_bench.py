@@ -0,0 +1,172 @@
+"""
+Rate limiter benchmark - sliding window counter vs the previous timestamp-list limiter
+Measures per-call cost at different fill levels, memory per tracked key and how
+closely the counter's decisions track an exact sliding window.
+
+Run (from backend/):
+    python -m benchmarks.rate_limiter_bench
+    python -m benchmarks.rate_limiter_bench --keys 20000 --json
+"""
+import json
+import time
+import timeit
+import random
+import hashlib
+import argparse
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+from services.security_service import RateLimiter, RATE_LIMITS
+
+
+class ListRateLimiter:
+    """The previous implementation: one timestamp per request, filtered on every check"""
+
+    def __init__(self):
+        self.enabled = True
+        self._requests: Dict[str, list] = defaultdict(list)
+
+    def _get_key(self, action: str, identifier: str) -> str:
+        return f"{action}:{hashlib.md5(identifier.encode()).hexdigest()[:16]}"
+
+    def check_rate_limit(self, action: str, identifier: str) -> Dict[str, Any]:
+        limit_config = RATE_LIMITS.get(action, RATE_LIMITS["api_global"])
+        max_requests = limit_config["requests"]
+        window = limit_config["window"]
+        key = self._get_key(action, identifier)
+        cutoff = time.time() - window
+        self._requests[key] = [ts for ts in self._requests[key] if ts > cutoff]
+        current_requests = len(self._requests[key])
+        reset_at = min(self._requests[key]) + window if self._requests[key] else time.time() + window
+        return {
+            "allowed": current_requests < max_requests,
+            "remaining": max(0, max_requests - current_requests - 1),
+            "reset_at": reset_at,
+            "current": current_requests
+        }
+
+    def record_request(self, action: str, identifier: str):
+        self._requests[self._get_key(action, identifier)].append(time.time())
+
+
+def _new(kind: str):
+    if kind == "list":
+        return ListRateLimiter()
+    limiter = RateLimiter()
+    limiter.enabled = True
+    return limiter
+
+
+def bench_call(kind: str, fill: int, number: int = 20000) -> float:
+    """ns per check_rate_limit on a key that already holds `fill` requests"""
+    limiter = _new(kind)
+    for _ in range(fill):
+        limiter.record_request("api_global", "203.0.113.7")
+    best = min(timeit.repeat(lambda: limiter.check_rate_limit("api_global", "203.0.113.7"), number=number, repeat=5))
+    return best / number * 1e9
+
+
+def bench_check_and_record(kind: str, number: int = 20000) -> float:
+    """ns per check + record pair on a hot key (the middleware path)"""
+    limiter = _new(kind)
+
+    def cycle():
+        if limiter.check_rate_limit("api_global", "203.0.113.7")["allowed"]:
+            limiter.record_request("api_global", "203.0.113.7")
+
+    best = min(timeit.repeat(cycle, number=number, repeat=5))
+    return best / number * 1e9
+
+
+def bench_memory(kind: str, keys: int, per_key: int) -> float:
+    """Bytes retained per tracked key after `per_key` requests each"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    limiter = _new(kind)
+    for i in range(keys):
+        ip = f"198.51.{i // 256 % 256}.{i % 256}-{i}"
+        for _ in range(per_key):
+            limiter.record_request("api_global", ip)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return retained / keys
+
+
+def accuracy(seconds: int = 600, rate: float = 2.0, seed: int = 7) -> Dict[str, Any]:
+    """Replay a bursty Poisson arrival stream (simulated clock) through an exact sliding
+    window and the counter; report admitted totals and the counter's worst overshoot,
+    i.e. the most requests it admitted within any one sliding window"""
+    rng = random.Random(seed)
+    limit = RATE_LIMITS["api_global"]
+    window, max_requests = limit["window"], limit["requests"]
+    limiter = _new("counter")
+
+    t = 1_700_000_000.0
+    end = t + seconds
+    exact: List[float] = []
+    admitted: List[float] = []
+    exact_total = arrivals = 0
+    real_time = time.time
+    try:
+        while t < end:
+            # Alternate calm and burst phases so the limit is actually reached
+            phase_rate = rate * (4 if int(t // 45) % 2 else 0.5)
+            t += rng.expovariate(phase_rate)
+            time.time = lambda: t
+            arrivals += 1
+            exact = [ts for ts in exact if ts > t - window]
+            if len(exact) < max_requests:
+                exact.append(t)
+                exact_total += 1
+            if limiter.check_rate_limit("api_global", "client")["allowed"]:
+                limiter.record_request("api_global", "client")
+                admitted.append(t)
+    finally:
+        time.time = real_time
+
+    worst, start = 0, 0
+    for i, ts in enumerate(admitted):
+        while admitted[start] <= ts - window:
+            start += 1
+        worst = max(worst, i - start + 1)
+    return {"arrivals": arrivals, "admitted_exact": exact_total, "admitted_counter": len(admitted),
+            "window": window, "limit": max_requests, "max_in_any_window": worst}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the sliding window counter with the timestamp-list limiter")
+    parser.add_argument("--keys", type=int, default=10000, help="Tracked keys for the memory measurement")
+    parser.add_argument("--per-key", type=int, default=50, help="Requests recorded per key for the memory measurement")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Any] = {"check_ns": {}, "check_and_record_ns": {}, "bytes_per_key": {}}
+    for kind in ("list", "counter"):
+        results["check_ns"][kind] = {fill: round(bench_call(kind, fill), 1) for fill in (0, 10, 90)}
+        results["check_and_record_ns"][kind] = round(bench_check_and_record(kind), 1)
+        results["bytes_per_key"][kind] = round(bench_memory(kind, args.keys, args.per_key), 1)
+    results["accuracy"] = accuracy()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{'':<28}{'list':>12}{'counter':>12}")
+    for fill in (0, 10, 90):
+        print(f"{f'check_rate_limit, {fill} held':<28}"
+              f"{results['check_ns']['list'][fill]:>10.0f}ns{results['check_ns']['counter'][fill]:>10.0f}ns")
+    print(f"{'check + record (hot key)':<28}"
+          f"{results['check_and_record_ns']['list']:>10.0f}ns{results['check_and_record_ns']['counter']:>10.0f}ns")
+    print(f"{f'memory/key ({args.per_key} requests)':<28}"
+          f"{results['bytes_per_key']['list']:>11.0f}B{results['bytes_per_key']['counter']:>11.0f}B")
+    acc = results["accuracy"]
+    print(f"\nBursty replay, {acc['arrivals']} arrivals: exact window admitted {acc['admitted_exact']}, "
+          f"counter admitted {acc['admitted_counter']}; counter peak in any {acc['window']}s window: "
+          f"{acc['max_in_any_window']} (limit {acc['limit']})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
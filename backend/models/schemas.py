@@ -142,6 +142,9 @@ class CampaignCreate(BaseModel):
     language: str = "pt"
     use_rag: bool = True
 
+class CampaignSectionRegenerate(BaseModel):
+    use_rag: bool = True
+
 class CampaignResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
     campaign_id: str
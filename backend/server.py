@@ -6,15 +6,19 @@ Version: 2.0.0
 """
 from fastapi import (
     FastAPI, APIRouter, HTTPException, Request, Depends, Response,
-    UploadFile, File
+    UploadFile, File, Query
 )
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, PlainTextResponse
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
-import io
+import re
+import math
 import logging
+import asyncio
+import itertools
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 import uuid
@@ -30,11 +34,17 @@ load_dotenv(ROOT_DIR / '.env')
 # Import services
 from services import llm_service, rag_client, webhook_service, campaign_builder
 from services import payment_service, email_service, security_service
+from services import health_monitor, metrics, timing
+from services import db_monitor
+from services.loop_monitor import loop_monitor
+from services.rag_ingest import rag_ingestor
+from services.export_cache import export_cache, content_hash
+from services.workspace_export import workspace_exporter, FORMATS as EXPORT_FORMATS
 from models.schemas import (
     UserCreate, UserLogin, UserResponse, UserWithWorkspaces,
     WorkspaceCreate, WorkspaceUpdate, WorkspaceResponse, WorkspaceMember, WorkspaceInvite,
     ProductCreate, ProductUpdate, ProductResponse, ProductStatus,
-    CampaignCreate, CampaignResponse,
+    CampaignCreate, CampaignResponse, CampaignSectionRegenerate,
     TemplateCreate, TemplateUpdate, TemplateResponse,
     PlanConfig, PlanUpdate, PlanType, FeatureFlag, UserRole,
     CheckoutRequest, SubscriptionRequest, GoogleAuthRequest,
@@ -45,7 +55,10 @@ from models.schemas import (
 
 # ==================== DATABASE ====================
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[db_monitor.command_listener] if db_monitor.DB_MONITOR_ENABLED else []
+)
 db = client[os.environ.get('DB_NAME', 'noxloop')]
 
 # ==================== CONFIGURATION ====================
@@ -138,8 +151,8 @@ def generate_slug(title: str) -> str:
 
 
 # Media upload configuration
-UPLOAD_DIR = Path("/app/uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR = Path(os.environ.get('UPLOAD_DIR', '/app/uploads'))
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
 ALLOWED_VIDEO_TYPES = {"video/mp4", "video/webm", "video/quicktime"}
@@ -232,8 +245,9 @@ async def get_current_user(request: Request) -> dict:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0, "password": 0})
+        with timing.phase("auth"):
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0, "password": 0})
         if user:
             # ALWAYS get role from database, never from token
             user["is_admin"] = user.get("is_admin", False)
@@ -264,10 +278,11 @@ def require_role(allowed_roles: list):
 
 async def get_workspace_member(workspace_id: str, user: dict) -> dict:
     """Check if user is member of workspace and return membership"""
-    membership = await db.workspace_members.find_one({
-        "workspace_id": workspace_id,
-        "user_id": user["user_id"]
-    }, {"_id": 0})
+    with timing.phase("membership"):
+        membership = await db.workspace_members.find_one({
+            "workspace_id": workspace_id,
+            "user_id": user["user_id"]
+        }, {"_id": 0})
     
     if not membership:
         raise HTTPException(status_code=403, detail="Not a member of this workspace")
@@ -283,7 +298,7 @@ async def register(user_data: UserCreate, request: Request, response: Response):
     if security_service.rate_limiter.is_blocked(ip):
         raise HTTPException(status_code=429, detail="Too many requests. Try again later.")
     
-    rate_check = security_service.rate_limiter.check_rate_limit("register", ip)
+    rate_check = security_service.rate_limiter.consume("register", ip)
     if not rate_check["allowed"]:
         raise HTTPException(status_code=429, detail="Registration limit reached. Try again later.")
     
@@ -291,8 +306,6 @@ async def register(user_data: UserCreate, request: Request, response: Response):
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    security_service.rate_limiter.record_request("register", ip)
-    
     user_id = f"user_{uuid.uuid4().hex[:12]}"
     hashed_password = hash_password(user_data.password)
     
@@ -362,7 +375,7 @@ async def login(user_data: UserLogin, request: Request, response: Response):
         raise HTTPException(status_code=429, detail="Too many failed attempts. Try again later.")
     
     # Rate limit check
-    rate_check = security_service.rate_limiter.check_rate_limit("login", ip)
+    rate_check = security_service.rate_limiter.consume("login", ip)
     if not rate_check["allowed"]:
         raise HTTPException(status_code=429, detail="Too many login attempts. Try again later.")
     
@@ -374,7 +387,6 @@ async def login(user_data: UserLogin, request: Request, response: Response):
     
     # Clear failed attempts on success
     security_service.rate_limiter.clear_failed_logins(ip)
-    security_service.rate_limiter.record_request("login", ip)
     
     token = create_jwt_token(user["user_id"], user["email"], user.get("is_admin", False))
     response.set_cookie(
@@ -586,9 +598,16 @@ async def get_workspace_members(workspace_id: str, user: dict = Depends(get_curr
     await get_workspace_member(workspace_id, user)
     memberships = await db.workspace_members.find({"workspace_id": workspace_id}, {"_id": 0}).to_list(100)
     
+    # One batched lookup instead of one query per member
+    member_users = await db.users.find(
+        {"user_id": {"$in": [m["user_id"] for m in memberships]}},
+        {"_id": 0, "user_id": 1, "email": 1, "name": 1}
+    ).to_list(len(memberships))
+    users_by_id = {u["user_id"]: u for u in member_users}
+    
     result = []
     for m in memberships:
-        member_user = await db.users.find_one({"user_id": m["user_id"]}, {"_id": 0, "password": 0})
+        member_user = users_by_id.get(m["user_id"])
         if member_user:
             result.append({
                 "user_id": m["user_id"],
@@ -629,23 +648,41 @@ async def invite_member(workspace_id: str, invite: WorkspaceInvite, user: dict =
 
 @api_router.post("/workspaces/{workspace_id}/products/generate")
 async def generate_product(workspace_id: str, product_data: ProductCreate, user: dict = Depends(get_current_user)):
-    membership = await get_workspace_member(workspace_id, user)
-    workspace = await db.workspaces.find_one({"workspace_id": workspace_id}, {"_id": 0})
-    
-    if workspace.get("credits", 0) < 5:
-        raise HTTPException(
-            status_code=402,
-            detail=f"Créditos insuficientes. Necessário: 5, Disponível: {workspace.get('credits', 0)}"
-        )
-    
-    # Anti-abuse check
-    abuse_check = security_service.credit_protection.check_credit_abuse(user["user_id"])
-    if not abuse_check["allowed"]:
-        raise HTTPException(status_code=429, detail=abuse_check["reason"])
-    
-    # Check LLM availability
-    if not await llm_service.is_available():
-        raise HTTPException(status_code=503, detail="LLM service not available")
+    # Pre-LLM pipeline: retrieval, the workspace read and the LLM health check are
+    # independent, so they run concurrently and the stage costs about the slowest one.
+    # Validation still happens in the original order; any failure exits the task group,
+    # which cancels whatever is still in flight (usually the retrieval).
+    try:
+        with timing.phase("prepare"):
+            async with asyncio.TaskGroup() as pipeline:
+                rag_task = pipeline.create_task(
+                    rag_client.retrieve(f"{product_data.topic} {product_data.target_audience}")
+                )
+                workspace_task = pipeline.create_task(
+                    db.workspaces.find_one({"workspace_id": workspace_id}, {"_id": 0})
+                )
+                llm_task = pipeline.create_task(health_monitor.is_healthy("llm"))
+                
+                await get_workspace_member(workspace_id, user)
+                workspace = await workspace_task
+                
+                if workspace.get("credits", 0) < 5:
+                    raise HTTPException(
+                        status_code=402,
+                        detail=f"Créditos insuficientes. Necessário: 5, Disponível: {workspace.get('credits', 0)}"
+                    )
+                
+                # Anti-abuse check
+                abuse_check = security_service.credit_protection.check_credit_abuse(user["user_id"])
+                if not abuse_check["allowed"]:
+                    raise HTTPException(status_code=429, detail=abuse_check["reason"])
+                
+                # Check LLM availability (cached by the background health monitor)
+                if not await llm_task:
+                    raise HTTPException(status_code=503, detail="LLM service not available")
+    except* Exception as failed:
+        # Surface the first failure as-is so HTTPExceptions keep their status codes
+        raise failed.exceptions[0]
     
     # Build prompt
     type_prompts = {
@@ -669,7 +706,7 @@ Estrutura o conteúdo de forma profissional com:
 Formata em Markdown."""
     
     # Get RAG context if available
-    rag_docs = await rag_client.retrieve(f"{product_data.topic} {product_data.target_audience}")
+    rag_docs = rag_task.result()
     if rag_docs:
         rag_context = rag_client.format_context(rag_docs)
         prompt = f"{rag_context}\n\n{prompt}"
@@ -780,6 +817,10 @@ async def update_product(workspace_id: str, product_id: str, update_data: Produc
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    # Published (or just unpublished) content goes to the retrieval index in the background
+    if product.get("is_published") or update_dict.get("is_published"):
+        rag_ingestor.enqueue("product", product_id)
+    
     return await db.products.find_one({"product_id": product_id}, {"_id": 0})
 
 @api_router.delete("/workspaces/{workspace_id}/products/{product_id}")
@@ -792,6 +833,8 @@ async def delete_product(workspace_id: str, product_id: str, user: dict = Depend
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    rag_ingestor.enqueue("product", product_id)
+    
     return {"message": "Product deleted"}
 
 # ==================== CAMPAIGN BUILDER ROUTES ====================
@@ -804,7 +847,7 @@ async def generate_campaign(workspace_id: str, campaign_data: CampaignCreate, us
     if workspace.get("credits", 0) < 3:  # Campaigns cost 3 credits
         raise HTTPException(status_code=402, detail="Insufficient credits (campaigns require 3 credits)")
     
-    if not await llm_service.is_available():
+    if not await health_monitor.is_healthy("llm"):
         raise HTTPException(status_code=503, detail="LLM service not available")
     
     try:
@@ -850,6 +893,68 @@ async def generate_campaign(workspace_id: str, campaign_data: CampaignCreate, us
         logger.error(f"Campaign generation error: {e}")
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
+@api_router.post("/workspaces/{workspace_id}/campaigns/{campaign_id}/sections/{section}/regenerate")
+async def regenerate_campaign_section(
+    workspace_id: str, campaign_id: str, section: str,
+    options: Optional[CampaignSectionRegenerate] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Regenerate one campaign section in place; costs its share of a full campaign (one LLM call of five)"""
+    if section not in campaign_builder.SECTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown section (use one of: {', '.join(campaign_builder.SECTIONS)})")
+    
+    await get_workspace_member(workspace_id, user)
+    campaign = await db.campaigns.find_one({"campaign_id": campaign_id, "workspace_id": workspace_id}, {"_id": 0})
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    # A campaign costs 3 credits for 5 sections; a section is charged its share, in whole credits
+    cost = math.ceil(3 / len(campaign_builder.SECTIONS))
+    workspace = await db.workspaces.find_one({"workspace_id": workspace_id}, {"_id": 0})
+    if workspace.get("credits", 0) < cost:
+        raise HTTPException(status_code=402, detail=f"Insufficient credits (section regeneration requires {cost} credits)")
+    
+    # Anti-abuse check
+    abuse_check = security_service.credit_protection.check_credit_abuse(user["user_id"])
+    if not abuse_check["allowed"]:
+        raise HTTPException(status_code=429, detail=abuse_check["reason"])
+    
+    if not await health_monitor.is_healthy("llm"):
+        raise HTTPException(status_code=503, detail="LLM service not available")
+    
+    use_rag = options.use_rag if options else campaign.get("rag_used", True)
+    try:
+        asset = await campaign_builder.regenerate_section(campaign, section, use_rag=use_rag)
+    except Exception as e:
+        logger.error(f"Campaign section regeneration error: {e}")
+        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+    
+    # Keep the existing section (and the credits) when the model returned nothing usable
+    if not asset or (isinstance(asset, dict) and "error" in asset):
+        raise HTTPException(status_code=502, detail="Generation returned no usable content, nothing was charged")
+    
+    now = datetime.now(timezone.utc).isoformat()
+    await db.campaigns.update_one(
+        {"campaign_id": campaign_id, "workspace_id": workspace_id},
+        {"$set": {f"assets.{campaign_builder.SECTIONS[section]}": asset, "updated_at": now}}
+    )
+    
+    # Deduct credits
+    await db.workspaces.update_one({"workspace_id": workspace_id}, {"$inc": {"credits": -cost}})
+    security_service.credit_protection.record_credit_usage(user["user_id"], cost)
+    
+    # Record usage
+    await db.usage.insert_one({
+        "workspace_id": workspace_id,
+        "user_id": user["user_id"],
+        "action": "campaign_section_regeneration",
+        "credits_used": cost,
+        "metadata": {"campaign_id": campaign_id, "section": section},
+        "created_at": now
+    })
+    
+    return await db.campaigns.find_one({"campaign_id": campaign_id, "workspace_id": workspace_id}, {"_id": 0})
+
 @api_router.get("/workspaces/{workspace_id}/campaigns")
 async def list_campaigns(workspace_id: str, user: dict = Depends(get_current_user)):
     await get_workspace_member(workspace_id, user)
@@ -865,42 +970,137 @@ async def get_campaign(workspace_id: str, campaign_id: str, user: dict = Depends
     return campaign
 
 @api_router.get("/workspaces/{workspace_id}/campaigns/{campaign_id}/export")
-async def export_campaign(workspace_id: str, campaign_id: str, user: dict = Depends(get_current_user)):
+async def export_campaign(workspace_id: str, campaign_id: str, request: Request, user: dict = Depends(get_current_user)):
     await get_workspace_member(workspace_id, user)
     campaign = await db.campaigns.find_one({"campaign_id": campaign_id, "workspace_id": workspace_id}, {"_id": 0})
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    try:
-        zip_bytes = campaign_builder.create_zip(campaign)
-        
-        # Record export
-        await db.usage.insert_one({
-            "workspace_id": workspace_id,
-            "user_id": user["user_id"],
-            "action": "export",
-            "credits_used": 0,
-            "metadata": {"campaign_id": campaign_id, "type": "zip"},
-            "created_at": datetime.now(timezone.utc).isoformat()
-        })
-        
-        # Send webhook  
+    # The archive is a pure function of the campaign, so its content hash is a strong validator
+    digest = content_hash(campaign)
+    etag = f'"{digest[:32]}"'
+    filename = f"campaign_{campaign_id}.zip"
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    # Record export
+    await db.usage.insert_one({
+        "workspace_id": workspace_id,
+        "user_id": user["user_id"],
+        "action": "export",
+        "credits_used": 0,
+        "metadata": {"campaign_id": campaign_id, "type": "zip"},
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    
+    sent = {"bytes": 0}
+    
+    async def notify_export():
+        # Webhook is optional and the size is only known once the archive is sent
+        await webhook_service.export_generated(
+            f"exp_{uuid.uuid4().hex[:8]}", workspace_id, user["user_id"], "campaign_zip", sent["bytes"]
+        )
+    
+    if export_cache.enabled:
+        # Rendered once per campaign version (in a worker thread); repeats are served from disk
         try:
-            await webhook_service.export_generated(
-                f"exp_{uuid.uuid4().hex[:8]}", workspace_id, user["user_id"], "campaign_zip", len(zip_bytes)
+            path = await export_cache.get_or_create(
+                f"campaign_{campaign_id}", digest, lambda: campaign_builder.stream_zip(campaign)
             )
-        except:
-            pass  # Webhook is optional
-        
-        return StreamingResponse(
-            io.BytesIO(zip_bytes),
+            stat = path.stat()
+        except Exception as e:
+            logger.error(f"Export error: {e}")
+            raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+        sent["bytes"] = stat.st_size
+        return FileResponse(
+            path,
             media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename=campaign_{campaign_id}.zip"}
+            filename=filename,
+            stat_result=stat,
+            headers=headers,
+            background=BackgroundTask(notify_export)
         )
-        
+    
+    # Sync generator: Starlette pulls each chunk in a worker thread, so rendering and
+    # compression stay off the event loop and only one file is in memory at a time.
+    # The first chunk is produced up front so a broken campaign still gets a clean 500.
+    chunks = campaign_builder.stream_zip(campaign)
+    try:
+        first = await asyncio.to_thread(next, chunks)
     except Exception as e:
         logger.error(f"Export error: {e}")
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    
+    def archive():
+        for chunk in itertools.chain((first,), chunks):
+            sent["bytes"] += len(chunk)
+            yield chunk
+    
+    return StreamingResponse(
+        archive(),
+        media_type="application/zip",
+        headers={**headers, "Content-Disposition": f"attachment; filename={filename}"},
+        background=BackgroundTask(notify_export)
+    )
+
+# ==================== WORKSPACE EXPORT ROUTES ====================
+
+def _export_job_view(job: dict) -> dict:
+    """Job record for the API, with a download link once the archive is ready"""
+    view = {k: v for k, v in job.items() if k not in ("_id", "owner", "storage_id", "lease_until")}
+    ready = job["status"] == "completed" and not workspace_exporter.is_expired(job)
+    view["download_url"] = f"/api/workspaces/{job['workspace_id']}/exports/{job['job_id']}/download" if ready else None
+    return view
+
+async def _get_export_job(workspace_id: str, job_id: str, user: dict) -> dict:
+    membership = await get_workspace_member(workspace_id, user)
+    if membership["role"] not in [UserRole.OWNER.value, UserRole.ADMIN.value]:
+        raise HTTPException(status_code=403, detail="Only owners and admins can export the workspace")
+    job = await db.export_jobs.find_one({"job_id": job_id, "workspace_id": workspace_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@api_router.post("/workspaces/{workspace_id}/export", status_code=202)
+async def export_workspace(workspace_id: str, export_format: str = Query("zip", alias="format"), user: dict = Depends(get_current_user)):
+    """Start a background export of all products and campaigns (zip or ndjson); poll the job for the link"""
+    membership = await get_workspace_member(workspace_id, user)
+    if membership["role"] not in [UserRole.OWNER.value, UserRole.ADMIN.value]:
+        raise HTTPException(status_code=403, detail="Only owners and admins can export the workspace")
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format (use one of: {', '.join(EXPORT_FORMATS)})")
+    if not workspace_exporter.available:
+        raise HTTPException(status_code=503, detail="Workspace exports are temporarily unavailable")
+    
+    job = await workspace_exporter.create_job(workspace_id, user["user_id"], export_format)
+    return _export_job_view(job)
+
+@api_router.get("/workspaces/{workspace_id}/exports/{job_id}")
+async def get_workspace_export(workspace_id: str, job_id: str, user: dict = Depends(get_current_user)):
+    return _export_job_view(await _get_export_job(workspace_id, job_id, user))
+
+@api_router.get("/workspaces/{workspace_id}/exports/{job_id}/download")
+async def download_workspace_export(workspace_id: str, job_id: str, user: dict = Depends(get_current_user)):
+    job = await _get_export_job(workspace_id, job_id, user)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    
+    if not workspace_exporter.available:
+        raise HTTPException(status_code=503, detail="Workspace exports are temporarily unavailable")
+    if not workspace_exporter.is_local(job):
+        # WORKSPACE_EXPORT_DIR is not shared by every node (see docker-compose.yml)
+        raise HTTPException(status_code=503, detail="Export is stored on another node, try again")
+    
+    path = workspace_exporter.path_for(job)
+    if workspace_exporter.is_expired(job) or not path.is_file():
+        raise HTTPException(status_code=410, detail="Export expired, start a new one")
+    
+    return FileResponse(
+        path,
+        media_type="application/zip" if job["format"] == "zip" else "application/gzip",
+        filename=f"workspace_{workspace_id}_{job['completed_at'][:10]}{EXPORT_FORMATS[job['format']]}"
+    )
 
 # ==================== PUBLIC ROUTES ====================
 
@@ -1393,10 +1593,9 @@ async def forgot_password(request: Request):
     
     # Rate limit
     ip = security_service.get_client_ip(request)
-    rate_check = security_service.rate_limiter.check_rate_limit("password_reset", ip)
+    rate_check = security_service.rate_limiter.consume("password_reset", ip)
     if not rate_check["allowed"]:
         raise HTTPException(status_code=429, detail="Too many reset requests. Try again later.")
-    security_service.rate_limiter.record_request("password_reset", ip)
     
     user = await db.users.find_one({"email": email})
     
@@ -1518,13 +1717,17 @@ async def create_template(template_data: TemplateCreate, user: dict = Depends(ge
         "template_id": template_id,
         "name": template_data.name,
         "description": template_data.description,
-        "type": template_data.type,
-        "content": template_data.content,
+        "category": template_data.category,
+        "prompt_template": template_data.prompt_template,
+        "variables": template_data.variables,
+        "is_active": template_data.is_active,
+        "usage_count": 0,
         "created_at": now,
         "updated_at": now
     }
     
     await db.templates.insert_one(template_doc)
+    rag_ingestor.enqueue("template", template_id)
     return TemplateResponse(**template_doc)
 
 # ==================== MEDIA ASSET ROUTES (ADMIN) ====================
@@ -1640,29 +1843,53 @@ async def delete_media(asset_id: str, admin: dict = Depends(get_admin_user)):
 
 # ==================== HEALTH CHECK ====================
 
+# Readiness fails only on these; everything else is informational
+READINESS_CHECKS = ("database", "storage")
+
+def _check_entry(name: str) -> dict:
+    """Cached health monitor result shaped for the health endpoints"""
+    result = health_monitor.get_result(name)
+    if result is None:
+        return {"status": "unknown"}
+    entry = {
+        "status": "healthy" if result["healthy"] else "unhealthy",
+        "checked_at": datetime.fromtimestamp(result["checked_at"], timezone.utc).isoformat(),
+        "latency_ms": result["latency_ms"],
+        **(result["details"] or {})
+    }
+    if result["error"]:
+        entry["error"] = result["error"]
+    return entry
+
+@api_router.get("/health/live")
+async def liveness_check():
+    """Liveness probe - the process is up and the event loop is serving; no I/O"""
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def readiness_check():
+    """Readiness probe - served from the background health checks, 503 when a required dependency is down"""
+    ready = all([await health_monitor.is_healthy(name) for name in READINESS_CHECKS])
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "checks": {name: _check_entry(name) for name in READINESS_CHECKS}
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
 @api_router.get("/health")
 async def health_check():
-    """Comprehensive health check for production monitoring"""
+    """Comprehensive health check for production monitoring (deep checks served from cache)"""
     checks = {
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "status": "healthy",
         "checks": {}
     }
     
-    # Database check
-    try:
-        await db.command("ping")
-        checks["checks"]["database"] = {
-            "status": "healthy",
-            "connected": True,
-            "db_name": db.name
-        }
-    except Exception as e:
-        checks["status"] = "unhealthy"
-        checks["checks"]["database"] = {
-            "status": "unhealthy",
-            "error": str(e)
-        }
+    for name in READINESS_CHECKS:
+        if not await health_monitor.is_healthy(name):
+            checks["status"] = "unhealthy"
+    
+    checks["checks"]["database"] = {**_check_entry("database"), "db_name": db.name}
     
     # Configuration check
     config_issues = []
@@ -1681,39 +1908,11 @@ async def health_check():
         "llm_provider": llm_service.provider if hasattr(llm_service, 'provider') else "unknown"
     }
     
-    # Storage check
-    try:
-        UPLOAD_DIR.mkdir(exist_ok=True)
-        test_file = UPLOAD_DIR / ".health_check"
-        test_file.write_text("ok")
-        test_file.unlink()
-        checks["checks"]["storage"] = {
-            "status": "healthy",
-            "writable": True,
-            "path": str(UPLOAD_DIR)
-        }
-    except Exception as e:
-        checks["status"] = "unhealthy"
-        checks["checks"]["storage"] = {
-            "status": "unhealthy",
-            "writable": False,
-            "error": str(e)
-        }
+    checks["checks"]["storage"] = _check_entry("storage")
     
-    # Collections count
-    try:
-        user_count = await db.users.count_documents({})
-        product_count = await db.products.count_documents({})
-        workspace_count = await db.workspaces.count_documents({})
-        
-        checks["checks"]["data"] = {
-            "status": "healthy",
-            "users": user_count,
-            "products": product_count,
-            "workspaces": workspace_count
-        }
-    except:
-        pass
+    # Collection counts come from the background "data" probe
+    if health_monitor.get_cached("data") is not None:
+        checks["checks"]["data"] = _check_entry("data")
     
     return checks
 
@@ -1728,6 +1927,7 @@ async def update_template(template_id: str, update_data: TemplateUpdate, user: d
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Template not found")
     
+    rag_ingestor.enqueue("template", template_id)
     return await db.templates.find_one({"template_id": template_id}, {"_id": 0})
 
 @admin_router.delete("/templates/{template_id}")
@@ -1735,8 +1935,22 @@ async def delete_template(template_id: str, user: dict = Depends(get_admin_user)
     result = await db.templates.delete_one({"template_id": template_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Template not found")
+    rag_ingestor.enqueue("template", template_id)
     return {"message": "Template deleted"}
 
+@admin_router.get("/rag/ingestion")
+async def get_rag_ingestion(user: dict = Depends(get_admin_user)):
+    return rag_ingestor.get_status()
+
+@admin_router.post("/rag/reindex")
+async def reindex_rag(user: dict = Depends(get_admin_user)):
+    """Backfill the retrieval index with every published product and template"""
+    if not rag_ingestor.enabled:
+        raise HTTPException(status_code=409, detail="RAG ingestion requires an embedded (vector/bm25) backend")
+    if not rag_ingestor.reindex():
+        raise HTTPException(status_code=409, detail="Reindex already running")
+    return {"message": "Reindex started", **rag_ingestor.get_status()}
+
 @admin_router.get("/plans")
 async def get_plans_config(user: dict = Depends(get_admin_user)):
     # Get from database or return defaults
@@ -1766,24 +1980,29 @@ async def get_system_status():
     rag_status = rag_client.get_status()
     webhook_status = webhook_service.get_status()
     
-    # Test database
-    db_connected = True
-    try:
-        await db.command("ping")
-    except Exception:
-        db_connected = False
-    
+    # Served from the health monitor cache - no probes on the request path
     return {
         "version": "2.0.0",
         "llm_provider": llm_status["provider"],
-        "llm_available": await llm_service.is_available(),
+        "llm_available": await health_monitor.is_healthy("llm"),
         "rag_enabled": rag_status["enabled"],
-        "rag_available": await rag_client.is_available() if rag_status["enabled"] else False,
+        "rag_available": await health_monitor.is_healthy("rag") if rag_status["enabled"] else False,
         "stripe_enabled": STRIPE_ENABLED,
         "webhooks_enabled": webhook_status["enabled"],
-        "database_connected": db_connected
+        "database_connected": await health_monitor.is_healthy("database")
     }
 
+# ==================== METRICS ====================
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not found")
+    if metrics.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return PlainTextResponse(metrics.metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ==================== LEGACY COMPATIBILITY ====================
 # Keep old routes working for existing frontend
 
@@ -1858,6 +2077,8 @@ async def legacy_update_product(product_id: str, update_data: ProductUpdate, use
             update_dict["public_url"] = f"/p/{slug}"
     
     await db.products.update_one({"product_id": product_id}, {"$set": update_dict})
+    if product.get("is_published") or update_dict.get("is_published"):
+        rag_ingestor.enqueue("product", product_id)
     return await db.products.find_one({"product_id": product_id}, {"_id": 0})
 
 # ==================== PUBLIC MEDIA ENDPOINT ====================
@@ -1885,6 +2106,12 @@ async def get_media_file(asset_id: str):
 app.include_router(api_router)
 app.include_router(admin_router)
 
+# Innermost so 429s still show up in metrics/timing; still runs before routing and body parsing
+app.add_middleware(security_service.RateLimitMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(timing.ServerTimingMiddleware)
+app.add_middleware(db_monitor.DbMonitorMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1893,6 +2120,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def _database_probe() -> bool:
+    await db.command("ping")
+    return True
+
+def _check_storage() -> dict:
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    test_file = UPLOAD_DIR / ".health_check"
+    test_file.write_text("ok")
+    test_file.unlink()
+    return {"healthy": True, "writable": True, "path": str(UPLOAD_DIR)}
+
+async def _storage_probe() -> dict:
+    return await asyncio.to_thread(_check_storage)
+
+async def _data_probe() -> dict:
+    # Metadata counts - count_documents({}) would scan every collection on each probe
+    users, products, workspaces = await asyncio.gather(
+        db.users.estimated_document_count(),
+        db.products.estimated_document_count(),
+        db.workspaces.estimated_document_count()
+    )
+    return {"healthy": True, "users": users, "products": products, "workspaces": workspaces}
+
+health_monitor.register("llm", llm_service.is_available)
+health_monitor.register("rag", rag_client.is_available)
+health_monitor.register("database", _database_probe)
+health_monitor.register("storage", _storage_probe)
+health_monitor.register("data", _data_probe)
+
+@app.on_event("startup")
+async def start_background_monitors():
+    health_monitor.start()
+    loop_monitor.start()
+    await security_service.start_backends(db)
+    rag_ingestor.start(db)
+    await workspace_exporter.start(db)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await loop_monitor.stop()
+    await health_monitor.stop()
+    await security_service.stop_backends()
+    await rag_ingestor.stop()
+    await workspace_exporter.stop()
+    await rag_client.close()
     client.close()
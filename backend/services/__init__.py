@@ -3,10 +3,12 @@ from .llm_provider import llm_service, LLMService
 from .rag_client import rag_client, RAGClient
 from .webhook_service import webhook_service, WebhookService
 from .campaign_builder import campaign_builder, CampaignBuilder
+from .health_monitor import health_monitor, HealthMonitor
 
 __all__ = [
     "llm_service", "LLMService",
     "rag_client", "RAGClient", 
     "webhook_service", "WebhookService",
-    "campaign_builder", "CampaignBuilder"
+    "campaign_builder", "CampaignBuilder",
+    "health_monitor", "HealthMonitor"
 ]
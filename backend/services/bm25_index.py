@@ -0,0 +1,439 @@
+"""
+BM25 Index - embedded lexical retrieval backend
+Inverted index with array-backed posting lists and a light PT/EN analyzer
+(accent folding, stopwords, plural/suffix stripping). Needs nothing beyond the
+standard library; NumPy, when installed, vectorizes score accumulation.
+"""
+import os
+import re
+import json
+import math
+import time
+import heapq
+import asyncio
+import threading
+from array import array
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import logging
+
+try:
+    import numpy as np
+except ImportError:  # pure Python scoring
+    np = None
+
+from .rag_client import RetrievalBackend, fold_accents, prepare_document, acquire_writer_lock
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+RAG_INDEX_DIR = os.environ.get('RAG_INDEX_DIR', '/app/data/rag_index')
+BM25_K1 = float(os.environ.get('BM25_K1', '1.2'))                               # term frequency saturation
+BM25_B = float(os.environ.get('BM25_B', '0.75'))                                # document length normalization
+RAG_COMPACT_RATIO = float(os.environ.get('RAG_COMPACT_RATIO', '0.25'))          # compact once this share of docs is deleted
+RAG_INLINE_SEARCH_ROWS = int(os.environ.get('RAG_INLINE_SEARCH_ROWS', '20000')) # larger indexes are searched off the event loop
+RAG_INDEX_REFRESH_SECONDS = float(os.environ.get('RAG_INDEX_REFRESH_SECONDS', '2'))  # read-only workers pick up writes
+
+LOG_FILE = "bm25.jsonl"
+MIN_COMPACT_ROWS = 1024
+MAX_TF = 65535  # 'H' postings
+TERM_CACHE_SIZE = 262144
+
+_WORD_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a o os as um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas para pra com sem
+sobre entre e ou mas que se ao aos como mais menos muito muita muitos muitas ja nao sim seu sua seus suas
+meu minha meus minhas teu tua nosso nossa nossos nossas este esta estes estas esse essa esses essas isso
+isto aquele aquela aquilo ele ela eles elas eu tu voce voces lhe lhes ser sao foi era ter tem ha ate
+quando onde qual quais tambem so ainda cada todo toda todos todas outro outra num numa
+an the and or but of to in on at for with by from as is are was were be been being it its this that
+these those you your we our they their he she his her i my me not do does did how what which who whom
+will would can could should if so than then there into about more most also just very all any each
+""".split())
+
+# Longest match first; the replacement keeps singular and plural on the same term
+_SUFFIXES = (
+    ("coes", "cao"), ("soes", "sao"), ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"),
+    ("ois", "ol"), ("mente", ""), ("ies", "y"), ("ing", ""),
+)
+_ES_AFTER = ("s", "x", "z", "r", "h")     # flores -> flor, classes -> class, matches -> match
+_KEEP_S = ("ss", "us", "is")              # business, bonus, analysis
+
+
+def stem(token: str) -> str:
+    """Light inflectional stemming for PT and EN; symmetric for queries and documents"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + replacement
+    if token.endswith("es") and token[-3] in _ES_AFTER:
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(_KEEP_S):
+        return token[:-1]
+    return token
+
+
+@lru_cache(maxsize=TERM_CACHE_SIZE)
+def _term(word: str) -> Optional[str]:
+    """Folded, stemmed term for a lowercased word; None for stopwords (vocabularies are small, so cache)"""
+    token = fold_accents(word)
+    return None if token in STOPWORDS else stem(token)
+
+
+def analyze(text: str) -> List[str]:
+    """Index/query terms: folded tokens without stopwords, stemmed"""
+    return [term for term in map(_term, _WORD_RE.findall(text.lower())) if term]
+
+
+class BM25Index:
+    """Inverted index over appended documents.
+
+    Each term owns two parallel arrays: document numbers ('I', ascending because
+    documents are only appended) and term frequencies ('H'). Deleting a document
+    clears its live flag and document frequencies; its postings are skipped until
+    compaction renumbers the live documents. With `path`, documents are also
+    appended to a JSONL log that is replayed on start; the first process to open
+    the directory holds its writer.lock, others open it read-only and refresh()
+    from the log the writer appends to (or replaces when compacting).
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+        self._log = None
+        self._journal: Optional[List[Dict[str, Any]]] = None   # updates made during compaction
+        self.read_only = False
+        self._log_inode = None                  # log file replayed so far (readers)
+        self._log_offset = 0
+        self._next_refresh = 0.0
+        if self.path:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._writer_lock = acquire_writer_lock(self.path)
+            self.read_only = self._writer_lock is None
+            self._load()
+
+    _STATE = ("_terms", "_postings_docs", "_postings_tfs", "_df", "_lengths", "_live", "_ids", "_docs",
+              "_rows", "_total_length")
+
+    def _reset(self):
+        self._terms: Dict[str, int] = {}
+        self._postings_docs: List[array] = []
+        self._postings_tfs: List[array] = []
+        self._df = array("I")                  # live document frequency per term
+        self._lengths = array("I")             # terms per document number
+        self._live = array("B")
+        self._ids: List[Optional[str]] = []
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}        # document id -> document number
+        self._total_length = 0                 # terms over live documents
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def rows(self) -> int:
+        return len(self._lengths)
+
+    # ---------- Persistence ----------
+
+    def _load(self):
+        log_path = self.path / LOG_FILE
+        if log_path.exists():
+            self._replay(log_path)
+        if not self.read_only:
+            self._log = open(log_path, "ab")
+        logger.info(f"BM25 index loaded from {self.path}{' (read-only)' if self.read_only else ''}: "
+                    f"{len(self)} documents, {len(self._terms)} terms")
+
+    def _replay(self, log_path: Path):
+        """Apply log records from _log_offset on; the writer truncates a torn tail, readers wait for it"""
+        with open(log_path, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self._log_inode:
+                self._log_inode, self._log_offset = inode, 0
+            valid = self._log_offset
+            f.seek(valid)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write at the tail from a crash (or still being written)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record["op"] == "add":
+                    self._index(record["id"], record["doc"])
+                else:
+                    self._remove(record["id"])
+                valid += len(line)
+        self._log_offset = valid
+        if not self.read_only and valid < log_path.stat().st_size:
+            logger.warning(f"Truncating partial record at the end of {log_path}")
+            os.truncate(log_path, valid)
+
+    def refresh_due(self) -> bool:
+        return self.read_only and time.monotonic() >= self._next_refresh
+
+    def refresh(self):
+        """Read-only instances: apply what the writer appended, or rebuild after it compacted"""
+        if not self.read_only:
+            return
+        self._next_refresh = time.monotonic() + RAG_INDEX_REFRESH_SECONDS
+        log_path = self.path / LOG_FILE
+        try:
+            stat = log_path.stat()
+            if stat.st_ino == self._log_inode and stat.st_size <= self._log_offset:
+                return
+            if stat.st_ino != self._log_inode:
+                # Compaction replaced the log: rebuild aside and swap, so searches never see a partial index
+                fresh = BM25Index(k1=self.k1, b=self.b)
+                fresh.path, fresh.read_only = self.path, True
+                fresh._replay(log_path)
+                with self._lock:
+                    for attr in (*self._STATE, "_log_inode", "_log_offset"):
+                        setattr(self, attr, getattr(fresh, attr))
+                return
+            with self._lock:
+                self._replay(log_path)
+        except FileNotFoundError:
+            pass  # replaced between stat and open - retry next time
+
+    def _append(self, records: List[Dict[str, Any]]):
+        if self._journal is not None:
+            self._journal.extend(records)
+        if self._log is None:
+            return
+        self._log.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode())
+        self._log.flush()
+
+    # ---------- Indexing ----------
+
+    def _index(self, doc_id: str, doc: Dict[str, Any]):
+        self._remove(doc_id)  # re-adding an id replaces it
+        terms = analyze(doc["content"])
+        row = len(self._lengths)
+        vocabulary, postings_docs, postings_tfs, df = self._terms, self._postings_docs, self._postings_tfs, self._df
+        for term, tf in Counter(terms).items():
+            term_id = vocabulary.get(term)
+            if term_id is None:
+                term_id = vocabulary[term] = len(postings_docs)
+                postings_docs.append(array("I"))
+                postings_tfs.append(array("H"))
+                df.append(0)
+            postings_docs[term_id].append(row)
+            postings_tfs[term_id].append(tf if tf < MAX_TF else MAX_TF)
+            df[term_id] += 1
+        self._lengths.append(len(terms))
+        self._live.append(1)
+        self._ids.append(doc_id)
+        self._docs.append(doc)
+        self._rows[doc_id] = row
+        self._total_length += len(terms)
+
+    def _remove(self, doc_id: str) -> bool:
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return False
+        for term in set(analyze(self._docs[row]["content"])):
+            self._df[self._terms[term]] -= 1
+        self._live[row] = 0
+        self._total_length -= self._lengths[row]
+        self._ids[row] = None
+        self._docs[row] = None
+        return True
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"BM25 index at {self.path} is written by another process")
+
+    def add(self, ids: List[str], docs: List[Dict[str, Any]]):
+        """Index documents ({content, source, metadata}); existing ids are replaced"""
+        self._check_writable()
+        with self._lock:
+            records = [{"op": "add", "id": doc_id, "doc": doc} for doc_id, doc in zip(ids, docs)]
+            for record in records:
+                self._index(record["id"], record["doc"])
+            self._append(records)
+        self._maybe_compact()
+
+    def delete(self, ids: List[str]) -> int:
+        """Remove documents by id; returns how many existed"""
+        self._check_writable()
+        with self._lock:
+            records = [{"op": "delete", "id": doc_id} for doc_id in ids if self._remove(doc_id)]
+            if records:
+                self._append(records)
+        if records:
+            self._maybe_compact()
+        return len(records)
+
+    def _maybe_compact(self):
+        dead = self.rows - len(self._rows)
+        if self.rows >= MIN_COMPACT_ROWS and dead > self.rows * RAG_COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Rebuild postings over live documents only and rewrite the log.
+
+        The rebuild runs outside the lock, so searches and updates continue on the
+        old postings; updates made meanwhile are journaled and replayed before the swap.
+        """
+        self._check_writable()
+        with self._lock:
+            if self._journal is not None:
+                return  # already compacting
+            live = [(doc_id, self._docs[row]) for doc_id, row in sorted(self._rows.items(), key=lambda item: item[1])]
+            self._journal = []
+
+        try:
+            fresh = BM25Index(k1=self.k1, b=self.b)
+            for doc_id, doc in live:
+                fresh._index(doc_id, doc)
+            tmp = None
+            if self.path:
+                tmp = self.path / f"{LOG_FILE}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write("".join(
+                        json.dumps({"op": "add", "id": doc_id, "doc": doc}, ensure_ascii=False) + "\n"
+                        for doc_id, doc in live
+                    ).encode())
+
+            with self._lock:
+                journal, self._journal = self._journal, None
+                for record in journal:
+                    if record["op"] == "add":
+                        fresh._index(record["id"], record["doc"])
+                    else:
+                        fresh._remove(record["id"])
+                for attr in self._STATE:
+                    setattr(self, attr, getattr(fresh, attr))
+                if tmp is not None:
+                    with open(tmp, "ab") as f:
+                        f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in journal).encode())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._log.close()
+                    os.replace(tmp, self.path / LOG_FILE)
+                    self._log = open(self.path / LOG_FILE, "ab")
+        finally:
+            self._journal = None
+        logger.info(f"BM25 index compacted: {len(self)} documents, {len(self._terms)} terms")
+
+    # ---------- Search ----------
+
+    def _query_terms(self, query: str) -> List[tuple]:
+        """(term id, idf) for the query's distinct terms that occur in live documents"""
+        n = len(self._rows)
+        terms = []
+        for term in dict.fromkeys(analyze(query)):
+            term_id = self._terms.get(term)
+            if term_id is not None and self._df[term_id]:
+                df = self._df[term_id]
+                terms.append((term_id, math.log(1 + (n - df + 0.5) / (df + 0.5))))
+        return terms
+
+    def _scores_python(self, terms: List[tuple], avgdl: float) -> Dict[int, float]:
+        k1, live, lengths = self.k1, self._live, self._lengths
+        base, scale = k1 * (1 - self.b), k1 * self.b / avgdl
+        scores: Dict[int, float] = {}
+        get = scores.get
+        for term_id, idf in terms:
+            weight = idf * (k1 + 1)
+            for row, tf in zip(self._postings_docs[term_id], self._postings_tfs[term_id]):
+                if live[row]:
+                    scores[row] = get(row, 0.0) + weight * tf / (tf + base + scale * lengths[row])
+        return scores
+
+    def _top_numpy(self, terms: List[tuple], avgdl: float, top_k: int) -> List[tuple]:
+        # frombuffer views share memory with the arrays; they are released before any append
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        base, scale = self.k1 * (1 - self.b), self.k1 * self.b / avgdl
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        for term_id, idf in terms:
+            rows = np.frombuffer(self._postings_docs[term_id], dtype=np.uint32)
+            tf = np.frombuffer(self._postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+            scores[rows] += idf * (self.k1 + 1) * tf / (tf + base + scale * lengths[rows])
+        scores *= np.frombuffer(self._live, dtype=np.uint8)
+        matched = int(np.count_nonzero(scores))
+        k = min(top_k, matched)
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return sorted(((int(row), float(scores[row])) for row in top), key=lambda item: -item[1])
+
+    def search(self, query: str, top_k: int, use_numpy: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Top-k live documents by BM25 score, best first"""
+        with self._lock:
+            terms = self._query_terms(query)
+            if not terms or top_k <= 0:
+                return []
+            avgdl = self._total_length / len(self._rows) or 1.0
+            if use_numpy is None:
+                use_numpy = np is not None
+            if use_numpy:
+                ranked = self._top_numpy(terms, avgdl, top_k)
+            else:
+                ranked = heapq.nlargest(top_k, self._scores_python(terms, avgdl).items(), key=lambda item: item[1])
+            return [
+                {"id": self._ids[row], **self._docs[row], "score": round(score, 4)}
+                for row, score in ranked
+            ]
+
+    def get_status(self) -> Dict[str, Any]:
+        postings = sum(len(docs) for docs in self._postings_docs)
+        return {
+            "documents": len(self),
+            "rows": self.rows,
+            "terms": len(self._terms),
+            "postings": postings,
+            "postings_bytes": postings * 6,  # 'I' doc number + 'H' frequency
+            "scoring": "numpy" if np is not None else "python",
+            "read_only": self.read_only,
+            "path": str(self.path) if self.path else None
+        }
+
+
+class BM25RetrievalBackend(RetrievalBackend):
+    """Embedded BM25 index behind the RAGClient API"""
+
+    name = "bm25"
+    writable = True
+
+    def __init__(self, index_dir: Optional[str] = RAG_INDEX_DIR):
+        self.index = BM25Index(index_dir)
+
+    @property
+    def read_only(self) -> bool:
+        return self.index.read_only
+
+    async def retrieve(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        if self.index.refresh_due():
+            await asyncio.to_thread(self.index.refresh)
+        if self.index.rows > RAG_INLINE_SEARCH_ROWS:
+            return await asyncio.to_thread(self.index.search, query, top_k)
+        return self.index.search(query, top_k)
+
+    async def add_documents(self, documents: List[Dict[str, Any]]) -> int:
+        prepared = [doc for doc in map(prepare_document, documents) if doc]
+        if prepared:
+            await asyncio.to_thread(
+                self.index.add,
+                [doc["id"] for doc in prepared],
+                [{"content": doc["content"], "source": doc["source"], "metadata": doc["metadata"]} for doc in prepared]
+            )
+        return len(prepared)
+
+    async def delete_documents(self, ids: List[str]) -> int:
+        return await asyncio.to_thread(self.index.delete, ids)
+
+    async def is_available(self) -> bool:
+        return True
+
+    def get_status(self) -> Dict[str, Any]:
+        return {"index": self.index.get_status()}
@@ -6,10 +6,8 @@ import os
 import json
 import uuid
 import zipfile
-import tempfile
-import shutil
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator, Tuple
 from pathlib import Path
 import logging
 
@@ -18,6 +16,32 @@ from .rag_client import rag_client
 
 logger = logging.getLogger(__name__)
 
+class _ZipSink:
+    """Write-only, unseekable file object collecting zipfile output until drained"""
+    
+    def __init__(self):
+        self._chunks: List[bytes] = []
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _zip_timestamp(created_at: Optional[str]) -> Tuple[int, int, int, int, int, int]:
+    """Entry timestamp from the campaign, so the same campaign always zips to the same bytes"""
+    try:
+        moment = datetime.fromisoformat(created_at)
+    except (TypeError, ValueError):
+        moment = datetime.now(timezone.utc)
+    return (max(moment.year, 1980), moment.month, moment.day, moment.hour, moment.minute, moment.second)
+
 class CampaignBuilder:
     """Generates complete marketing campaign assets"""
     
@@ -93,6 +117,45 @@ Segue as instruções exactamente e formata o output conforme pedido."""
             "rag_used": bool(rag_context)
         }
     
+    # Regenerable section -> asset key (each section is one LLM call)
+    SECTIONS = {
+        "landing": "landing_copy",
+        "ads": "ad_variations",
+        "creatives": "creative_ideas",
+        "emails": "email_sequence",
+        "checklist": "checklist"
+    }
+    RAG_SECTIONS = ("landing", "ads", "emails")
+    
+    async def regenerate_section(self, campaign: Dict[str, Any], section: str, use_rag: bool = True) -> Any:
+        """Generate one section again from the campaign's stored config (one LLM call)"""
+        config = campaign.get("config", {})
+        niche = config.get("niche", "")
+        product = config.get("product", "")
+        offer = config.get("offer", "")
+        price = config.get("price", "")
+        objective = config.get("objective", "")
+        tone = config.get("tone", "")
+        channel = config.get("channel", "")
+        language = config.get("language", "pt")
+        
+        rag_context = ""
+        if use_rag and section in self.RAG_SECTIONS:
+            docs = await rag_client.retrieve(f"{niche} {product} marketing {channel}")
+            rag_context = rag_client.format_context(docs)
+        
+        if section == "landing":
+            return await self._generate_landing_copy(niche, product, offer, price, objective, tone, language, rag_context)
+        if section == "ads":
+            return await self._generate_ad_variations(niche, product, offer, price, objective, tone, channel, language, rag_context)
+        if section == "creatives":
+            return await self._generate_creative_ideas(niche, product, offer, channel, tone, language)
+        if section == "emails":
+            return await self._generate_email_sequence(niche, product, offer, price, objective, tone, language, rag_context)
+        if section == "checklist":
+            return await self._generate_checklist(channel, objective, language)
+        raise ValueError(f"Unknown campaign section: {section}")
+    
     async def _generate_landing_copy(
         self, niche: str, product: str, offer: str, price: str,
         objective: str, tone: str, language: str, rag_context: str
@@ -284,78 +347,61 @@ IMPORTANTE: Responde APENAS com JSON válido, sem texto adicional."""
             logger.error(f"JSON parse error: {e}")
             return {"error": "Failed to parse response", "raw": text[:500]}
     
+    # (asset key, file name, renderer name) in archive order
+    MARKDOWN_FILES = (
+        ("landing_copy", "landing_copy.md", "_landing_to_markdown"),
+        ("ad_variations", "ad_variations.md", "_ads_to_markdown"),
+        ("creative_ideas", "creative_ideas.md", "_creatives_to_markdown"),
+        ("email_sequence", "email_sequence.md", "_emails_to_markdown"),
+        ("checklist", "checklist.md", "_checklist_to_markdown"),
+    )
+    
+    def iter_files(self, campaign: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+        """Render campaign files lazily as (name, text): the full JSON, then Markdown per asset"""
+        yield "campaign.json", json.dumps(campaign, ensure_ascii=False, indent=2, default=str)
+        
+        assets = campaign.get("assets", {})
+        config = campaign.get("config", {})
+        for key, filename, renderer in self.MARKDOWN_FILES:
+            if key in assets:
+                yield filename, getattr(self, renderer)(assets[key], config)
+    
     def export_to_files(self, campaign: Dict[str, Any], output_dir: Path) -> Dict[str, str]:
         """Export campaign to files (JSON + Markdown)"""
         output_dir.mkdir(parents=True, exist_ok=True)
         
         files_created = {}
-        
-        # Export full JSON
-        json_path = output_dir / "campaign.json"
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(campaign, f, ensure_ascii=False, indent=2)
-        files_created["campaign.json"] = str(json_path)
-        
-        # Export Markdown versions
-        assets = campaign.get("assets", {})
-        config = campaign.get("config", {})
-        
-        # Landing copy markdown
-        if "landing_copy" in assets:
-            md_content = self._landing_to_markdown(assets["landing_copy"], config)
-            md_path = output_dir / "landing_copy.md"
-            with open(md_path, "w", encoding="utf-8") as f:
-                f.write(md_content)
-            files_created["landing_copy.md"] = str(md_path)
-        
-        # Ads markdown
-        if "ad_variations" in assets:
-            md_content = self._ads_to_markdown(assets["ad_variations"], config)
-            md_path = output_dir / "ad_variations.md"
-            with open(md_path, "w", encoding="utf-8") as f:
-                f.write(md_content)
-            files_created["ad_variations.md"] = str(md_path)
-        
-        # Creative ideas markdown
-        if "creative_ideas" in assets:
-            md_content = self._creatives_to_markdown(assets["creative_ideas"], config)
-            md_path = output_dir / "creative_ideas.md"
-            with open(md_path, "w", encoding="utf-8") as f:
-                f.write(md_content)
-            files_created["creative_ideas.md"] = str(md_path)
-        
-        # Email sequence markdown
-        if "email_sequence" in assets:
-            md_content = self._emails_to_markdown(assets["email_sequence"], config)
-            md_path = output_dir / "email_sequence.md"
-            with open(md_path, "w", encoding="utf-8") as f:
-                f.write(md_content)
-            files_created["email_sequence.md"] = str(md_path)
-        
-        # Checklist markdown
-        if "checklist" in assets:
-            md_content = self._checklist_to_markdown(assets["checklist"], config)
-            md_path = output_dir / "checklist.md"
-            with open(md_path, "w", encoding="utf-8") as f:
-                f.write(md_content)
-            files_created["checklist.md"] = str(md_path)
+        for filename, content in self.iter_files(campaign):
+            file_path = output_dir / filename
+            file_path.write_text(content, encoding="utf-8")
+            files_created[filename] = str(file_path)
         
         return files_created
     
+    def stream_zip(self, campaign: Dict[str, Any]) -> Iterator[bytes]:
+        """
+        Yield a ZIP of iter_files() incrementally: each file is rendered, deflated
+        and handed out before the next one is rendered, with no disk I/O and no
+        full archive in memory. Blocking (CPU) - iterate it in a worker thread.
+        """
+        sink = _ZipSink()
+        date_time = _zip_timestamp(campaign.get("created_at"))
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for filename, content in self.iter_files(campaign):
+                info = zipfile.ZipInfo(filename, date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                zf.writestr(info, content)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        chunk = sink.drain()  # central directory
+        if chunk:
+            yield chunk
+    
     def create_zip(self, campaign: Dict[str, Any]) -> bytes:
         """Create ZIP file with all campaign assets"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            output_dir = Path(tmpdir) / "campaign"
-            self.export_to_files(campaign, output_dir)
-            
-            zip_path = Path(tmpdir) / "campaign.zip"
-            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-                for file_path in output_dir.rglob("*"):
-                    if file_path.is_file():
-                        arcname = file_path.relative_to(output_dir)
-                        zf.write(file_path, arcname)
-            
-            return zip_path.read_bytes()
+        return b"".join(self.stream_zip(campaign))
     
     def _landing_to_markdown(self, data: Dict, config: Dict) -> str:
         if isinstance(data, dict) and "error" in data:
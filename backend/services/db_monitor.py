@@ -0,0 +1,199 @@
+"""
+Database Monitor - pymongo command monitoring
+Feeds MongoDB command counts and latency into the metrics registry, attributes
+commands to the current route, logs slow commands with redacted filters and
+enforces per-route query budgets.
+"""
+import os
+import json
+import threading
+import contextvars
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+from pymongo import monitoring
+
+from .metrics import metrics, mongo_commands_total, mongo_command_duration
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+DB_MONITOR_ENABLED = os.environ.get('DB_MONITOR_ENABLED', 'true').lower() == 'true'
+DB_SLOW_COMMAND_MS = float(os.environ.get('DB_SLOW_COMMAND_MS', '100'))
+DB_QUERY_BUDGET = int(os.environ.get('DB_QUERY_BUDGET', '0'))                  # default per-request budget, 0 = none
+DB_QUERY_BUDGETS = json.loads(os.environ.get('DB_QUERY_BUDGETS', '{}'))        # {"/api/workspaces/{workspace_id}/members": 3}
+DB_QUERY_BUDGET_STRICT = os.environ.get('DB_QUERY_BUDGET_STRICT', 'false').lower() == 'true'  # fail the request (tests/CI)
+
+# Command fields that carry no query shape (or carry whole documents)
+_NOISE_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "documents", "signature", "apiVersion"}
+
+mongo_commands_per_request = metrics.histogram(
+    "noxloop_mongo_commands_per_request", "MongoDB commands issued per HTTP request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100))
+mongo_route_command_seconds = metrics.counter(
+    "noxloop_mongo_route_command_seconds_total", "Time spent in MongoDB commands per route", ["route"])
+mongo_slow_commands_total = metrics.counter(
+    "noxloop_mongo_slow_commands_total", "MongoDB commands slower than DB_SLOW_COMMAND_MS", ["command", "collection"])
+mongo_budget_exceeded_total = metrics.counter(
+    "noxloop_mongo_query_budget_exceeded_total", "Requests that exceeded their query budget", ["route"])
+
+
+def redact(value: Any, depth: int = 0) -> Any:
+    """Keep the shape of a query (keys and operators), replace every value with '?'"""
+    if depth > 6:
+        return "..."
+    if isinstance(value, dict):
+        return {k: redact(v, depth + 1) for k, v in value.items() if k not in _NOISE_FIELDS}
+    if isinstance(value, (list, tuple)):
+        return [redact(value[0], depth + 1)] if value else []
+    return "?"
+
+
+class RequestDbStats:
+    """Command count and time for one HTTP request (updated from Motor's executor threads)"""
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+_current: contextvars.ContextVar[Optional[RequestDbStats]] = contextvars.ContextVar("request_db_stats", default=None)
+
+
+def current() -> Optional[RequestDbStats]:
+    return _current.get()
+
+
+def budget_for(route: str) -> int:
+    return int(DB_QUERY_BUDGETS.get(route, DB_QUERY_BUDGET))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Records every command Motor sends (callbacks run on Motor's executor threads,
+    which Motor runs inside a copy of the caller's context)"""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, int], Tuple[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.slow_threshold = DB_SLOW_COMMAND_MS / 1000
+
+    @staticmethod
+    def _event_key(event) -> Tuple[int, int]:
+        return (event.request_id, event.operation_id)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        with self._lock:
+            self._pending[self._event_key(event)] = (collection, event.command)
+
+    def _finish(self, event, status: str):
+        with self._lock:
+            collection, command = self._pending.pop(self._event_key(event), ("-", None))
+        seconds = event.duration_micros / 1_000_000
+        mongo_commands_total.inc(command=event.command_name, collection=collection, status=status)
+        mongo_command_duration.observe(seconds, command=event.command_name, collection=collection)
+        timing.record("db", seconds)
+
+        stats = _current.get()
+        if stats is not None:
+            stats.add(seconds)
+
+        if seconds >= self.slow_threshold:
+            mongo_slow_commands_total.inc(command=event.command_name, collection=collection)
+            logger.warning("slow_mongo_command " + json.dumps({
+                "command": event.command_name,
+                "collection": collection,
+                "duration_ms": round(seconds * 1000, 2),
+                "status": status,
+                "route": stats.route if stats else None,
+                "shape": redact(command) if command is not None else None
+            }, default=str))
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class DbMonitorMiddleware:
+    """Pure ASGI middleware attributing Mongo commands to the route being served.
+
+    Adds an X-DB-Queries header so tests can assert query counts. When a route
+    goes over its budget it is logged, or with DB_QUERY_BUDGET_STRICT=true the
+    response is replaced by a 500 so CI fails loudly.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not DB_MONITOR_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats(scope)
+        token = _current.set(stats)
+        state = {"replaced": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                route = stats.route
+                budget = budget_for(route)
+                if budget and stats.count > budget:
+                    mongo_budget_exceeded_total.inc(route=route)
+                    logger.warning(f"Query budget exceeded on {scope.get('method')} {route}: {stats.count} > {budget}")
+                    if DB_QUERY_BUDGET_STRICT:
+                        state["replaced"] = True
+                        body = json.dumps({"detail": f"Query budget exceeded: {stats.count} > {budget} on {route}"}).encode()
+                        await send({
+                            "type": "http.response.start", "status": 500,
+                            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                        (b"x-db-queries", str(stats.count).encode())]
+                        })
+                        await send({"type": "http.response.body", "body": body})
+                        return
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                message = {**message, "headers": headers}
+            elif state["replaced"]:
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = stats.route
+            mongo_commands_per_request.observe(stats.count, route=route)
+            if stats.seconds:
+                mongo_route_command_seconds.inc(stats.seconds, route=route)
+
+
+def get_status() -> Dict[str, Any]:
+    return {
+        "enabled": DB_MONITOR_ENABLED,
+        "slow_command_ms": DB_SLOW_COMMAND_MS,
+        "default_budget": DB_QUERY_BUDGET,
+        "route_budgets": DB_QUERY_BUDGETS,
+        "strict": DB_QUERY_BUDGET_STRICT
+    }
+
+
+# Global instance - pass to AsyncIOMotorClient(event_listeners=[...])
+command_listener = MongoCommandListener()
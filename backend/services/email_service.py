@@ -12,6 +12,9 @@ import logging
 import secrets
 from datetime import datetime, timezone, timedelta
 
+from .metrics import side_effects_in_flight, side_effects_total
+from . import timing
+
 logger = logging.getLogger(__name__)
 
 # ==================== CONFIGURATION ====================
@@ -49,6 +52,17 @@ class EmailService:
             logger.info(f"Email disabled - would send to {to_email}: {subject}")
             return False
         
+        side_effects_in_flight.inc(kind="email")
+        try:
+            with timing.phase("email"):
+                sent = self._deliver(to_email, subject, html_content, text_content)
+        finally:
+            side_effects_in_flight.dec(kind="email")
+        side_effects_total.inc(kind="email", status="ok" if sent else "failed")
+        return sent
+    
+    def _deliver(self, to_email: str, subject: str, html_content: str, text_content: str = None) -> bool:
+        """Build the message and hand it to the SMTP server"""
         try:
             msg = MIMEMultipart("alternative")
             msg["Subject"] = subject
@@ -0,0 +1,142 @@
+"""
+Export Cache - content-addressed on-disk cache of rendered export artifacts
+Artifacts are named by export key and content hash, so a changed document simply
+gets a new file and old ones age out. The directory is bounded by total size
+with LRU eviction (hits refresh the file mtime); the directory itself is the
+index, so several worker processes can share it.
+"""
+import os
+import json
+import uuid
+import asyncio
+import hashlib
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterable
+import logging
+
+from .metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+EXPORT_CACHE_ENABLED = os.environ.get('EXPORT_CACHE_ENABLED', 'true').lower() == 'true'
+EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', '/app/exports/cache')
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+# Bump when the rendered output changes (markdown templates, archive layout)
+ARTIFACT_VERSION = 1
+
+
+def content_hash(document: Dict[str, Any]) -> str:
+    """Stable hash of a document and the artifact format version"""
+    canonical = json.dumps(document, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"v{ARTIFACT_VERSION}\n{canonical}".encode()).hexdigest()
+
+
+class ExportCache:
+    """Size-bounded LRU directory of immutable export files"""
+
+    def __init__(self, directory: str = EXPORT_CACHE_DIR, max_bytes: int = EXPORT_CACHE_MAX_BYTES,
+                 enabled: bool = EXPORT_CACHE_ENABLED):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._evict_lock = threading.Lock()
+
+    def path_for(self, key: str, digest: str, suffix: str = ".zip") -> Path:
+        return self.directory / f"{key}-{digest[:32]}{suffix}"
+
+    async def get_or_create(self, key: str, digest: str, render: Callable[[], Iterable[bytes]],
+                            suffix: str = ".zip") -> Path:
+        """
+        Path of the cached artifact, rendering it in a worker thread on a miss.
+        Concurrent misses for the same artifact share one render.
+        """
+        path = self.path_for(key, digest, suffix)
+        if self._touch(path):
+            record_cache("export", True)
+            return path
+
+        record_cache("export", False)
+        future = self._inflight.get(path.name)
+        if future is None:
+            future = self._inflight[path.name] = asyncio.ensure_future(asyncio.to_thread(self._build, path, render))
+            future.add_done_callback(lambda _: self._inflight.pop(path.name, None))
+        # shield: a client that disconnects must not cancel a render others are awaiting
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        """Mark a hit as recently used; False when the file is not cached"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _build(self, path: Path, render: Callable[[], Iterable[bytes]]) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in render():
+                    f.write(chunk)
+            os.replace(tmp, path)  # readers only ever see complete files
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: Path):
+        """Delete least recently used artifacts until the directory fits max_bytes"""
+        with self._evict_lock:
+            entries = []
+            stale_before = time.time() - 3600
+            for entry in os.scandir(self.directory):
+                if not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process
+                if entry.name.startswith("."):
+                    # Temp file of a render that died with its process
+                    if entry.name.endswith(".tmp") and stat.st_mtime < stale_before:
+                        Path(entry.path).unlink(missing_ok=True)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, file_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if file_path == str(keep):
+                    continue
+                try:
+                    os.unlink(file_path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                logger.debug(f"Export cache evicted {file_path}")
+
+    def get_status(self) -> Dict[str, Any]:
+        files, size = 0, 0
+        if self.directory.is_dir():
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith("."):
+                    files += 1
+                    size += entry.stat().st_size
+        return {
+            "enabled": self.enabled,
+            "path": str(self.directory),
+            "files": files,
+            "bytes": size,
+            "max_bytes": self.max_bytes
+        }
+
+
+# Global instance
+export_cache = ExportCache()
@@ -0,0 +1,142 @@
+"""
+Health Monitor - Background dependency probing with cached status
+Keeps LLM/RAG/database health fresh so request paths never wait on a probe
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, Awaitable, Dict, Any, Optional, List
+
+from .metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+HEALTH_PROBE_INTERVAL = float(os.environ.get('HEALTH_PROBE_INTERVAL', '15'))   # seconds between background probes
+HEALTH_MAX_STALENESS = float(os.environ.get('HEALTH_MAX_STALENESS', '60'))     # cached results older than this are re-probed
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', '5'))      # per-probe timeout
+
+
+class HealthMonitor:
+    """Runs registered probes on an interval and serves the last result from memory"""
+
+    def __init__(self):
+        self.interval = HEALTH_PROBE_INTERVAL
+        self.max_staleness = HEALTH_MAX_STALENESS
+        self.timeout = HEALTH_PROBE_TIMEOUT
+        self._probes: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, probe: Callable[[], Awaitable[Any]]):
+        """Register an async probe returning True when the dependency is healthy,
+        or a dict with a "healthy" key plus details to serve alongside it"""
+        self._probes[name] = probe
+
+    async def _execute(self, name: str) -> bool:
+        """Run a single probe and store its result"""
+        started = time.monotonic()
+        error = None
+        details = None
+        try:
+            outcome = await asyncio.wait_for(self._probes[name](), timeout=self.timeout)
+            if isinstance(outcome, dict):
+                details = {k: v for k, v in outcome.items() if k != "healthy"}
+                healthy = bool(outcome.get("healthy", True))
+            else:
+                healthy = bool(outcome)
+        except asyncio.TimeoutError:
+            healthy = False
+            error = f"timeout after {self.timeout}s"
+        except Exception as e:
+            healthy = False
+            error = str(e)
+
+        previous = self._results.get(name)
+        if previous is not None and previous["healthy"] != healthy:
+            logger.warning(f"Health of {name} changed: {'healthy' if healthy else 'unhealthy'}")
+
+        self._results[name] = {
+            "healthy": healthy,
+            "checked_at": time.time(),
+            "latency_ms": round((time.monotonic() - started) * 1000, 2),
+            "error": error,
+            "details": details
+        }
+        return healthy
+
+    async def probe(self, name: str) -> bool:
+        """Probe now, sharing one in-flight probe between concurrent callers"""
+        if name not in self._probes:
+            raise KeyError(f"Unknown health probe: {name}")
+
+        task = self._inflight.get(name)
+        if task is None:
+            task = asyncio.ensure_future(self._execute(name))
+            self._inflight[name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(name, None))
+        return await asyncio.shield(task)
+
+    async def refresh(self, names: Optional[List[str]] = None):
+        """Probe all (or the given) dependencies concurrently"""
+        await asyncio.gather(*(self.probe(name) for name in (names or list(self._probes))))
+
+    def get_cached(self, name: str) -> Optional[bool]:
+        """Return the cached result, or None if missing or older than the staleness bound"""
+        result = self._results.get(name)
+        if result is None or time.time() - result["checked_at"] > self.max_staleness:
+            return None
+        return result["healthy"]
+
+    def get_result(self, name: str) -> Optional[Dict[str, Any]]:
+        """Return the last full result (healthy, checked_at, latency_ms, error, details)"""
+        return self._results.get(name)
+
+    async def is_healthy(self, name: str) -> bool:
+        """Cached health in O(1); only probes inline when the cache is stale"""
+        cached = self.get_cached(name)
+        record_cache("health", cached is not None)
+        if cached is not None:
+            return cached
+        return await self.probe(name)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health refresh error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background probing loop (call from the app startup event)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+            logger.info(f"Health monitor started (interval={self.interval}s, max_staleness={self.max_staleness}s)")
+
+    async def stop(self):
+        """Stop the background probing loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get cached results for every registered probe"""
+        now = time.time()
+        return {
+            name: {
+                **result,
+                "age_seconds": round(now - result["checked_at"], 2),
+                "stale": now - result["checked_at"] > self.max_staleness
+            }
+            for name, result in self._results.items()
+        }
+
+# Global instance
+health_monitor = HealthMonitor()
@@ -3,16 +3,29 @@ LLM Provider Abstraction Layer
 Supports: local_llm (OpenAI-compatible), openai, mock
 """
 import os
+import re
+import json
+import time
 import logging
 import httpx
 from typing import Optional, List, Dict, Any
 from abc import ABC, abstractmethod
 
+from .metrics import llm_request_duration, llm_tokens_total, estimate_tokens
+from . import timing
+
 logger = logging.getLogger(__name__)
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
     
+    name = "none"
+    
+    def _record_usage(self, prompt_tokens: int, completion_tokens: int):
+        """Report token usage to metrics"""
+        llm_tokens_total.inc(prompt_tokens, provider=self.name, type="prompt")
+        llm_tokens_total.inc(completion_tokens, provider=self.name, type="completion")
+    
     @abstractmethod
     async def generate(self, prompt: str, system_message: str = "", max_tokens: int = 4000, temperature: float = 0.7) -> str:
         pass
@@ -24,8 +37,32 @@ class LLMProvider(ABC):
 class MockProvider(LLMProvider):
     """Mock provider for testing without API calls"""
     
+    name = "mock"
+    
+    @staticmethod
+    def _json_example(prompt: str) -> Optional[str]:
+        """
+        The JSON example of a prompt that asks for JSON only (the campaign
+        builder prompts), with the '... (mais N)' placeholders dropped, so
+        JSON callers get a parseable response shaped like the one requested.
+        """
+        if "APENAS com JSON" not in prompt:
+            return None
+        start = prompt.find("formato JSON")
+        end = prompt.find("IMPORTANTE:", start)
+        match = re.search(r"^\s*[\[{]", prompt[start:end], re.MULTILINE) if start >= 0 else None
+        if not match:
+            return None
+        example = prompt[start + match.start():end]
+        example = "\n".join(line for line in example.splitlines() if not line.strip().startswith("..."))
+        example = re.sub(r",(\s*[\]}])", r"\1", example)
+        try:
+            return json.dumps(json.loads(example), ensure_ascii=False, indent=2)
+        except json.JSONDecodeError:
+            return None
+    
     async def generate(self, prompt: str, system_message: str = "", max_tokens: int = 4000, temperature: float = 0.7) -> str:
-        return f"""# Mock Generated Content
+        content = self._json_example(prompt) or f"""# Mock Generated Content
 
 This is a mock response for testing purposes.
 
@@ -38,6 +75,8 @@ This is a mock response for testing purposes.
 ---
 *Generated by MockProvider - No LLM API was called*
 """
+        self._record_usage(estimate_tokens(system_message + prompt), estimate_tokens(content))
+        return content
     
     async def is_available(self) -> bool:
         return True
@@ -45,6 +84,8 @@ This is a mock response for testing purposes.
 class OpenAIProvider(LLMProvider):
     """OpenAI API provider"""
     
+    name = "openai"
+    
     def __init__(self, api_key: str, model: str = "gpt-4o"):
         self.api_key = api_key
         self.model = model
@@ -69,7 +110,13 @@ class OpenAIProvider(LLMProvider):
             max_tokens=max_tokens,
             temperature=temperature
         )
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        if usage:
+            self._record_usage(usage.prompt_tokens, usage.completion_tokens)
+        else:
+            self._record_usage(estimate_tokens(system_message + prompt), estimate_tokens(content or ""))
+        return content
     
     async def is_available(self) -> bool:
         return bool(self.api_key)
@@ -77,6 +124,8 @@ class OpenAIProvider(LLMProvider):
 class LocalLLMProvider(LLMProvider):
     """Local LLM provider (OpenAI-compatible API)"""
     
+    name = "local_llm"
+    
     def __init__(self, base_url: str, api_key: str = "not-needed", model: str = "local-model"):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
@@ -104,7 +153,13 @@ class LocalLLMProvider(LLMProvider):
             )
             response.raise_for_status()
             data = response.json()
-            return data["choices"][0]["message"]["content"]
+            content = data["choices"][0]["message"]["content"]
+            usage = data.get("usage") or {}
+            self._record_usage(
+                usage.get("prompt_tokens", estimate_tokens(system_message + prompt)),
+                usage.get("completion_tokens", estimate_tokens(content or ""))
+            )
+            return content
     
     async def is_available(self) -> bool:
         try:
@@ -155,11 +210,18 @@ class LLMService:
         if not self.provider:
             raise RuntimeError("No LLM provider configured")
         
+        started = time.perf_counter()
+        status = "ok"
         try:
             return await self.provider.generate(prompt, system_message, max_tokens, temperature)
         except Exception as e:
+            status = "error"
             logger.error(f"LLM generation error: {e}")
             raise
+        finally:
+            elapsed = time.perf_counter() - started
+            llm_request_duration.observe(elapsed, provider=self.provider_name, status=status)
+            timing.record("llm", elapsed)
     
     async def is_available(self) -> bool:
         """Check if the provider is available"""
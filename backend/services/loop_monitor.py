@@ -0,0 +1,130 @@
+"""
+Event Loop Monitor - loop lag sampling and blocking-call detection
+A sampler task measures how late the loop wakes it up; in debug mode a
+watchdog thread dumps the loop thread's stack while a callback is blocking it.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from typing import Dict, Any, Optional
+import logging
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+LOOP_MONITOR_ENABLED = os.environ.get('LOOP_MONITOR_ENABLED', 'true').lower() == 'true'
+LOOP_LAG_SAMPLE_INTERVAL = float(os.environ.get('LOOP_LAG_SAMPLE_INTERVAL', '0.5'))  # seconds
+LOOP_BLOCK_DEBUG = os.environ.get('LOOP_BLOCK_DEBUG', 'false').lower() == 'true'      # log stacks of blocking callbacks
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get('LOOP_BLOCK_THRESHOLD_MS', '100'))
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+loop_lag = metrics.histogram(
+    "noxloop_event_loop_lag_seconds", "Delay between scheduled and actual sampler wake-up", buckets=LAG_BUCKETS)
+loop_lag_max = metrics.gauge(
+    "noxloop_event_loop_lag_max_seconds", "Largest loop lag seen since the last scrape window")
+loop_blocked_total = metrics.counter(
+    "noxloop_event_loop_blocked_total", "Times a callback blocked the loop beyond LOOP_BLOCK_THRESHOLD_MS")
+
+
+class LoopMonitor:
+    """Samples event-loop lag and (optionally) reports blocking callbacks with a stack trace"""
+
+    def __init__(self):
+        self.enabled = LOOP_MONITOR_ENABLED
+        self.debug = LOOP_BLOCK_DEBUG
+        self.threshold = LOOP_BLOCK_THRESHOLD_MS / 1000
+        self.interval = LOOP_LAG_SAMPLE_INTERVAL
+        if self.debug:
+            # The heartbeat has to tick well inside the threshold for the watchdog to be precise
+            self.interval = min(self.interval, self.threshold / 4)
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._max_lag = 0.0
+        self._max_lag_window_start = time.monotonic()
+        loop_lag_max.set_function(self._read_max_lag)
+
+    def _read_max_lag(self) -> float:
+        value = self._max_lag
+        # Reset per scrape window so the gauge shows recent stalls, not the lifetime max
+        if time.monotonic() - self._max_lag_window_start > 60:
+            self._max_lag = 0.0
+            self._max_lag_window_start = time.monotonic()
+        return value
+
+    async def _sample(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            loop_lag.observe(lag)
+            if lag > self._max_lag:
+                self._max_lag = lag
+            if not self.debug and lag >= self.threshold:
+                loop_blocked_total.inc()
+                logger.warning(f"Event loop blocked for ~{lag * 1000:.0f}ms (set LOOP_BLOCK_DEBUG=true for stack traces)")
+
+    def _watch(self):
+        """Runs in its own thread; dumps the loop thread's stack once per stall"""
+        reported_for = None
+        poll = max(self.threshold / 4, 0.005)
+        while not self._stop.wait(poll):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or reported_for == heartbeat:
+                continue
+            reported_for = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            loop_blocked_total.inc()
+            logger.warning(f"Event loop blocked for >{stalled * 1000:.0f}ms; loop thread stack:\n{stack}")
+
+    def start(self):
+        """Start sampling (call from the app startup event)"""
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.ensure_future(self._sample())
+        if self.debug:
+            self._loop_thread_id = threading.get_ident()
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+        logger.info(f"Loop monitor started (interval={self.interval}s, debug={self.debug}, threshold={self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        """Stop sampling and the watchdog thread"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "debug": self.debug,
+            "threshold_ms": self.threshold * 1000,
+            "max_lag_ms": round(self._max_lag * 1000, 2)
+        }
+
+# Global instance
+loop_monitor = LoopMonitor()
@@ -0,0 +1,307 @@
+"""
+Metrics Service - Prometheus text-format metrics without external dependencies
+Counters, gauges and histograms with labels, plus an ASGI middleware for HTTP timing
+"""
+import os
+import time
+import math
+import threading
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # optional bearer token for /metrics
+
+# Latency buckets in seconds - generation calls take tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class - children are keyed by label values; all updates are thread-safe
+    (pymongo monitoring callbacks run on Motor's executor threads)"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        """Evaluate fn at scrape time (for sizes/depths owned by other objects)"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def get(self, **labels) -> float:
+        key = self._key(labels)
+        if key in self._functions:
+            return self._functions[key]()
+        return self._values.get(key, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                items[key] = fn()
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} callback failed: {e}")
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager observing elapsed seconds"""
+        return _Timer(self, labels)
+
+    def get_count(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Holds all metrics and renders the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+# Global registry
+metrics = MetricsRegistry()
+
+# ==================== APPLICATION METRICS ====================
+
+http_requests_total = metrics.counter(
+    "noxloop_http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"])
+http_request_duration = metrics.histogram(
+    "noxloop_http_request_duration_seconds", "HTTP request latency by route template", ["method", "route"])
+http_requests_in_flight = metrics.gauge(
+    "noxloop_http_requests_in_flight", "HTTP requests currently being served")
+
+mongo_commands_total = metrics.counter(
+    "noxloop_mongo_commands_total", "MongoDB commands by name, collection and outcome", ["command", "collection", "status"])
+mongo_command_duration = metrics.histogram(
+    "noxloop_mongo_command_duration_seconds", "MongoDB command latency", ["command", "collection"])
+
+llm_request_duration = metrics.histogram(
+    "noxloop_llm_request_duration_seconds", "LLM generation latency", ["provider", "status"])
+llm_tokens_total = metrics.counter(
+    "noxloop_llm_tokens_total", "LLM tokens (provider-reported, else estimated)", ["provider", "type"])
+rag_request_duration = metrics.histogram(
+    "noxloop_rag_request_duration_seconds", "RAG retrieval latency", ["status"])
+rag_context_tokens_total = metrics.counter(
+    "noxloop_rag_context_tokens_total", "Estimated RAG context tokens by outcome (included/dropped)", ["outcome"])
+rag_context_documents_total = metrics.counter(
+    "noxloop_rag_context_documents_total", "Retrieved chunks by context outcome", ["outcome"])
+rag_ingest_total = metrics.counter(
+    "noxloop_rag_ingest_total", "Ingestion jobs by kind and result (indexed/unchanged/deleted/skipped/forwarded/dropped/error)", ["kind", "result"])
+rag_ingest_queue_depth = metrics.gauge(
+    "noxloop_rag_ingest_queue_depth", "Documents waiting for RAG ingestion")
+
+side_effects_in_flight = metrics.gauge(
+    "noxloop_side_effects_in_flight", "Webhook/email deliveries currently pending", ["kind"])
+side_effects_total = metrics.counter(
+    "noxloop_side_effects_total", "Webhook/email deliveries by outcome", ["kind", "status"])
+
+cache_requests_total = metrics.counter(
+    "noxloop_cache_requests_total", "Cache lookups by cache and result (hit/miss; rag also stale/coalesced)", ["cache", "result"])
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 chars per token) when the provider reports no usage"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
+
+# ==================== HTTP MIDDLEWARE ====================
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by its route template.
+
+    The route is read after the app ran, when FastAPI has put the matched route
+    into the scope; unmatched paths share one label to bound cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            http_request_duration.observe(elapsed, method=method, route=template)
+            http_requests_total.inc(method=method, route=template, status=status_holder["status"])
+
+
+def get_status() -> Dict[str, Any]:
+    return {
+        "enabled": METRICS_ENABLED,
+        "protected": bool(METRICS_TOKEN)
+    }
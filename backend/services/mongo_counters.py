@@ -0,0 +1,266 @@
+"""
+MongoDB Counters - rate limit and credit guard state shared across nodes
+Counts locally and syncs batched deltas to bucketed MongoDB documents with
+atomic $inc upserts; TTL indexes expire old buckets and blocks. The sync interval
+trades accuracy (how stale other nodes' counts may be) against write load.
+"""
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .metrics import metrics
+from .security_service import CounterBackend, BoundedStore, abuse_state_entries, abuse_state_bytes
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+RATE_LIMIT_SYNC_INTERVAL = float(os.environ.get('RATE_LIMIT_SYNC_INTERVAL', '1'))         # seconds; lower = more accurate, more writes
+RATE_LIMIT_SYNC_MAX_PENDING = int(os.environ.get('RATE_LIMIT_SYNC_MAX_PENDING', '1000'))  # flush early beyond this many dirty buckets
+RATE_LIMIT_SYNC_MAX_KEYS = int(os.environ.get('RATE_LIMIT_SYNC_MAX_KEYS', '5000'))        # most recent keys refreshed per sync
+
+COUNTERS_COLLECTION = "rate_limit_counters"
+BLOCKS_COLLECTION = "rate_limit_blocks"
+
+rate_limit_syncs_total = metrics.counter(
+    "noxloop_rate_limit_syncs_total", "Rate limit state syncs with MongoDB", ["namespace", "status"])
+rate_limit_sync_pending = metrics.gauge(
+    "noxloop_rate_limit_sync_pending", "Counter buckets waiting to be flushed to MongoDB", ["namespace"])
+
+
+def _utc(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class MongoCounterBackend(CounterBackend):
+    """Counts are (global count at last sync) + (local deltas not yet flushed).
+
+    Reads and writes never wait on MongoDB: handlers see this node's traffic
+    immediately and other nodes' traffic after at most one sync interval.
+    Until start() attaches a database the backend behaves like the memory backend.
+    """
+
+    name = "mongo"
+
+    def __init__(self, namespace: str, sync_interval: float = RATE_LIMIT_SYNC_INTERVAL):
+        self.namespace = namespace
+        self.sync_interval = sync_interval
+        self._pending: Dict[Tuple[str, int, int], int] = {}        # (key, window, window_id) -> unflushed delta
+        self._pending_blocks: Dict[str, float] = {}
+        self._pending_clears: List[str] = []
+        self._remote = BoundedStore(f"{namespace}_remote")          # "key|window_id" -> global count at last sync
+        self._watched = BoundedStore(f"{namespace}_watched")        # key -> window, refreshed on every sync
+        self._blocks = BoundedStore(f"{namespace}_blocks")          # key -> block until (local + synced)
+        self._watched_blocks = BoundedStore(f"{namespace}_watched_blocks")
+        self._counters = None
+        self._blocks_collection = None
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        for store in (self._remote, self._watched, self._blocks):
+            abuse_state_entries.set_function(store.__len__, store=store.name)
+            abuse_state_bytes.set_function(store.estimated_bytes, store=store.name)
+        rate_limit_sync_pending.set_function(lambda: len(self._pending), namespace=namespace)
+
+    # ---------- CounterBackend ----------
+
+    def _bucket(self, key: str, window: int, window_id: int) -> int:
+        return (self._remote.get(f"{key}|{window_id}") or 0) + self._pending.get((key, window, window_id), 0)
+
+    def counts(self, key: str, window: int, now: float) -> Tuple[int, int]:
+        window_id = int(now // window)
+        self._watched.set(key, window)
+        return self._bucket(key, window, window_id - 1), self._bucket(key, window, window_id)
+
+    def incr(self, key: str, window: int, now: float, amount: int = 1) -> Tuple[int, int]:
+        window_id = int(now // window)
+        pending_key = (key, window, window_id)
+        self._pending[pending_key] = self._pending.get(pending_key, 0) + amount
+        self._watched.set(key, window)
+        if len(self._pending) >= RATE_LIMIT_SYNC_MAX_PENDING and self._flush_requested is not None:
+            self._flush_requested.set()
+        return self._bucket(key, window, window_id - 1), self._bucket(key, window, window_id)
+
+    def clear(self, key: str):
+        for pending_key in [k for k in self._pending if k[0] == key]:
+            del self._pending[pending_key]
+        window = self._watched.get(key)
+        if window is not None:
+            window_id = int(time.time() // window)
+            self._remote.pop(f"{key}|{window_id}")
+            self._remote.pop(f"{key}|{window_id - 1}")
+        self._pending_clears.append(key)
+
+    def blocked_until(self, key: str, now: float) -> float:
+        self._watched_blocks.set(key, True)
+        until = self._blocks.get(key) or 0
+        return until if until > now else 0
+
+    def block(self, key: str, until: float):
+        self._blocks.set(key, until)
+        self._pending_blocks[key] = until
+
+    # ---------- Sync ----------
+
+    def _doc_id(self, key: str, window_id: int) -> str:
+        return f"{self.namespace}|{key}|{window_id}"
+
+    async def start(self, db):
+        """Attach the database, create indexes and start the sync loop (app startup)"""
+        self._counters = db[COUNTERS_COLLECTION]
+        self._blocks_collection = db[BLOCKS_COLLECTION]
+        await self._counters.create_index("expires_at", expireAfterSeconds=0)
+        await self._counters.create_index("key")
+        await self._blocks_collection.create_index("expires_at", expireAfterSeconds=0)
+        self._flush_requested = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        logger.info(f"Mongo rate limit backend '{self.namespace}' started (sync every {self.sync_interval}s)")
+
+    async def stop(self):
+        """Flush what is pending and stop the sync loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._counters is not None:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Final rate limit sync failed: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.sync()
+                rate_limit_syncs_total.inc(namespace=self.namespace, status="ok")
+            except Exception as e:
+                rate_limit_syncs_total.inc(namespace=self.namespace, status="error")
+                logger.error(f"Rate limit sync error ({self.namespace}): {e}")
+
+    async def sync(self):
+        """Flush local deltas/blocks/clears, then pull global counts for recently seen keys"""
+        await self._flush()
+        await self._refresh(time.time())
+
+    async def _flush(self):
+        batch, self._pending = self._pending, {}
+        blocks, self._pending_blocks = self._pending_blocks, {}
+        clears, self._pending_clears = self._pending_clears, []
+        if clears:
+            try:
+                await self._counters.delete_many({"key": {"$in": [f"{self.namespace}|{key}" for key in clears]}})
+            except Exception:
+                # Deltas must not reach MongoDB before the clear that precedes them
+                self._requeue(batch.items(), blocks, clears)
+                raise
+
+        error = None
+        deltas = list(batch.items())
+        failed: List[Tuple[Tuple[str, int, int], int]] = []
+        if deltas:
+            try:
+                await self._counters.bulk_write([
+                    UpdateOne(
+                        {"_id": self._doc_id(key, window_id)},
+                        {
+                            "$inc": {"count": delta},
+                            "$setOnInsert": {
+                                "key": f"{self.namespace}|{key}",
+                                "window_id": window_id,
+                                # Needed as the previous bucket for one more window
+                                "expires_at": _utc((window_id + 2) * window)
+                            }
+                        },
+                        upsert=True
+                    )
+                    for (key, window, window_id), delta in deltas
+                ], ordered=False)
+            except BulkWriteError as e:
+                # Unordered: every $inc not listed in writeErrors was applied and must not be retried
+                error = e
+                failed = [deltas[write_error["index"]] for write_error in e.details.get("writeErrors", [])]
+            except Exception as e:
+                error, failed = e, deltas
+        if blocks:
+            try:
+                await self._blocks_collection.bulk_write([
+                    UpdateOne(
+                        {"_id": f"{self.namespace}|{key}"},
+                        {"$max": {"until": until}, "$set": {"expires_at": _utc(until)}},
+                        upsert=True
+                    )
+                    for key, until in blocks.items()
+                ], ordered=False)
+                blocks = {}
+            except Exception as e:
+                error = error or e  # $max makes retrying the whole batch harmless
+        self._requeue(failed, blocks, [])
+
+        # Flushed deltas are now part of the global count
+        failed_keys = {pending_key for pending_key, _ in failed}
+        for (key, window, window_id), delta in deltas:
+            if (key, window, window_id) not in failed_keys:
+                remote_key = f"{key}|{window_id}"
+                self._remote.set(remote_key, (self._remote.get(remote_key) or 0) + delta)
+        if error is not None:
+            raise error
+
+    def _requeue(self, deltas, blocks: Dict[str, float], clears: List[str]):
+        """Put unsynced state back for the next sync; new deltas may have arrived meanwhile"""
+        for pending_key, delta in deltas:
+            self._pending[pending_key] = self._pending.get(pending_key, 0) + delta
+        for key, until in blocks.items():
+            self._pending_blocks[key] = max(until, self._pending_blocks.get(key, 0))
+        self._pending_clears = clears + self._pending_clears
+
+    def _recent(self, store: BoundedStore) -> List[Tuple[str, Any]]:
+        """Most recently touched entries first, up to RATE_LIMIT_SYNC_MAX_KEYS"""
+        items = []
+        for key in reversed(store._data):
+            items.append((key, store._data[key]))
+            if len(items) >= RATE_LIMIT_SYNC_MAX_KEYS:
+                break
+        return items
+
+    async def _refresh(self, now: float):
+        watched = self._recent(self._watched)
+        if watched:
+            wanted = {}
+            for key, window in watched:
+                window_id = int(now // window)
+                for wid in (window_id - 1, window_id):
+                    wanted[self._doc_id(key, wid)] = f"{key}|{wid}"
+            found = {}
+            async for doc in self._counters.find({"_id": {"$in": list(wanted)}}, {"count": 1}):
+                found[doc["_id"]] = doc["count"]
+            for doc_id, remote_key in wanted.items():
+                self._remote.set(remote_key, found.get(doc_id, 0))
+
+        watched_blocks = self._recent(self._watched_blocks)
+        if watched_blocks:
+            ids = {f"{self.namespace}|{key}": key for key, _ in watched_blocks}
+            async for doc in self._blocks_collection.find({"_id": {"$in": list(ids)}}, {"until": 1}):
+                key = ids[doc["_id"]]
+                self._blocks.set(key, max(doc["until"], self._blocks.get(key) or 0))
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "attached": self._counters is not None,
+            "sync_interval": self.sync_interval,
+            "pending_buckets": len(self._pending),
+            "watched_keys": len(self._watched)
+        }
@@ -1,14 +1,231 @@
 """
 RAG (Retrieval-Augmented Generation) Client
-Connects to external RAG service for knowledge retrieval
+Retrieves knowledge through a pluggable backend: an external RAG service (http),
+the embedded vector index (vector) or the embedded BM25 index (bm25)
 """
 import os
+import re
+import time
+import fcntl
+import asyncio
+import hashlib
 import logging
+import unicodedata
 import httpx
-from typing import Optional, List, Dict, Any
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
+from abc import ABC, abstractmethod
+
+from .metrics import (
+    rag_request_duration, rag_context_tokens_total, rag_context_documents_total,
+    record_cache, cache_requests_total, estimate_tokens
+)
+from . import timing
 
 logger = logging.getLogger(__name__)
 
+_TOKEN_RE = re.compile(r"\w+")
+
+def _fold_table() -> dict:
+    """Accented Latin letters -> ASCII base (promoção -> promocao) for str.translate"""
+    table = {}
+    for cp in range(0xC0, 0x250):
+        base = "".join(c for c in unicodedata.normalize("NFKD", chr(cp)) if not unicodedata.combining(c))
+        if base and base != chr(cp) and base.isascii():
+            table[cp] = base
+    return str.maketrans(table)
+
+_FOLD = _fold_table()
+
+def fold_accents(text: str) -> str:
+    return text.translate(_FOLD)
+
+@lru_cache(maxsize=65536)
+def _fold_word(word: str) -> str:
+    return word.translate(_FOLD)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens with accents folded, shared by the embedded backends"""
+    # translate() with a dict table is slow per character; fold only non-ASCII words, cached
+    return [word if word.isascii() else _fold_word(word) for word in _TOKEN_RE.findall(text.lower())]
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a query: case and whitespace differences do not matter"""
+    return " ".join(query.casefold().split())
+
+def _shingles(tokens: List[str], size: int = 3) -> set:
+    """Word n-grams; near-identical chunks share almost all of them"""
+    if len(tokens) <= size:
+        return {tuple(tokens)}
+    return set(zip(*(tokens[i:] for i in range(size))))
+
+def _jaccard(a: set, b: set) -> float:
+    union = len(a | b)
+    return len(a & b) / union if union else 1.0
+
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut text to about `tokens` estimated tokens, at a sentence or word boundary"""
+    cut = text[:tokens * 4]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < len(cut) // 2:
+        boundary = cut.rfind(" ")
+    return (cut[:boundary + 1] if boundary > 0 else cut).rstrip() + " …"
+
+def prepare_document(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Normalize an incoming document to {id, content, source, metadata}; None when empty"""
+    metadata = doc.get("metadata") or {}
+    content = doc.get("content", doc.get("text", doc.get("page_content", "")))
+    if not content:
+        return None
+    source = doc.get("source", metadata.get("source", ""))
+    doc_id = doc.get("id") or hashlib.sha1(f"{source}\n{content}".encode()).hexdigest()[:20]
+    return {"id": str(doc_id), "content": content, "source": source, "metadata": metadata}
+
+WRITER_LOCK_FILE = "writer.lock"
+
+def acquire_writer_lock(directory) -> Optional[int]:
+    """
+    Exclusive, non-blocking flock on an embedded index directory. Returns the fd that
+    holds it for the life of the process, or None when another process is the writer.
+    """
+    fd = os.open(os.path.join(directory, WRITER_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+class RetrievalBackend(ABC):
+    """Abstract base class for retrieval backends"""
+    
+    name = "none"
+    writable = False  # supports add_documents/delete_documents
+    read_only = False  # writable, but another process holds the index (see acquire_writer_lock)
+    
+    @abstractmethod
+    async def retrieve(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Return up to top_k documents; raise on failure (the client degrades gracefully)"""
+        pass
+    
+    @abstractmethod
+    async def is_available(self) -> bool:
+        pass
+    
+    async def add_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """Index documents ({id, content, source, metadata}); returns how many were indexed"""
+        raise NotImplementedError(f"{self.name} backend is read-only")
+    
+    async def delete_documents(self, ids: List[str]) -> int:
+        """Remove documents by id; returns how many were removed"""
+        raise NotImplementedError(f"{self.name} backend is read-only")
+    
+    async def close(self):
+        """Release connections/files (app shutdown)"""
+        pass
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {}
+
+class HTTPRetrievalBackend(RetrievalBackend):
+    """External RAG service reachable over HTTP (one pooled keep-alive client)"""
+    
+    name = "http"
+    
+    def __init__(self, base_url: str, timeout: float, max_connections: int = 20):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+    
+    async def retrieve(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        # Adaptable endpoint - configure in .env if different
+        endpoint = os.environ.get("RAG_QUERY_ENDPOINT", "/query")
+        
+        response = await self.client.post(
+            f"{self.base_url}{endpoint}",
+            json={
+                "query": query,
+                "top_k": top_k
+            },
+            headers={"Content-Type": "application/json"}
+        )
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"RAG query failed with status {response.status_code}")
+        
+        data = response.json()
+        # Handle different response formats
+        if isinstance(data, list):
+            return data
+        elif isinstance(data, dict):
+            return data.get("results", data.get("documents", []))
+        return []
+    
+    async def is_available(self) -> bool:
+        try:
+            health_endpoint = os.environ.get("RAG_HEALTH_ENDPOINT", "/health")
+            response = await self.client.get(f"{self.base_url}{health_endpoint}", timeout=5.0)
+            return response.status_code == 200
+        except Exception:
+            return False
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class RetrievalCache:
+    """LRU of retrieval results keyed by (normalized query, top_k).
+    
+    Entries are fresh for `ttl` seconds; for `stale_ttl` seconds after that they
+    may still be served while a refresh runs in the background.
+    """
+    
+    def __init__(self, max_entries: int, ttl: float, stale_ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: Tuple[str, int], now: float) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+        """(documents, is_stale); documents is None on a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        stored_at, documents = entry
+        age = now - stored_at
+        if age < self.ttl:
+            self._entries.move_to_end(key)
+            return documents, False
+        if age < self.ttl + self.stale_ttl:
+            return documents, True
+        del self._entries[key]
+        return None, False
+    
+    def put(self, key: Tuple[str, int], documents: List[Dict[str, Any]], now: float):
+        self._entries[key] = (now, documents)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+
 class RAGClient:
     """RAG Service Client with graceful fallback"""
     
@@ -17,89 +234,264 @@ class RAGClient:
         self.base_url = os.environ.get("RAG_BASE_URL", "http://localhost:8811").rstrip("/")
         self.top_k = int(os.environ.get("RAG_TOP_K", "5"))
         self.timeout = float(os.environ.get("RAG_TIMEOUT", "10.0"))
+        self.max_connections = int(os.environ.get("RAG_MAX_CONNECTIONS", "20"))
+        self.backend: Optional[RetrievalBackend] = None
+        self.backend_name: str = "none"
+        
+        # Same topic/audience/niche strings repeat across users; 0 TTL disables the cache
+        cache_ttl = float(os.environ.get("RAG_CACHE_TTL", "300"))
+        self.cache: Optional[RetrievalCache] = RetrievalCache(
+            max_entries=int(os.environ.get("RAG_CACHE_MAX_ENTRIES", "1000")),
+            ttl=cache_ttl,
+            stale_ttl=float(os.environ.get("RAG_CACHE_STALE_TTL", "0"))  # stale-while-revalidate window
+        ) if cache_ttl > 0 else None
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._cache_generation = 0  # bumped when the index changes; older fetches are not stored
+        
+        # Context assembly: prompt tokens spent on retrieved chunks (0 = no limit)
+        self.context_max_tokens = int(os.environ.get("RAG_CONTEXT_MAX_TOKENS", "1500"))
+        self.context_min_chunk_tokens = int(os.environ.get("RAG_CONTEXT_MIN_CHUNK_TOKENS", "64"))
+        self.context_mmr_lambda = float(os.environ.get("RAG_CONTEXT_MMR_LAMBDA", "0.7"))       # 1 = relevance only
+        self.context_dedupe_threshold = float(os.environ.get("RAG_CONTEXT_DEDUPE", "0.8"))    # shingle Jaccard
         
         if self.enabled:
-            logger.info(f"RAG enabled @ {self.base_url}")
+            self._initialize()
         else:
             logger.info("RAG disabled")
     
+    def _initialize(self):
+        backend_type = os.environ.get("RAG_BACKEND", "http").lower()
+        
+        if backend_type in ("vector", "bm25"):
+            try:
+                if backend_type == "vector":
+                    from .vector_index import VectorRetrievalBackend as EmbeddedBackend
+                else:
+                    from .bm25_index import BM25RetrievalBackend as EmbeddedBackend
+                self.backend = EmbeddedBackend()
+                self.backend_name = backend_type
+                logger.info(f"RAG enabled (embedded {backend_type} index @ {self.backend.index.path})")
+                return
+            except Exception as e:
+                logger.error(f"Embedded {backend_type} index unavailable ({e}), falling back to http")
+        
+        self.backend = HTTPRetrievalBackend(self.base_url, self.timeout, self.max_connections)
+        self.backend_name = "http"
+        logger.info(f"RAG enabled @ {self.base_url}")
+    
     async def retrieve(self, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Retrieve relevant documents from RAG service.
+        Retrieve relevant documents from the configured backend.
         Returns empty list on failure (graceful degradation).
         """
         if not self.enabled:
             return []
         
         k = top_k or self.top_k
+        if self.cache is None:
+            documents, _ = await self._fetch(query, k)
+            return documents
+        
+        key = (normalize_query(query), k)
+        documents, stale = self.cache.get(key, time.monotonic())
+        if documents is not None:
+            if stale:
+                cache_requests_total.inc(cache="rag", result="stale")
+                self._fetch_shared(key, query, k)  # revalidate in the background
+            else:
+                record_cache("rag", True)
+            return list(documents)
+        
+        if key in self._inflight:
+            cache_requests_total.inc(cache="rag", result="coalesced")
+        else:
+            record_cache("rag", False)
+        # shield: a caller that gives up must not cancel the fetch others are awaiting
+        return list(await asyncio.shield(self._fetch_shared(key, query, k)))
+    
+    def _fetch_shared(self, key: Tuple[str, int], query: str, k: int) -> asyncio.Future:
+        """One backend call per key at a time; concurrent misses await the same future"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(self._fetch_and_store(key, query, k))
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+    
+    async def _fetch_and_store(self, key: Tuple[str, int], query: str, k: int) -> List[Dict[str, Any]]:
+        generation = self._cache_generation
+        documents, ok = await self._fetch(query, k)
+        if ok and generation == self._cache_generation:
+            self.cache.put(key, documents, time.monotonic())
+        return documents
+    
+    async def _fetch(self, query: str, k: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Backend call with metrics; ([], False) on failure (graceful degradation)"""
+        started = time.perf_counter()
+        status = "error"
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                # Adaptable endpoint - configure in .env if different
-                endpoint = os.environ.get("RAG_QUERY_ENDPOINT", "/query")
-                
-                response = await client.post(
-                    f"{self.base_url}{endpoint}",
-                    json={
-                        "query": query,
-                        "top_k": k
-                    },
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    # Handle different response formats
-                    if isinstance(data, list):
-                        return data
-                    elif isinstance(data, dict):
-                        return data.get("results", data.get("documents", []))
-                    return []
-                else:
-                    logger.warning(f"RAG query failed with status {response.status_code}")
-                    return []
-                    
+            documents = await self.backend.retrieve(query, k)
+            status = "ok"
+            return documents, True
         except httpx.TimeoutException:
+            status = "timeout"
             logger.warning(f"RAG query timeout after {self.timeout}s")
-            return []
+            return [], False
         except Exception as e:
             logger.warning(f"RAG query error: {e}")
-            return []
+            return [], False
+        finally:
+            elapsed = time.perf_counter() - started
+            rag_request_duration.observe(elapsed, status=status)
+            timing.record("rag", elapsed)
+    
+    async def add_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """Index documents in the backend (embedded backends only)"""
+        if not self.enabled:
+            return 0
+        added = await self.backend.add_documents(documents)
+        self._invalidate_cache()
+        return added
+    
+    async def delete_documents(self, ids: List[str]) -> int:
+        """Remove documents from the backend (embedded backends only)"""
+        if not self.enabled:
+            return 0
+        removed = await self.backend.delete_documents(ids)
+        self._invalidate_cache()
+        return removed
+    
+    @property
+    def writable(self) -> bool:
+        """True when documents can be indexed through this client (embedded backends)"""
+        return self.enabled and self.backend is not None and self.backend.writable and not self.backend.read_only
     
     async def is_available(self) -> bool:
-        """Check if RAG service is reachable"""
+        """Check if the RAG backend is reachable"""
         if not self.enabled:
             return False
-        
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                health_endpoint = os.environ.get("RAG_HEALTH_ENDPOINT", "/health")
-                response = await client.get(f"{self.base_url}{health_endpoint}")
-                return response.status_code == 200
-        except Exception:
-            return False
+        return await self.backend.is_available()
+    
+    def _invalidate_cache(self):
+        self._cache_generation += 1
+        if self.cache is not None:
+            self.cache.clear()
     
-    def format_context(self, documents: List[Dict[str, Any]]) -> str:
-        """Format retrieved documents as context for LLM prompt"""
+    async def close(self):
+        """Close pooled connections (app shutdown)"""
+        if self.backend is not None:
+            await self.backend.close()
+    
+    def build_context(self, documents: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Assemble prompt context from retrieved documents within a token budget.
+        Near-identical chunks are dropped, the rest is ordered by MMR (relevance
+        traded against overlap with chunks already picked) and cut at the budget.
+        Returns the context and a report of included/dropped chunks and tokens.
+        """
+        budget = self.context_max_tokens if max_tokens is None else max_tokens
+        report = {"documents": len(documents), "included": 0, "truncated": 0, "deduped": 0, "dropped": 0,
+                  "tokens_included": 0, "tokens_dropped": 0, "budget": budget}
         if not documents:
-            return ""
+            return "", report
         
-        context_parts = ["## Relevant Context\n"]
+        chunks = []
         for i, doc in enumerate(documents, 1):
             # Handle different document formats
             content = doc.get("content", doc.get("text", doc.get("page_content", str(doc))))
             source = doc.get("source", doc.get("metadata", {}).get("source", f"Document {i}"))
-            context_parts.append(f"### Source {i}: {source}\n{content}\n")
+            words = content.lower().split()  # cheap; only compared between chunks of the same result set
+            chunks.append({"content": content, "source": source, "score": doc.get("score"), "rank": i,
+                           "tokens": estimate_tokens(content), "terms": set(words), "shingles": _shingles(words)})
         
-        return "\n".join(context_parts)
+        # Relevance in [0, 1]: backend scores when every chunk has one, else retrieval order
+        scores = [chunk["score"] for chunk in chunks]
+        if all(isinstance(score, (int, float)) for score in scores):
+            low, high = min(scores), max(scores)
+            for chunk in chunks:
+                chunk["relevance"] = (chunk["score"] - low) / (high - low) if high > low else 1.0
+        else:
+            for chunk in chunks:
+                chunk["relevance"] = 1 - (chunk["rank"] - 1) / len(chunks)
+        
+        unique = []
+        for chunk in sorted(chunks, key=lambda c: -c["relevance"]):
+            if any(_jaccard(chunk["shingles"], kept["shingles"]) >= self.context_dedupe_threshold for kept in unique):
+                report["deduped"] += 1
+                report["tokens_dropped"] += chunk["tokens"]
+            else:
+                unique.append(chunk)
+        
+        ordered = []
+        while unique:
+            best = max(unique, key=lambda c: self.context_mmr_lambda * c["relevance"] - (1 - self.context_mmr_lambda) * max(
+                (_jaccard(c["terms"], picked["terms"]) for picked in ordered), default=0.0))
+            unique.remove(best)
+            ordered.append(best)
+        
+        context_parts = ["## Relevant Context\n"]
+        used = estimate_tokens(context_parts[0])
+        for chunk in ordered:
+            heading = f"### Source {len(context_parts)}: {chunk['source']}\n"
+            content = chunk["content"]
+            cost = estimate_tokens(heading) + chunk["tokens"]
+            if budget and used + cost > budget:
+                room = budget - used - estimate_tokens(heading) - 1  # the " …" marker
+                if room < self.context_min_chunk_tokens:
+                    report["dropped"] += 1
+                    report["tokens_dropped"] += chunk["tokens"]
+                    continue  # a smaller chunk further down may still fit
+                content = _truncate_to_tokens(content, room)
+                report["truncated"] += 1
+                report["tokens_dropped"] += max(0, chunk["tokens"] - estimate_tokens(content))
+                cost = estimate_tokens(heading) + estimate_tokens(content)
+            context_parts.append(f"{heading}{content}\n")
+            used += cost
+            report["included"] += 1
+            report["tokens_included"] += min(chunk["tokens"], estimate_tokens(content))
+        
+        if report["included"] == 0:
+            return "", report
+        return "\n".join(context_parts), report
+    
+    def format_context(self, documents: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> str:
+        """Format retrieved documents as context for LLM prompt (token-budgeted, see build_context)"""
+        context, report = self.build_context(documents, max_tokens)
+        if documents:
+            rag_context_tokens_total.inc(report["tokens_included"], outcome="included")
+            rag_context_tokens_total.inc(report["tokens_dropped"], outcome="dropped")
+            for outcome in ("included", "truncated", "deduped", "dropped"):
+                if report[outcome]:
+                    rag_context_documents_total.inc(report[outcome], outcome=outcome)
+            logger.debug(f"RAG context: {report['included']}/{report['documents']} chunks, "
+                         f"{report['tokens_included']} tokens included, {report['tokens_dropped']} dropped")
+        return context
+    
+    def _cache_status(self) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        # Anything answered without its own backend call counts as a hit
+        hits = sum(cache_requests_total.get(cache="rag", result=result) for result in ("hit", "stale", "coalesced"))
+        lookups = hits + cache_requests_total.get(cache="rag", result="miss")
+        return {
+            "entries": len(self.cache),
+            "ttl": self.cache.ttl,
+            "stale_ttl": self.cache.stale_ttl,
+            "hit_rate": round(hits / lookups, 3) if lookups else None
+        }
     
     def get_status(self) -> Dict[str, Any]:
         """Get RAG service status"""
-        return {
+        status = {
             "enabled": self.enabled,
-            "base_url": self.base_url if self.enabled else None,
-            "top_k": self.top_k
+            "backend": self.backend_name,
+            "base_url": self.base_url if self.backend_name == "http" else None,
+            "top_k": self.top_k,
+            "cache": self._cache_status()
         }
+        if self.backend is not None:
+            status.update(self.backend.get_status())
+        return status
 
 # Global instance
 rag_client = RAGClient()
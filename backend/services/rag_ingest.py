@@ -0,0 +1,344 @@
+"""
+RAG Ingestion - publish-time indexing of products and templates
+Write routes only enqueue a (kind, id) key; a background worker reloads the
+document, chunks its markdown and upserts the chunks into the retrieval backend.
+Unchanged content is skipped and stale chunks are removed.
+
+Only the process holding the embedded index's writer lock ingests; the worker of
+any other process forwards its keys through db.rag_ingest_queue, which the
+writer drains.
+"""
+import os
+import re
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from .rag_client import rag_client
+from .metrics import rag_ingest_total, rag_ingest_queue_depth, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+RAG_INGEST_ENABLED = os.environ.get('RAG_INGEST_ENABLED', 'true').lower() == 'true'
+RAG_INGEST_QUEUE_SIZE = int(os.environ.get('RAG_INGEST_QUEUE_SIZE', '1000'))
+RAG_CHUNK_TOKENS = int(os.environ.get('RAG_CHUNK_TOKENS', '300'))
+RAG_CHUNK_OVERLAP_TOKENS = int(os.environ.get('RAG_CHUNK_OVERLAP_TOKENS', '40'))
+RAG_INGEST_POLL_SECONDS = float(os.environ.get('RAG_INGEST_POLL_SECONDS', '2'))  # writer drains forwarded keys
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+# Collection, filter, and text fields per ingestible kind. The index is shared by all
+# workspaces, so products contribute only what the public catalog shows (content is
+# delivered after purchase and never indexed).
+SOURCES = {
+    "product": ("products", "product_id", ("title", "description")),
+    "template": ("templates", "template_id", ("name", "description", "prompt_template")),
+}
+
+
+def _split_long(text: str, max_tokens: int) -> List[str]:
+    """Cut one oversized paragraph at word boundaries"""
+    pieces, limit = [], max_tokens * 4
+    while len(text) > limit:
+        cut = text.rfind(" ", 0, limit)
+        cut = cut if cut > limit // 2 else limit
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def _tail(text: str, tokens: int) -> str:
+    """Last ~tokens of text, starting at a word boundary"""
+    if tokens <= 0 or estimate_tokens(text) <= tokens:
+        return ""
+    tail = text[-tokens * 4:]
+    space = tail.find(" ")
+    return tail[space + 1:] if space >= 0 else tail
+
+
+def chunk_markdown(text: str, title: str = "", max_tokens: int = RAG_CHUNK_TOKENS,
+                   overlap_tokens: int = RAG_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Split markdown into retrieval chunks of about max_tokens.
+    Sections follow the heading structure (headings inside code fences are
+    ignored); paragraphs are packed up to the limit, consecutive chunks of a
+    section share ~overlap_tokens, and every chunk starts with its heading
+    trail so it reads on its own in a prompt.
+    """
+    sections: List[Tuple[List[str], List[str]]] = []
+    trail: List[Tuple[int, str]] = []
+    paragraphs: List[str] = []
+    current: List[str] = []
+    in_fence = False
+
+    def end_paragraph():
+        if current:
+            paragraphs.append("\n".join(current).strip())
+            current.clear()
+
+    def end_section():
+        end_paragraph()
+        if any(paragraphs):
+            sections.append(([name for _, name in trail], [p for p in paragraphs if p]))
+        paragraphs.clear()
+
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        heading = None if in_fence else _HEADING_RE.match(line)
+        if heading:
+            end_section()
+            level = len(heading.group(1))
+            trail = [(lvl, name) for lvl, name in trail if lvl < level] + [(level, heading.group(2))]
+        elif not line.strip() and not in_fence:
+            end_paragraph()
+        else:
+            current.append(line)
+    end_section()
+
+    chunks = []
+    for headings, section in sections:
+        prefix = " › ".join(part for part in [title, *headings] if part)
+        budget = max(1, max_tokens - estimate_tokens(prefix))
+        body: List[str] = []
+        for paragraph in section:
+            for piece in _split_long(paragraph, budget):
+                if body and estimate_tokens("\n\n".join(body + [piece])) > budget:
+                    chunk = "\n\n".join(body)
+                    chunks.append(f"{prefix}\n\n{chunk}" if prefix else chunk)
+                    overlap = _tail(chunk, overlap_tokens)
+                    body = [overlap] if overlap else []
+                body.append(piece)
+        if body:
+            chunk = "\n\n".join(body)
+            chunks.append(f"{prefix}\n\n{chunk}" if prefix else chunk)
+    return chunks
+
+
+class RAGIngestor:
+    """Background worker that keeps published content in the retrieval index"""
+
+    def __init__(self):
+        self.enabled = False
+        self.forwarding = False  # another process writes the index; keys go to db.rag_ingest_queue
+        self.db = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: set = set()
+        self._forced: set = set()  # keys queued by a reindex; re-ingested even if the content hash matches
+        self._task: Optional[asyncio.Task] = None
+        self._reindex_task: Optional[asyncio.Task] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        rag_ingest_queue_depth.set_function(lambda: len(self._pending))
+
+    def start(self, db):
+        """Start the worker (call from the app startup event); needs a writable backend"""
+        self.db = db
+        backend = rag_client.backend if rag_client.enabled else None
+        self.enabled = RAG_INGEST_ENABLED and backend is not None and backend.writable
+        if not self.enabled:
+            logger.info("RAG ingestion disabled" + ("" if RAG_INGEST_ENABLED else " (RAG_INGEST_ENABLED=false)"))
+            return
+        self.forwarding = not rag_client.writable
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=RAG_INGEST_QUEUE_SIZE)
+            self._task = asyncio.ensure_future(self._run())
+        if not self.forwarding and (self._poll_task is None or self._poll_task.done()):
+            self._poll_task = asyncio.ensure_future(self._poll_forwarded())
+        logger.info(f"RAG ingestion started ({rag_client.backend_name} backend"
+                    f"{', forwarding to the index writer' if self.forwarding else ''})")
+
+    async def stop(self):
+        """Stop the worker; pending keys are dropped (a reindex picks them up)"""
+        for task in (self._reindex_task, self._poll_task, self._task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._reindex_task = self._poll_task = None
+
+    def enqueue(self, kind: str, doc_id: str) -> bool:
+        """
+        Schedule (re)indexing of one document. Never blocks the caller;
+        repeated saves of a key still waiting in the queue collapse into one job.
+        """
+        if not self.enabled or self._queue is None:
+            return False
+        key = (kind, doc_id)
+        if key in self._pending:
+            return True
+        try:
+            self._queue.put_nowait(key)
+        except asyncio.QueueFull:
+            rag_ingest_total.inc(kind=kind, result="dropped")
+            logger.warning(f"RAG ingestion queue full, dropped {kind} {doc_id}")
+            return False
+        self._pending.add(key)
+        return True
+
+    def reindex(self) -> bool:
+        """
+        Queue everything in the background; False if not possible. Every key is
+        re-ingested regardless of its stored content hash, so this also rebuilds a
+        wiped index or one created for another embedder or backend.
+        """
+        if not self.enabled or self.reindexing:
+            return False
+        self._reindex_task = asyncio.ensure_future(self._reindex_all())
+        return True
+
+    @property
+    def reindexing(self) -> bool:
+        return self._reindex_task is not None and not self._reindex_task.done()
+
+    async def _reindex_all(self) -> Dict[str, int]:
+        """Queue every published product and every template, waiting for room in the queue"""
+        counts = {}
+        for kind, (collection, id_field, _) in SOURCES.items():
+            counts[kind] = 0
+            query = {"is_published": True} if kind == "product" else {}
+            async for doc in self.db[collection].find(query, {"_id": 0, id_field: 1}):
+                await self._put((kind, doc[id_field]), force=True)
+                counts[kind] += 1
+        # Entries whose document was unpublished or deleted while ingestion was off
+        async for entry in self.db.rag_sources.find({}, {"_id": 0, "kind": 1, "doc_id": 1}):
+            await self._put((entry["kind"], entry["doc_id"]), force=True)
+        logger.info(f"RAG reindex queued {counts}")
+        return counts
+
+    async def _put(self, key: Tuple[str, str], force: bool = False):
+        if force:
+            self._forced.add(key)
+        if key not in self._pending:
+            self._pending.add(key)
+            await self._queue.put(key)
+
+    async def _run(self):
+        while True:
+            key = await self._queue.get()
+            self._pending.discard(key)  # a save from now on queues the key again
+            force = key in self._forced
+            self._forced.discard(key)
+            try:
+                result = await (self._forward(*key, force=force) if self.forwarding
+                                else self.ingest(*key, force=force))
+                rag_ingest_total.inc(kind=key[0], result=result)
+            except Exception as e:
+                rag_ingest_total.inc(kind=key[0], result="error")
+                logger.error(f"RAG ingestion of {key[0]} {key[1]} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _forward(self, kind: str, doc_id: str, force: bool = False) -> str:
+        """Hand a key to the process that writes the index"""
+        fields = {"kind": kind, "doc_id": doc_id, "queued_at": datetime.now(timezone.utc).isoformat()}
+        if force:
+            fields["force"] = True  # never cleared by a plain save forwarded before the writer polls
+        await self.db.rag_ingest_queue.update_one(
+            {"kind": kind, "doc_id": doc_id}, {"$set": fields}, upsert=True
+        )
+        return "forwarded"
+
+    async def _poll_forwarded(self):
+        """Writer: move keys forwarded by other processes into the local queue"""
+        while True:
+            try:
+                async for entry in self.db.rag_ingest_queue.find({}).limit(RAG_INGEST_QUEUE_SIZE):
+                    # A key forwarded again meanwhile has a new queued_at and stays for the next poll
+                    await self.db.rag_ingest_queue.delete_one({"_id": entry["_id"], "queued_at": entry["queued_at"]})
+                    await self._put((entry["kind"], entry["doc_id"]), force=bool(entry.get("force")))
+            except Exception as e:
+                logger.warning(f"Reading forwarded RAG ingestion keys failed: {e}")
+            await asyncio.sleep(RAG_INGEST_POLL_SECONDS)
+
+    async def ingest(self, kind: str, doc_id: str, force: bool = False) -> str:
+        """
+        Bring the index in line with the stored document; returns the outcome.
+        force re-adds the chunks even when the content hash is unchanged.
+        """
+        collection, id_field, fields = SOURCES[kind]
+        source = f"{kind}/{doc_id}"
+        doc = await self.db[collection].find_one({id_field: doc_id}, {"_id": 0})
+        previous = await self.db.rag_sources.find_one({"source": source}, {"_id": 0})
+        previous_ids = previous["chunk_ids"] if previous else []
+
+        if not doc or not self._indexable(kind, doc):
+            if previous_ids:
+                await rag_client.delete_documents(previous_ids)
+            if previous:
+                await self.db.rag_sources.delete_one({"source": source})
+                return "deleted"
+            return "skipped"
+
+        text = "\n\n".join(str(doc[field]) for field in fields[1:] if doc.get(field))
+        title = str(doc.get(fields[0]) or "")
+        metadata = self._metadata(kind, doc)
+        content_hash = hashlib.sha1(f"{title}\n{text}\n{sorted(metadata.items())}".encode()).hexdigest()
+        if not force and previous and previous.get("content_hash") == content_hash:
+            return "unchanged"
+
+        chunks = await asyncio.to_thread(chunk_markdown, text, title)
+        documents = [
+            {"id": f"{source}#{i}", "content": chunk, "source": source,
+             "metadata": {**metadata, "chunk": i}}
+            for i, chunk in enumerate(chunks)
+        ]
+        chunk_ids = [document["id"] for document in documents]
+        if documents:
+            await rag_client.add_documents(documents)
+        current = set(chunk_ids)
+        stale = [chunk_id for chunk_id in previous_ids if chunk_id not in current]
+        if stale:
+            await rag_client.delete_documents(stale)
+
+        await self.db.rag_sources.update_one(
+            {"source": source},
+            {"$set": {
+                "source": source,
+                "kind": kind,
+                "doc_id": doc_id,
+                "chunk_ids": chunk_ids,
+                "content_hash": content_hash,
+                "indexed_at": datetime.now(timezone.utc).isoformat()
+            }},
+            upsert=True
+        )
+        logger.info(f"Indexed {source}: {len(chunk_ids)} chunks ({len(stale)} stale removed)")
+        return "indexed"
+
+    @staticmethod
+    def _indexable(kind: str, doc: Dict[str, Any]) -> bool:
+        # Drafts stay private to their workspace; only published catalog entries are shared knowledge
+        if kind == "product":
+            return bool(doc.get("is_published"))
+        return doc.get("is_active", True)
+
+    @staticmethod
+    def _metadata(kind: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+        if kind == "product":
+            return {"kind": kind, "product_id": doc["product_id"], "product_type": doc.get("product_type"),
+                    "language": doc.get("language"), "title": doc.get("title"), "public_url": doc.get("public_url")}
+        return {"kind": kind, "template_id": doc["template_id"], "category": doc.get("category"),
+                "title": doc.get("name")}
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "role": ("forwarder" if self.forwarding else "writer") if self.enabled else None,
+            "backend": rag_client.backend_name,
+            "queued": len(self._pending),
+            "running": self._task is not None and not self._task.done(),
+            "reindexing": self.reindexing,
+            "chunk_tokens": RAG_CHUNK_TOKENS,
+            "chunk_overlap_tokens": RAG_CHUNK_OVERLAP_TOKENS
+        }
+
+
+# Global instance
+rag_ingestor = RAGIngestor()
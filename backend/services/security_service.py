@@ -2,17 +2,22 @@
 Security Service - Rate Limiting and Anti-Abuse Protection
 """
 import os
+import sys
+import json
 import time
 import hashlib
-from collections import defaultdict
-from typing import Dict, Any, Optional
-from datetime import datetime, timezone
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from abc import ABC, abstractmethod
 import logging
 
+from .metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 # ==================== CONFIGURATION ====================
 RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()  # memory | shared (one host) | mongo (all nodes)
 
 # Limits per window (in seconds)
 RATE_LIMITS = {
@@ -21,27 +26,300 @@ RATE_LIMITS = {
     "login_failed": {"requests": 5, "window": 900},    # 5 failed logins = lockout
     "generate": {"requests": 30, "window": 3600},      # 30 generations per hour per user
     "api_global": {"requests": 100, "window": 60},     # 100 requests per minute per IP
+    "api_user": {"requests": 300, "window": 60},       # 300 requests per minute per session token
+    "api_auth": {"requests": 30, "window": 60},        # 30 credential requests per minute per IP (before body parsing)
     "password_reset": {"requests": 3, "window": 3600}, # 3 reset requests per hour
 }
 
+# Global middleware: path prefix -> RATE_LIMITS tier applied per IP (None = not limited).
+# Longest matching prefix wins; unmatched paths use api_global. Extend with RATE_LIMIT_ROUTE_CLASSES (JSON).
+RATE_LIMIT_MIDDLEWARE_ENABLED = os.environ.get('RATE_LIMIT_MIDDLEWARE_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_ROUTE_CLASSES = {
+    "/api/health": None,
+    "/metrics": None,
+    "/api/billing/webhook/": None,   # payment provider callbacks
+    # Credential endpoints only (all POST-only routes); /auth/me and /auth/logout are
+    # called on every page load and stay on api_global / api_user
+    "/api/auth/login": "api_auth",
+    "/api/auth/register": "api_auth",
+    "/api/auth/forgot-password": "api_auth",
+    "/api/auth/reset-password": "api_auth",
+    "/api/auth/google/callback": "api_auth",
+    **json.loads(os.environ.get('RATE_LIMIT_ROUTE_CLASSES', '{}'))
+}
+
 # Credit usage limits (anti-abuse)
 MAX_CREDITS_PER_DAY = int(os.environ.get('MAX_CREDITS_PER_DAY', '100'))
 MAX_GENERATIONS_PER_HOUR = int(os.environ.get('MAX_GENERATIONS_PER_HOUR', '20'))
 
+# In-memory state bounds (per worker)
+ABUSE_STATE_MAX_KEYS = int(os.environ.get('ABUSE_STATE_MAX_KEYS', '100000'))             # per store, LRU beyond this
+ABUSE_STATE_SWEEP_INTERVAL = float(os.environ.get('ABUSE_STATE_SWEEP_INTERVAL', '60'))  # seconds between idle sweeps
+ABUSE_STATE_SWEEP_BATCH = int(os.environ.get('ABUSE_STATE_SWEEP_BATCH', '5000'))        # max keys removed per sweep (bounds loop stalls)
+
+abuse_state_entries = metrics.gauge(
+    "noxloop_abuse_state_entries", "Keys held in the in-memory rate limit / credit protection stores", ["store"])
+abuse_state_bytes = metrics.gauge(
+    "noxloop_abuse_state_bytes", "Estimated memory held by the in-memory rate limit / credit protection stores", ["store"])
+abuse_state_evictions_total = metrics.counter(
+    "noxloop_abuse_state_evictions_total", "Keys removed from the abuse protection stores", ["store", "reason"])
+rate_limited_total = metrics.counter(
+    "noxloop_rate_limited_total", "Requests rejected by the global rate limit middleware", ["tier"])
+
+
+class BoundedStore:
+    """Insertion/LRU-ordered dict capped at max_entries; the least recently written key
+    is evicted first. Idle keys are removed by sweep() with a store-specific predicate."""
+
+    def __init__(self, name: str, max_entries: int = ABUSE_STATE_MAX_KEYS):
+        self.name = name
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Any:
+        return self._data.get(key)
+
+    def set(self, key: str, value: Any):
+        """Store value as the most recently used key, evicting the oldest beyond capacity"""
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if len(data) > self.max_entries:
+            data.popitem(last=False)
+            abuse_state_evictions_total.inc(store=self.name, reason="capacity")
+
+    def touch(self, key: str):
+        self._data.move_to_end(key)
+
+    def pop(self, key: str) -> Any:
+        return self._data.pop(key, None)
+
+    def sweep(self, is_idle: Callable[[str, Any], bool], is_recent: Optional[Callable[[str, Any], bool]] = None,
+              limit: int = ABUSE_STATE_SWEEP_BATCH) -> int:
+        """Remove up to limit entries for which is_idle(key, value) is true, walking from
+        the least recently written. The walk stops at the first entry where
+        is_recent(key, value) is true, since everything written after it is at least as recent."""
+        idle = []
+        for key, value in self._data.items():
+            if len(idle) >= limit or (is_recent is not None and is_recent(key, value)):
+                break
+            if is_idle(key, value):
+                idle.append(key)
+        for key in idle:
+            del self._data[key]
+        if idle:
+            abuse_state_evictions_total.inc(len(idle), store=self.name, reason="idle")
+        return len(idle)
+
+    def estimated_bytes(self) -> int:
+        """Container size plus entry count times the size of one sampled entry (O(1) per scrape)"""
+        data = self._data
+        total = sys.getsizeof(data)
+        if data:
+            key, value = next(reversed(data.items()))
+            total += (sys.getsizeof(key) + sys.getsizeof(value)) * len(data)
+        return total
+
+
+class _WindowCounter:
+    """Two-bucket sliding window counter: request counts for the current and previous
+    fixed window. The sliding count is estimated by weighting the previous bucket by
+    how much of it still overlaps the sliding window - O(1) time and memory per key."""
+
+    __slots__ = ("window", "window_id", "previous", "current")
+
+    def __init__(self, window: int, window_id: int):
+        self.window = window
+        self.window_id = window_id
+        self.previous = 0
+        self.current = 0
+
+    def roll(self, window_id: int):
+        """Advance to window_id, carrying the current bucket over if it is adjacent"""
+        if window_id == self.window_id:
+            return
+        self.previous = self.current if window_id == self.window_id + 1 else 0
+        self.current = 0
+        self.window_id = window_id
+
+    def counts_at(self, window_id: int) -> Tuple[int, int]:
+        """(previous, current) bucket counts as seen from window_id, without rolling"""
+        if window_id == self.window_id:
+            return self.previous, self.current
+        if window_id == self.window_id + 1:
+            return self.current, 0
+        return 0, 0
+
+
+def sliding_count(previous: int, current: int, window: int, now: float) -> float:
+    """Estimate requests in the sliding window ending at now from two fixed-window buckets"""
+    elapsed = now / window - int(now // window)
+    return previous * (1 - elapsed) + current
+
+
+class CounterBackend(ABC):
+    """Storage for windowed counters and blocks used by RateLimiter and CreditProtection"""
+    
+    name = "none"
+    
+    @abstractmethod
+    def counts(self, key: str, window: int, now: float) -> Tuple[int, int]:
+        """(previous, current) bucket counts for the fixed window containing now"""
+        pass
+    
+    @abstractmethod
+    def incr(self, key: str, window: int, now: float, amount: int = 1) -> Tuple[int, int]:
+        """Add amount to the current bucket; returns the (previous, current) counts after the update"""
+        pass
+    
+    def incr_if_below(self, key: str, window: int, now: float, limit: int, amount: int = 1) -> Tuple[bool, int, int]:
+        """
+        Add amount only while the sliding-window count is below limit, as one step.
+        Returns (allowed, previous, current) as they were before the update.
+        Backends shared between processes override this to make it atomic.
+        """
+        previous, current = self.counts(key, window, now)
+        allowed = int(sliding_count(previous, current, window, now)) < limit
+        if allowed:
+            self.incr(key, window, now, amount)
+        return allowed, previous, current
+    
+    @abstractmethod
+    def clear(self, key: str):
+        pass
+    
+    @abstractmethod
+    def blocked_until(self, key: str, now: float) -> float:
+        """Block expiry timestamp, or 0 when the key is not blocked"""
+        pass
+    
+    @abstractmethod
+    def block(self, key: str, until: float):
+        pass
+    
+    async def start(self, db):
+        """Attach shared storage and start background work (app startup)"""
+        pass
+    
+    async def stop(self):
+        pass
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class MemoryCounterBackend(CounterBackend):
+    """Per-process counters in bounded LRU stores, swept for idle keys on the write path"""
+    
+    name = "memory"
+    
+    def __init__(self, namespace: str):
+        self._counters = BoundedStore(f"{namespace}_counters")   # key -> _WindowCounter
+        self._blocked = BoundedStore(f"{namespace}_blocked")     # key -> block until timestamp
+        self._min_window: Optional[int] = None
+        self._next_sweep = time.time() + ABUSE_STATE_SWEEP_INTERVAL
+    
+    def stores(self) -> List[BoundedStore]:
+        return [self._counters, self._blocked]
+    
+    def counts(self, key: str, window: int, now: float) -> Tuple[int, int]:
+        counter = self._counters.get(key)
+        if counter is None:
+            return 0, 0
+        return counter.counts_at(int(now // window))
+    
+    def incr(self, key: str, window: int, now: float, amount: int = 1) -> Tuple[int, int]:
+        window_id = int(now // window)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = _WindowCounter(window, window_id)
+            self._counters.set(key, counter)
+            if self._min_window is None or window < self._min_window:
+                self._min_window = window
+        else:
+            counter.roll(window_id)
+            self._counters.touch(key)
+        counter.current += amount
+        self._maybe_sweep(now)
+        return counter.previous, counter.current
+    
+    def clear(self, key: str):
+        self._counters.pop(key)
+    
+    def blocked_until(self, key: str, now: float) -> float:
+        until = self._blocked.get(key)
+        if until is None:
+            return 0
+        if until <= now:
+            self._blocked.pop(key)
+            return 0
+        return until
+    
+    def block(self, key: str, until: float):
+        self._blocked.set(key, until)
+    
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop counters whose windows have fully expired and lapsed blocks"""
+        now = now or time.time()
+        # Written within two of the shortest windows - live for every window in use
+        recent_after = now - 2 * (self._min_window or 0)
+        
+        def counter_idle(key: str, counter: _WindowCounter) -> bool:
+            # Both buckets are older than the sliding window - the estimate is 0
+            return counter.window_id < int(now // counter.window) - 1
+        
+        def counter_recent(key: str, counter: _WindowCounter) -> bool:
+            return counter.window_id * counter.window >= recent_after
+        
+        removed = self._counters.sweep(counter_idle, counter_recent)
+        removed += self._blocked.sweep(lambda key, until: until <= now)
+        return removed
+    
+    def _maybe_sweep(self, now: float):
+        if now >= self._next_sweep:
+            removed = self.sweep(now)
+            # A full batch means more idle keys are waiting - continue shortly instead of next interval
+            self._next_sweep = now + (1 if removed >= ABUSE_STATE_SWEEP_BATCH else ABUSE_STATE_SWEEP_INTERVAL)
+            if removed:
+                logger.debug(f"Swept {removed} idle keys from {self._counters.name}")
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "max_keys": ABUSE_STATE_MAX_KEYS,
+            "entries": {store.name: len(store) for store in self.stores()}
+        }
+
+
+def create_backend(namespace: str) -> CounterBackend:
+    """Build the counter backend selected by RATE_LIMIT_BACKEND, falling back to memory"""
+    if RATE_LIMIT_BACKEND == "shared":
+        try:
+            from .shm_counters import SharedMemoryCounterBackend
+            return SharedMemoryCounterBackend(namespace)
+        except Exception as e:
+            logger.warning(f"Shared-memory rate limit backend unavailable ({e}), falling back to memory")
+    elif RATE_LIMIT_BACKEND == "mongo":
+        from .mongo_counters import MongoCounterBackend
+        return MongoCounterBackend(namespace)
+    
+    backend = MemoryCounterBackend(namespace)
+    for store in backend.stores():
+        abuse_state_entries.set_function(store.__len__, store=store.name)
+        abuse_state_bytes.set_function(store.estimated_bytes, store=store.name)
+    return backend
+
 
 class RateLimiter:
-    """In-memory rate limiter (use Redis for distributed systems)"""
+    """Sliding window rate limiter over a pluggable counter backend (per process by default)"""
     
-    def __init__(self):
+    def __init__(self, backend: Optional[CounterBackend] = None):
         self.enabled = RATE_LIMIT_ENABLED
-        self._requests: Dict[str, list] = defaultdict(list)
-        self._blocked: Dict[str, float] = {}  # IP -> block until timestamp
-        logger.info(f"Rate limiter {'enabled' if self.enabled else 'disabled'}")
-    
-    def _cleanup_old_requests(self, key: str, window: int):
-        """Remove requests older than window"""
-        cutoff = time.time() - window
-        self._requests[key] = [ts for ts in self._requests[key] if ts > cutoff]
+        self.backend = backend or MemoryCounterBackend("rate_limit")
+        logger.info(f"Rate limiter {'enabled' if self.enabled else 'disabled'} ({self.backend.name} backend)")
     
     def _get_key(self, action: str, identifier: str) -> str:
         """Generate rate limit key"""
@@ -49,15 +327,11 @@ class RateLimiter:
     
     def is_blocked(self, ip: str) -> bool:
         """Check if IP is temporarily blocked"""
-        if ip in self._blocked:
-            if time.time() < self._blocked[ip]:
-                return True
-            del self._blocked[ip]
-        return False
+        return self.backend.blocked_until(ip, time.time()) > 0
     
     def block_ip(self, ip: str, duration_seconds: int = 3600):
         """Block an IP temporarily"""
-        self._blocked[ip] = time.time() + duration_seconds
+        self.backend.block(ip, time.time() + duration_seconds)
         logger.warning(f"IP blocked: {ip[:16]}... for {duration_seconds}s")
     
     def check_rate_limit(self, action: str, identifier: str) -> Dict[str, Any]:
@@ -72,18 +346,14 @@ class RateLimiter:
         max_requests = limit_config["requests"]
         window = limit_config["window"]
         
-        key = self._get_key(action, identifier)
-        self._cleanup_old_requests(key, window)
+        now = time.time()
+        previous, current = self.backend.counts(self._get_key(action, identifier), window, now)
+        current_requests = int(sliding_count(previous, current, window, now))
         
-        current_requests = len(self._requests[key])
         allowed = current_requests < max_requests
         
-        # Calculate reset time
-        if self._requests[key]:
-            oldest = min(self._requests[key])
-            reset_at = oldest + window
-        else:
-            reset_at = time.time() + window
+        # The current bucket rolls over (and the estimate starts decaying) at the window boundary
+        reset_at = (int(now // window) + 1) * window
         
         return {
             "allowed": allowed,
@@ -97,15 +367,49 @@ class RateLimiter:
         if not self.enabled:
             return
         
-        key = self._get_key(action, identifier)
-        self._requests[key].append(time.time())
+        window = RATE_LIMITS.get(action, RATE_LIMITS["api_global"])["window"]
+        self.backend.incr(self._get_key(action, identifier), window, time.time())
+    
+    def consume(self, action: str, identifier: str) -> Dict[str, Any]:
+        """check_rate_limit + record_request as one step, so concurrent requests
+        (or workers sharing a backend) cannot all pass the check and overshoot the limit"""
+        if not self.enabled:
+            return {"allowed": True, "remaining": 999, "reset_at": 0}
+        return self._hit(action, self._get_key(action, identifier))
+    
+    def hit(self, action: str, identifier: str) -> Dict[str, Any]:
+        """Check and, when allowed, record in one step. The identifier is used as-is
+        (no hashing) - meant for short, non-sensitive keys such as IPs on the hot path."""
+        return self._hit(action, f"{action}:{identifier}")
+    
+    def _hit(self, action: str, key: str) -> Dict[str, Any]:
+        limit_config = RATE_LIMITS.get(action, RATE_LIMITS["api_global"])
+        max_requests = limit_config["requests"]
+        window = limit_config["window"]
+        
+        now = time.time()
+        allowed, previous, current = self.backend.incr_if_below(key, window, now, max_requests)
+        current_requests = int(sliding_count(previous, current, window, now))
+        
+        return {
+            "allowed": allowed,
+            "limit": max_requests,
+            "remaining": max(0, max_requests - current_requests - 1),
+            "reset_at": (int(now // window) + 1) * window,
+            "current": current_requests
+        }
     
     def record_failed_login(self, ip: str):
         """Record failed login attempt"""
-        result = self.check_rate_limit("login_failed", ip)
-        self.record_request("login_failed", ip)
+        if not self.enabled:
+            return True
+        limit_config = RATE_LIMITS["login_failed"]
+        window = limit_config["window"]
+        now = time.time()
+        # Always counted; the count before this attempt decides, from the same atomic update
+        previous, current = self.backend.incr(self._get_key("login_failed", ip), window, now)
         
-        if not result["allowed"]:
+        if int(sliding_count(previous, current - 1, window, now)) >= limit_config["requests"]:
             # Block IP for 30 minutes after too many failed attempts
             self.block_ip(ip, 1800)
             return False
@@ -113,32 +417,24 @@ class RateLimiter:
     
     def clear_failed_logins(self, ip: str):
         """Clear failed login attempts after successful login"""
-        key = self._get_key("login_failed", ip)
-        self._requests[key] = []
+        self.backend.clear(self._get_key("login_failed", ip))
+
+
+DAY_SECONDS = 86400
+HOUR_SECONDS = 3600
 
 
 class CreditProtection:
-    """Anti-abuse credit usage protection"""
+    """Anti-abuse credit usage protection (fixed UTC day/hour windows)"""
     
-    def __init__(self):
-        self._daily_usage: Dict[str, Dict] = defaultdict(lambda: {"count": 0, "date": ""})
-        self._hourly_usage: Dict[str, Dict] = defaultdict(lambda: {"count": 0, "hour": ""})
+    def __init__(self, backend: Optional[CounterBackend] = None):
+        self.backend = backend or MemoryCounterBackend("credit")
     
     def check_credit_abuse(self, user_id: str) -> Dict[str, Any]:
         """Check if user is abusing credits"""
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        current_hour = datetime.now(timezone.utc).strftime("%Y-%m-%d-%H")
-        
-        # Reset daily counter if new day
-        if self._daily_usage[user_id]["date"] != today:
-            self._daily_usage[user_id] = {"count": 0, "date": today}
-        
-        # Reset hourly counter if new hour
-        if self._hourly_usage[user_id]["hour"] != current_hour:
-            self._hourly_usage[user_id] = {"count": 0, "hour": current_hour}
-        
-        daily_count = self._daily_usage[user_id]["count"]
-        hourly_count = self._hourly_usage[user_id]["count"]
+        now = time.time()
+        daily_count = self.backend.counts(f"daily:{user_id}", DAY_SECONDS, now)[1]
+        hourly_count = self.backend.counts(f"hourly:{user_id}", HOUR_SECONDS, now)[1]
         
         # Check limits
         if daily_count >= MAX_CREDITS_PER_DAY:
@@ -166,22 +462,25 @@ class CreditProtection:
     
     def record_credit_usage(self, user_id: str, credits: int = 1):
         """Record credit usage"""
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        current_hour = datetime.now(timezone.utc).strftime("%Y-%m-%d-%H")
-        
-        # Initialize if needed
-        if self._daily_usage[user_id]["date"] != today:
-            self._daily_usage[user_id] = {"count": 0, "date": today}
-        if self._hourly_usage[user_id]["hour"] != current_hour:
-            self._hourly_usage[user_id] = {"count": 0, "hour": current_hour}
-        
-        self._daily_usage[user_id]["count"] += credits
-        self._hourly_usage[user_id]["count"] += credits
+        now = time.time()
+        self.backend.incr(f"daily:{user_id}", DAY_SECONDS, now, credits)
+        self.backend.incr(f"hourly:{user_id}", HOUR_SECONDS, now, credits)
 
 
 # Global instances
-rate_limiter = RateLimiter()
-credit_protection = CreditProtection()
+rate_limiter = RateLimiter(create_backend("rate_limit"))
+credit_protection = CreditProtection(create_backend("credit"))
+
+
+async def start_backends(db):
+    """Attach the database to backends that need it (call from the app startup event)"""
+    for backend in (rate_limiter.backend, credit_protection.backend):
+        await backend.start(db)
+
+
+async def stop_backends():
+    for backend in (rate_limiter.backend, credit_protection.backend):
+        await backend.stop()
 
 
 def get_client_ip(request) -> str:
@@ -200,9 +499,112 @@ def get_client_ip(request) -> str:
     return request.client.host if request.client else "unknown"
 
 
+def route_class(path: str) -> Optional[str]:
+    """RATE_LIMITS tier for a raw request path (longest matching prefix)"""
+    for prefix in _ROUTE_PREFIXES:
+        if path.startswith(prefix):
+            return RATE_LIMIT_ROUTE_CLASSES[prefix]
+    return "api_global"
+
+
+_ROUTE_PREFIXES = sorted(RATE_LIMIT_ROUTE_CLASSES, key=len, reverse=True)
+
+
+def _cookie_value(header: bytes, name: bytes) -> Optional[bytes]:
+    """Value of the cookie named exactly `name` in a raw Cookie header"""
+    for pair in header.split(b";"):
+        key, sep, value = pair.strip().partition(b"=")
+        if sep and key == name:
+            return value.strip().strip(b'"') or None
+    return None
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware enforcing the route-class tier per IP, plus api_user per
+    session token, before routing and body parsing.
+
+    Keys are the raw IP / the token's signature tail, so the hot path does no hashing.
+    Forged tokens only create new per-token buckets; the per-IP limit still applies.
+    Responses carry RateLimit-Limit/-Remaining/-Reset for the tightest limit; 429s add Retry-After.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    @staticmethod
+    def _identity(scope) -> Tuple[str, Optional[str]]:
+        """(client IP, session token signature tail) from the raw ASGI headers"""
+        forwarded = real_ip = token = None
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                forwarded = value
+            elif name == b"x-real-ip":
+                real_ip = value
+            elif name == b"authorization" and value[:7] == b"Bearer ":
+                token = token or value[7:]
+            elif name == b"cookie":
+                token = _cookie_value(value, b"session_token") or token
+        if forwarded:
+            ip = forwarded.split(b",", 1)[0].strip().decode("latin-1")
+        elif real_ip:
+            ip = real_ip.decode("latin-1")
+        else:
+            client = scope.get("client")
+            ip = client[0] if client else "unknown"
+        # The JWT signature is already random - its tail is a compact, unhashed key
+        user = token.rsplit(b".", 1)[-1][-24:].decode("latin-1") if token else None
+        return ip, user
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_MIDDLEWARE_ENABLED or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        tier = route_class(scope["path"])
+        if tier is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        ip, user = self._identity(scope)
+        result = self.limiter.hit(tier, ip)
+        if result["allowed"] and user:
+            user_result = self.limiter.hit("api_user", user)
+            if not user_result["allowed"] or user_result["remaining"] < result["remaining"]:
+                result, tier = user_result, "api_user"
+
+        now = time.time()
+        reset_in = max(0, int(result["reset_at"] - now + 0.999))
+        headers = [
+            (b"ratelimit-limit", str(result["limit"]).encode()),
+            (b"ratelimit-remaining", str(result["remaining"]).encode()),
+            (b"ratelimit-reset", str(reset_in).encode())
+        ]
+
+        if not result["allowed"]:
+            rate_limited_total.inc(tier=tier)
+            body = b'{"detail":"Too many requests. Please slow down."}'
+            await send({
+                "type": "http.response.start", "status": 429,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            (b"retry-after", str(reset_in).encode()), *headers]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
 def get_status() -> Dict[str, Any]:
     return {
         "rate_limiting_enabled": rate_limiter.enabled,
         "max_credits_per_day": MAX_CREDITS_PER_DAY,
-        "max_generations_per_hour": MAX_GENERATIONS_PER_HOUR
+        "max_generations_per_hour": MAX_GENERATIONS_PER_HOUR,
+        "rate_limit_state": rate_limiter.backend.get_status(),
+        "credit_state": credit_protection.backend.get_status()
     }
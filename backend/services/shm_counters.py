@@ -0,0 +1,229 @@
+"""
+Shared-Memory Counters - rate limit state shared by all workers on one host
+A fixed-size, mmap-backed open-addressing table of windowed counters. Updates
+take a per-stripe fcntl byte-range lock, so increments are never lost across
+uvicorn workers, and incr_if_below checks the limit and increments under that one
+lock, so workers cannot jointly admit more than the limit.
+"""
+import os
+import time
+import mmap
+import fcntl
+import struct
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+from .security_service import CounterBackend, sliding_count, abuse_state_bytes, abuse_state_evictions_total
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+_DEFAULT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHARED_RATE_LIMIT_PATH = os.environ.get('SHARED_RATE_LIMIT_PATH', os.path.join(_DEFAULT_DIR, 'noxloop-ratelimit'))
+SHARED_RATE_LIMIT_SLOTS = int(os.environ.get('SHARED_RATE_LIMIT_SLOTS', '65536'))   # table capacity (40 bytes per slot)
+SHARED_RATE_LIMIT_STRIPES = int(os.environ.get('SHARED_RATE_LIMIT_STRIPES', '64'))  # independent lock regions
+
+MAGIC = b"NXRL"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")          # magic, version, slots, stripes
+HEADER_SIZE = 64
+# key hash, window id, window seconds, previous, current, (pad), block until
+SLOT = struct.Struct("<QqIIIxxxxd")
+KEY_HASH = struct.Struct("<Q")
+MAX_PROBES = 8
+
+
+def _hash(key: str) -> int:
+    """Stable 64-bit key hash (Python's hash() differs per process); 0 marks an empty slot"""
+    value = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class SharedTable:
+    """mmap'd slot table with striped locks. Slots are never emptied once used - a
+    probe chain ends at the first empty slot - and a full chain evicts its stalest slot."""
+
+    def __init__(self, path: str = SHARED_RATE_LIMIT_PATH, slots: int = SHARED_RATE_LIMIT_SLOTS,
+                 stripes: int = SHARED_RATE_LIMIT_STRIPES):
+        self.path = path
+        self.stripes = stripes
+        self.slots_per_stripe = max(slots // stripes, MAX_PROBES)
+        self.slots = self.slots_per_stripe * stripes
+        self.size = HEADER_SIZE + self.slots * SLOT.size
+        # fcntl locks are per process; this serializes threads within the process
+        self._thread_lock = threading.Lock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock(0, exclusive=True)
+        try:
+            self._initialize()
+        finally:
+            self._unlock(0)
+        self._mm = mmap.mmap(self._fd, self.size)
+
+    def _initialize(self):
+        """Create or reset the file when its layout does not match ours (first worker wins)"""
+        if os.fstat(self._fd).st_size == self.size:
+            header = os.pread(self._fd, HEADER.size, 0)
+            if HEADER.unpack(header) == (MAGIC, VERSION, self.slots, self.stripes):
+                return
+            logger.warning(f"Shared rate limit table {self.path} has a different layout, resetting")
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, self.size)
+        os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, self.slots, self.stripes), 0)
+        logger.info(f"Shared rate limit table created at {self.path} ({self.slots} slots, {self.size} bytes)")
+
+    def _lock(self, region: int, exclusive: bool):
+        fcntl.lockf(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, 1, region)
+
+    def _unlock(self, region: int):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, region)
+
+    def _probe(self, h: int, now: float, create: bool) -> Optional[int]:
+        """Offset of the slot holding h; with create, claim an empty or stale slot for it"""
+        mm = self._mm
+        stripe = h % self.stripes
+        base = HEADER_SIZE + stripe * self.slots_per_stripe * SLOT.size
+        start = (h // self.stripes) % self.slots_per_stripe
+        victim, victim_age = None, None
+        for i in range(MAX_PROBES):
+            offset = base + ((start + i) % self.slots_per_stripe) * SLOT.size
+            slot_hash = KEY_HASH.unpack_from(mm, offset)[0]
+            if slot_hash == h:
+                return offset
+            if slot_hash == 0:
+                if not create:
+                    return None
+                SLOT.pack_into(mm, offset, h, 0, 0, 0, 0, 0.0)
+                return offset
+            if create:
+                _, window_id, window, _, _, block_until = SLOT.unpack_from(mm, offset)
+                # Last activity: start of the newest bucket, or the end of a block
+                last_active = max(window_id * window, block_until)
+                idle = block_until <= now and (not window or window_id < int(now // window) - 1)
+                age = -1 if idle else last_active
+                if victim is None or age < victim_age:
+                    victim, victim_age = offset, age
+        if not create:
+            return None
+        if victim_age != -1:
+            abuse_state_evictions_total.inc(store="shared_table", reason="capacity")
+        SLOT.pack_into(mm, victim, h, 0, 0, 0, 0, 0.0)
+        return victim
+
+    def read(self, key: str, now: float) -> Optional[Tuple[int, int, int, int, float]]:
+        """(window_id, window, previous, current, block_until) for key, or None"""
+        h = _hash(key)
+        region = 1 + h % self.stripes
+        with self._thread_lock:
+            self._lock(region, exclusive=False)
+            try:
+                offset = self._probe(h, now, create=False)
+                return SLOT.unpack_from(self._mm, offset)[1:] if offset is not None else None
+            finally:
+                self._unlock(region)
+
+    def update(self, key: str, now: float, fn) -> Tuple[int, int, int, int, float]:
+        """Apply fn(window_id, window, previous, current, block_until) -> new values under the stripe lock"""
+        h = _hash(key)
+        region = 1 + h % self.stripes
+        with self._thread_lock:
+            self._lock(region, exclusive=True)
+            try:
+                offset = self._probe(h, now, create=True)
+                values = fn(*SLOT.unpack_from(self._mm, offset)[1:])
+                SLOT.pack_into(self._mm, offset, h, *values)
+                return values
+            finally:
+                self._unlock(region)
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+
+_tables: Dict[str, SharedTable] = {}
+
+
+def get_table(path: str = SHARED_RATE_LIMIT_PATH) -> SharedTable:
+    """One mapping per file per process, shared by every backend namespace"""
+    table = _tables.get(path)
+    if table is None:
+        table = _tables[path] = SharedTable(path)
+        abuse_state_bytes.set(table.size, store="shared_table")
+    return table
+
+
+class SharedMemoryCounterBackend(CounterBackend):
+    """CounterBackend over the host-wide shared table; keys are namespaced per backend"""
+
+    name = "shared"
+
+    def __init__(self, namespace: str, table: Optional[SharedTable] = None):
+        self.namespace = namespace
+        self.table = table or get_table()
+
+    def _key(self, kind: str, key: str) -> str:
+        return f"{self.namespace}|{kind}|{key}"
+
+    def counts(self, key: str, window: int, now: float) -> Tuple[int, int]:
+        slot = self.table.read(self._key("c", key), now)
+        if slot is None:
+            return 0, 0
+        window_id, _, previous, current, _ = slot
+        return self._roll(window_id, previous, current, int(now // window))
+
+    @staticmethod
+    def _roll(window_id: int, previous: int, current: int, now_id: int) -> Tuple[int, int]:
+        """Bucket counts of a slot moved to window now_id"""
+        if now_id == window_id:
+            return previous, current
+        return (current if now_id == window_id + 1 else 0), 0
+
+    def incr(self, key: str, window: int, now: float, amount: int = 1) -> Tuple[int, int]:
+        now_id = int(now // window)
+
+        def apply(window_id, _window, previous, current, block_until):
+            previous, current = self._roll(window_id, previous, current, now_id)
+            return now_id, window, previous, current + amount, block_until
+
+        _, _, previous, current, _ = self.table.update(self._key("c", key), now, apply)
+        return previous, current
+
+    def incr_if_below(self, key: str, window: int, now: float, limit: int, amount: int = 1) -> Tuple[bool, int, int]:
+        now_id = int(now // window)
+        allowed = False
+
+        def apply(window_id, _window, previous, current, block_until):
+            nonlocal allowed
+            previous, current = self._roll(window_id, previous, current, now_id)
+            allowed = int(sliding_count(previous, current, window, now)) < limit
+            return now_id, window, previous, current + (amount if allowed else 0), block_until
+
+        _, _, previous, current, _ = self.table.update(self._key("c", key), now, apply)
+        return allowed, previous, current - (amount if allowed else 0)
+
+    def clear(self, key: str):
+        # Zero the counts but keep the slot claimed so probe chains stay intact
+        self.table.update(self._key("c", key), time.time(), lambda window_id, window, *_: (window_id, window, 0, 0, 0.0))
+
+    def blocked_until(self, key: str, now: float) -> float:
+        slot = self.table.read(self._key("b", key), now)
+        if slot is None or slot[4] <= now:
+            return 0
+        return slot[4]
+
+    def block(self, key: str, until: float):
+        self.table.update(self._key("b", key), time.time(), lambda window_id, window, previous, current, _: (
+            window_id, window, previous, current, until))
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "path": self.table.path,
+            "slots": self.table.slots,
+            "bytes": self.table.size
+        }
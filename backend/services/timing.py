@@ -0,0 +1,128 @@
+"""
+Request Timing - per-request phase breakdown
+Services report into a request-scoped context; the middleware emits a
+Server-Timing header and a structured log line for slow requests.
+"""
+import os
+import json
+import time
+import threading
+import contextvars
+from typing import Dict, Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', '2000'))
+
+
+class RequestTiming:
+    """Accumulated duration and call count per phase for one request.
+    Mongo command callbacks report from Motor's executor threads, hence the lock."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._phases: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self._phases.get(name)
+            if entry is None:
+                self._phases[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def phases(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: {"ms": round(total * 1000, 2), "count": int(count)} for name, (total, count) in self._phases.items()}
+
+    def header_value(self) -> str:
+        parts = [f'{name};desc="{p["count"]}x";dur={p["ms"]}' for name, p in self.phases().items()]
+        parts.append(f"total;dur={round(self.elapsed_ms(), 2)}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar("request_timing", default=None)
+
+
+def current() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+def record(name: str, seconds: float):
+    """Add a measured duration to the current request (no-op outside a request)"""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+class phase:
+    """Time a block as a named phase of the current request.
+
+        with timing.phase("rag"):
+            docs = await rag_client.retrieve(query)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware owning the per-request timing context"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SERVER_TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.header_value().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed_ms = timing.elapsed_ms()
+            if elapsed_ms >= SLOW_REQUEST_THRESHOLD_MS:
+                route = scope.get("route")
+                logger.warning("slow_request " + json.dumps({
+                    "method": scope.get("method"),
+                    "route": getattr(route, "path", None) or scope.get("path"),
+                    "status": status_holder["status"],
+                    "duration_ms": round(elapsed_ms, 2),
+                    "phases": timing.phases()
+                }))
+
+
+def get_status() -> Dict[str, Any]:
+    return {
+        "server_timing_enabled": SERVER_TIMING_ENABLED,
+        "slow_request_threshold_ms": SLOW_REQUEST_THRESHOLD_MS
+    }
@@ -0,0 +1,528 @@
+"""
+Vector Index - embedded retrieval backend for single-box deployments
+Chunk embeddings live in a memory-mapped float32 matrix on disk, one row per chunk.
+Rows are L2-normalized, so one matrix product scores a batch of queries by cosine
+similarity and argpartition picks the top-k. Adds and deletes are incremental.
+"""
+import os
+import json
+import time
+import zlib
+import asyncio
+import threading
+from pathlib import Path
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional
+import logging
+
+import httpx
+import numpy as np
+
+from .rag_client import RetrievalBackend, tokenize, prepare_document, acquire_writer_lock
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+RAG_INDEX_DIR = os.environ.get('RAG_INDEX_DIR', '/app/data/rag_index')
+RAG_EMBEDDER = os.environ.get('RAG_EMBEDDER', 'hashing').lower()                # hashing | http
+RAG_EMBED_DIM = int(os.environ.get('RAG_EMBED_DIM', '384'))                     # must match the model for http
+RAG_EMBED_BASE_URL = os.environ.get('RAG_EMBED_BASE_URL', os.environ.get('LOCAL_LLM_BASE_URL', 'http://localhost:5002'))
+RAG_EMBED_MODEL = os.environ.get('RAG_EMBED_MODEL', 'local-embedding')
+RAG_EMBED_API_KEY = os.environ.get('RAG_EMBED_API_KEY', os.environ.get('LOCAL_LLM_API_KEY', 'not-needed'))
+RAG_EMBED_BATCH = int(os.environ.get('RAG_EMBED_BATCH', '64'))                  # chunks per embedding call
+RAG_MIN_SCORE = float(os.environ.get('RAG_MIN_SCORE', '0.05'))                  # weaker matches are dropped
+RAG_COMPACT_RATIO = float(os.environ.get('RAG_COMPACT_RATIO', '0.25'))          # compact once this share of rows is deleted
+RAG_INLINE_SEARCH_ROWS = int(os.environ.get('RAG_INLINE_SEARCH_ROWS', '20000')) # larger indexes are searched off the event loop
+RAG_INDEX_REFRESH_SECONDS = float(os.environ.get('RAG_INDEX_REFRESH_SECONDS', '2'))  # read-only workers pick up writes
+
+FORMAT_VERSION = 1
+INITIAL_CAPACITY = 1024
+COMPACT_CHUNK_ROWS = 8192
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows in float32; all-zero rows stay zero"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ==================== EMBEDDERS ====================
+
+class Embedder(ABC):
+    """Turns texts into a (len(texts), dim) float32 matrix with L2-normalized rows"""
+
+    name = "none"
+    dim = 0
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the embedding space; an index built with another one is discarded"""
+        return f"{self.name}-{self.dim}"
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """Signed feature hashing of word unigrams and bigrams with sublinear term weights.
+    Needs no model and is stable across processes, but only captures lexical overlap."""
+
+    name = "hashing"
+
+    def __init__(self, dim: int = RAG_EMBED_DIM):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        tokens = tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        # crc32, unlike hash(), is the same in every process - the index is persisted
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, hashes % self.dim, signs)
+        return np.sign(vector) * np.log1p(np.abs(vector))
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return normalize_rows(np.stack([self._vector(text) for text in texts]))
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if len(texts) > RAG_EMBED_BATCH:
+            return await asyncio.to_thread(self.embed_sync, texts)
+        return self.embed_sync(texts)
+
+
+class HTTPEmbedder(Embedder):
+    """OpenAI-compatible /v1/embeddings endpoint (a local embedding server or the LLM box)"""
+
+    name = "http"
+
+    def __init__(self, base_url: str, model: str, api_key: str = "not-needed", dim: int = RAG_EMBED_DIM):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.dim = dim
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.name}-{self.model}-{self.dim}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.post(
+                f"{self.base_url}/v1/embeddings",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={"model": self.model, "input": texts}
+            )
+            response.raise_for_status()
+            data = sorted(response.json()["data"], key=lambda item: item.get("index", 0))
+        matrix = np.asarray([item["embedding"] for item in data], dtype=np.float32)
+        if matrix.shape != (len(texts), self.dim):
+            raise ValueError(f"Embedding shape {matrix.shape} does not match RAG_EMBED_DIM={self.dim}")
+        return normalize_rows(matrix)
+
+
+def create_embedder() -> Embedder:
+    """Build the embedder selected by RAG_EMBEDDER"""
+    if RAG_EMBEDDER == "http":
+        return HTTPEmbedder(RAG_EMBED_BASE_URL, RAG_EMBED_MODEL, RAG_EMBED_API_KEY)
+    return HashingEmbedder()
+
+
+# ==================== INDEX ====================
+
+class VectorIndex:
+    """float32 embedding matrix (memory-mapped) plus an append-only document log.
+
+    Files in `path`:
+      writer.lock            flock held by the one process that writes the directory
+      meta.json              format version, dim, embedder fingerprint, generation
+      vectors-<gen>.f32      row-major matrix, capacity doubled as it fills
+      docs-<gen>.jsonl       add/delete records, replayed on load
+    Deleted rows are masked until compaction rewrites both files under the next
+    generation and switches meta.json atomically.
+
+    The first process to open a directory becomes its writer; others (further
+    uvicorn workers) open it read-only and refresh() from the writer's log.
+    """
+
+    def __init__(self, path: str, dim: int, fingerprint: str = ""):
+        self.path = Path(path)
+        self.dim = dim
+        self.fingerprint = fingerprint
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._matrix: Optional[np.memmap] = None
+        self._log = None
+        self._log_offset = 0                             # bytes of the docs log applied (readers)
+        self._next_refresh = 0.0
+        self._clear()
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._writer_lock = acquire_writer_lock(self.path)
+        self.read_only = self._writer_lock is None
+        self._load()
+
+    def _clear(self):
+        self._count = 0                                  # rows in use, live or deleted
+        self._capacity = 0
+        self._live = np.zeros(0, dtype=bool)
+        self._dead_rows: Optional[np.ndarray] = None     # cached mask indexes, None = stale
+        self._row_ids: List[Optional[str]] = []
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}                  # document id -> row
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def rows(self) -> int:
+        return self._count
+
+    # ---------- Files ----------
+
+    def _files(self, generation: int):
+        return self.path / f"vectors-{generation}.f32", self.path / f"docs-{generation}.jsonl"
+
+    def _write_meta(self):
+        meta = {"version": FORMAT_VERSION, "dim": self.dim, "fingerprint": self.fingerprint,
+                "generation": self._generation}
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.path / "meta.json")
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((self.path / "meta.json").read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _compatible(self, meta: Optional[Dict[str, Any]]) -> bool:
+        return bool(meta) and (meta.get("version"), meta.get("dim"), meta.get("fingerprint")) == (
+            FORMAT_VERSION, self.dim, self.fingerprint)
+
+    def _load(self):
+        meta = self._read_meta()
+        if self._compatible(meta):
+            self._generation = meta["generation"]
+        elif self.read_only:
+            # Nothing usable yet - the writer (re)creates the index and refresh() picks it up
+            self._generation = (meta or {}).get("generation", 0)
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            return
+        else:
+            if meta:
+                logger.warning(f"Vector index at {self.path} was built with {meta.get('fingerprint')}, "
+                               f"starting empty for {self.fingerprint}")
+            self._generation = (meta or {}).get("generation", 0) + 1
+            self._write_meta()
+
+        vectors_path, docs_path = self._files(self._generation)
+        self._log_offset = 0
+        if docs_path.exists():
+            self._replay(docs_path)
+        self._open_matrix(vectors_path, max(self._count, INITIAL_CAPACITY))
+        if not self.read_only:
+            self._log = open(docs_path, "ab")
+            self._remove_stale_files()
+        logger.info(f"Vector index loaded from {self.path}{' (read-only)' if self.read_only else ''}: "
+                    f"{len(self)} documents, {self._count} rows")
+
+    def _replay(self, docs_path: Path):
+        """Apply log records from _log_offset on; the writer truncates a torn tail, readers wait for it"""
+        valid = self._log_offset
+        with open(docs_path, "rb") as f:
+            f.seek(valid)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write at the tail from a crash (or still being written)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record["op"] == "add":
+                    self._place(record["id"], record["row"], record["doc"])
+                else:
+                    self._remove(record["id"])
+                valid += len(line)
+        self._log_offset = valid
+        if not self.read_only and valid < docs_path.stat().st_size:
+            logger.warning(f"Truncating partial record at the end of {docs_path}")
+            os.truncate(docs_path, valid)
+
+    def refresh_due(self) -> bool:
+        return self.read_only and time.monotonic() >= self._next_refresh
+
+    def refresh(self):
+        """Read-only instances: apply what the writer appended, or reload after it compacted"""
+        if not self.read_only:
+            return
+        self._next_refresh = time.monotonic() + RAG_INDEX_REFRESH_SECONDS
+        with self._lock:
+            meta = self._read_meta()
+            if not self._compatible(meta):
+                return
+            try:
+                if meta["generation"] != self._generation:
+                    self._clear()
+                    self._load()
+                    return
+                vectors_path, docs_path = self._files(self._generation)
+                if docs_path.stat().st_size > self._log_offset:
+                    self._replay(docs_path)
+                    if self._count > self._capacity:
+                        self._open_matrix(vectors_path, self._count)
+            except FileNotFoundError:
+                # Compacted away between reading meta.json and opening the files - retry next time
+                self._clear()
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+                self._generation = -1
+
+    def _open_matrix(self, vectors_path: Path, capacity: int):
+        row_bytes = self.dim * 4
+        size = vectors_path.stat().st_size if vectors_path.exists() else 0
+        if self.read_only:
+            # Map what the writer allocated; it grows the file before logging rows past the end
+            capacity = size // row_bytes
+        elif size < capacity * row_bytes:
+            with open(vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)  # sparse zero fill
+        else:
+            capacity = size // row_bytes
+        if capacity:
+            self._matrix = np.memmap(vectors_path, dtype=np.float32, mode="r" if self.read_only else "r+",
+                                     shape=(capacity, self.dim))
+        else:
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._capacity = capacity
+        live = np.zeros(capacity, dtype=bool)
+        live[list(self._rows.values())] = True
+        self._live = live
+        self._dead_rows = None
+
+    def _remove_stale_files(self):
+        current = set(self._files(self._generation))
+        for pattern in ("vectors-*.f32", "docs-*.jsonl"):
+            for stale in self.path.glob(pattern):
+                if stale not in current:
+                    stale.unlink(missing_ok=True)
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._capacity:
+            return
+        self._matrix.flush()
+        self._matrix = None
+        self._open_matrix(self._files(self._generation)[0], max(rows, self._capacity * 2))
+
+    def _append(self, records: List[Dict[str, Any]]):
+        self._log.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode())
+        self._log.flush()
+
+    # ---------- Row bookkeeping ----------
+
+    def _place(self, doc_id: str, row: int, doc: Dict[str, Any]):
+        self._remove(doc_id)  # re-adding an id replaces it
+        while len(self._row_ids) <= row:
+            self._row_ids.append(None)
+            self._docs.append(None)
+        self._row_ids[row] = doc_id
+        self._docs[row] = doc
+        self._rows[doc_id] = row
+        self._count = max(self._count, row + 1)
+        if row < len(self._live):
+            self._live[row] = True
+
+    def _remove(self, doc_id: str) -> bool:
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return False
+        self._row_ids[row] = None
+        self._docs[row] = None
+        if row < len(self._live):
+            self._live[row] = False
+        self._dead_rows = None
+        return True
+
+    def _dead(self) -> np.ndarray:
+        if self._dead_rows is None:
+            self._dead_rows = np.flatnonzero(~self._live[:self._count])
+        return self._dead_rows
+
+    # ---------- Public API ----------
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Vector index at {self.path} is written by another process")
+
+    def add(self, ids: List[str], docs: List[Dict[str, Any]], vectors: np.ndarray):
+        """Append documents with their (normalized) embeddings; existing ids are replaced"""
+        self._check_writable()
+        if vectors.shape != (len(ids), self.dim):
+            raise ValueError(f"Expected vectors of shape {(len(ids), self.dim)}, got {vectors.shape}")
+        with self._lock:
+            start = self._count
+            self._ensure_capacity(start + len(ids))
+            self._matrix[start:start + len(ids)] = vectors
+            self._matrix.flush()
+            records = []
+            for offset, (doc_id, doc) in enumerate(zip(ids, docs)):
+                self._place(doc_id, start + offset, doc)
+                records.append({"op": "add", "id": doc_id, "row": start + offset, "doc": doc})
+            # Vectors are on disk before the log references them
+            self._append(records)
+            self._maybe_compact()
+
+    def delete(self, ids: List[str]) -> int:
+        """Tombstone documents by id; returns how many existed"""
+        self._check_writable()
+        with self._lock:
+            removed = [doc_id for doc_id in ids if self._remove(doc_id)]
+            if removed:
+                self._append([{"op": "delete", "id": doc_id} for doc_id in removed])
+                self._maybe_compact()
+            return len(removed)
+
+    def search(self, queries: np.ndarray, top_k: int, min_score: float = RAG_MIN_SCORE) -> List[List[Dict[str, Any]]]:
+        """Top-k documents per query row (cosine similarity), best first"""
+        with self._lock:
+            n, live = self._count, len(self._rows)
+            if not n or not live or top_k <= 0:
+                return [[] for _ in range(len(queries))]
+
+            scores = np.asarray(queries, dtype=np.float32) @ self._matrix[:n].T
+            if live < n:
+                scores[:, self._dead()] = -np.inf
+            k = min(top_k, live)
+            top = np.argpartition(scores, n - k, axis=1)[:, n - k:] if k < n else np.tile(np.arange(n), (len(scores), 1))
+
+            results = []
+            for query_scores, candidates in zip(scores, top):
+                ranked = candidates[np.argsort(-query_scores[candidates])]
+                results.append([
+                    {"id": self._row_ids[row], **self._docs[row], "score": round(float(query_scores[row]), 4)}
+                    for row in ranked if query_scores[row] >= min_score
+                ])
+            return results
+
+    def _maybe_compact(self):
+        dead = self._count - len(self._rows)
+        if self._count >= INITIAL_CAPACITY and dead > self._count * RAG_COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Rewrite live rows contiguously under the next generation"""
+        self._check_writable()
+        with self._lock:
+            rows = np.flatnonzero(self._live[:self._count])
+            generation = self._generation + 1
+            vectors_path, docs_path = self._files(generation)
+            capacity = max(INITIAL_CAPACITY, len(rows) * 2)
+
+            compacted = np.memmap(vectors_path, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+            for start in range(0, len(rows), COMPACT_CHUNK_ROWS):
+                chunk = rows[start:start + COMPACT_CHUNK_ROWS]
+                compacted[start:start + len(chunk)] = self._matrix[chunk]
+            compacted.flush()
+            del compacted
+
+            ids = [self._row_ids[row] for row in rows]
+            docs = [self._docs[row] for row in rows]
+            with open(docs_path, "wb") as f:
+                f.write("".join(
+                    json.dumps({"op": "add", "id": doc_id, "row": row, "doc": doc}, ensure_ascii=False) + "\n"
+                    for row, (doc_id, doc) in enumerate(zip(ids, docs))
+                ).encode())
+                f.flush()
+                os.fsync(f.fileno())
+
+            # meta.json names the generation in use, so the switch is atomic on disk
+            previous = self._generation
+            self._generation = generation
+            self._write_meta()
+
+            self._log.close()
+            self._matrix = None
+            self._row_ids, self._docs = ids, docs
+            self._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+            self._count = len(ids)
+            self._open_matrix(vectors_path, capacity)
+            self._log = open(docs_path, "ab")
+            self._remove_stale_files()
+            logger.info(f"Vector index compacted: generation {previous} -> {generation}, {self._count} rows")
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self),
+            "rows": self._count,
+            "capacity": self._capacity,
+            "dim": self.dim,
+            "bytes": self._capacity * self.dim * 4,
+            "generation": self._generation,
+            "read_only": self.read_only,
+            "path": str(self.path)
+        }
+
+
+# ==================== BACKEND ====================
+
+class VectorRetrievalBackend(RetrievalBackend):
+    """Embedded vector index behind the RAGClient API"""
+
+    name = "vector"
+    writable = True
+
+    def __init__(self, index_dir: str = RAG_INDEX_DIR, embedder: Optional[Embedder] = None):
+        self.embedder = embedder or create_embedder()
+        self.index = VectorIndex(index_dir, self.embedder.dim, self.embedder.fingerprint)
+
+    @property
+    def read_only(self) -> bool:
+        return self.index.read_only
+
+    async def _search(self, vectors: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        if self.index.refresh_due():
+            await asyncio.to_thread(self.index.refresh)
+        if self.index.rows > RAG_INLINE_SEARCH_ROWS:
+            return await asyncio.to_thread(self.index.search, vectors, top_k)
+        return self.index.search(vectors, top_k)
+
+    async def retrieve(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        vectors = await self.embedder.embed([query])
+        return (await self._search(vectors, top_k))[0]
+
+    async def retrieve_many(self, queries: List[str], top_k: int) -> List[List[Dict[str, Any]]]:
+        """Score several queries in one matrix product"""
+        vectors = await self.embedder.embed(queries)
+        return await self._search(vectors, top_k)
+
+    async def add_documents(self, documents: List[Dict[str, Any]]) -> int:
+        prepared = [doc for doc in map(prepare_document, documents) if doc]
+        for start in range(0, len(prepared), RAG_EMBED_BATCH):
+            batch = prepared[start:start + RAG_EMBED_BATCH]
+            vectors = await self.embedder.embed([doc["content"] for doc in batch])
+            await asyncio.to_thread(
+                self.index.add,
+                [doc["id"] for doc in batch],
+                [{"content": doc["content"], "source": doc["source"], "metadata": doc["metadata"]} for doc in batch],
+                vectors
+            )
+        return len(prepared)
+
+    async def delete_documents(self, ids: List[str]) -> int:
+        return await asyncio.to_thread(self.index.delete, ids)
+
+    async def is_available(self) -> bool:
+        return self.index._matrix is not None
+
+    def get_status(self) -> Dict[str, Any]:
+        return {"embedder": self.embedder.name, "index": self.index.get_status()}
@@ -8,6 +8,9 @@ from typing import Dict, Any, Optional
 from datetime import datetime, timezone
 import asyncio
 
+from .metrics import side_effects_in_flight, side_effects_total
+from . import timing
+
 logger = logging.getLogger(__name__)
 
 class WebhookService:
@@ -41,6 +44,17 @@ class WebhookService:
         
         attempts = self.retry_count if retry else 1
         
+        side_effects_in_flight.inc(kind="webhook")
+        try:
+            with timing.phase("webhook"):
+                delivered = await self._deliver(event_type, event_data, attempts)
+        finally:
+            side_effects_in_flight.dec(kind="webhook")
+        side_effects_total.inc(kind="webhook", status="ok" if delivered else "failed")
+        return delivered
+    
+    async def _deliver(self, event_type: str, event_data: Dict[str, Any], attempts: int) -> bool:
+        """POST the event, retrying up to attempts times"""
         for attempt in range(attempts):
             try:
                 async with httpx.AsyncClient(timeout=self.timeout) as client:
@@ -0,0 +1,330 @@
+"""
+Workspace Export - bulk export of a workspace's products and campaigns
+Runs as a background job: documents are streamed from async Mongo cursors in
+small batches, written to a ZIP (or gzipped NDJSON) file by a worker thread, and
+the job record gets a download link once the archive is complete.
+
+Jobs are owned by the process running them, which renews a lease on them; only
+jobs whose lease ran out (their owner died) are failed by other processes.
+Archives live in WORKSPACE_EXPORT_DIR, which every node serving downloads must
+share - each job records the storage it was written to, and a node with
+different storage refuses the download instead of reporting it missing.
+"""
+import os
+import gzip
+import json
+import time
+import uuid
+import socket
+import asyncio
+import zipfile
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional
+import logging
+
+from .campaign_builder import campaign_builder
+from .webhook_service import webhook_service
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+WORKSPACE_EXPORT_DIR = os.environ.get('WORKSPACE_EXPORT_DIR', '/app/exports/workspaces')
+WORKSPACE_EXPORT_TTL_HOURS = float(os.environ.get('WORKSPACE_EXPORT_TTL_HOURS', '24'))
+WORKSPACE_EXPORT_CONCURRENCY = int(os.environ.get('WORKSPACE_EXPORT_CONCURRENCY', '2'))
+WORKSPACE_EXPORT_BATCH = int(os.environ.get('WORKSPACE_EXPORT_BATCH', '50'))  # documents per write
+WORKSPACE_EXPORT_LEASE_SECONDS = float(os.environ.get('WORKSPACE_EXPORT_LEASE_SECONDS', '60'))  # renewed every third
+
+FORMATS = {"zip": ".zip", "ndjson": ".ndjson.gz"}
+ACTIVE = ["pending", "running"]
+STORAGE_ID_FILE = ".storage_id"
+
+
+def _dumps(doc: Dict[str, Any], **kwargs) -> str:
+    return json.dumps(doc, ensure_ascii=False, default=str, **kwargs)
+
+
+class _ZipArchive:
+    """products/<id>.json + .md and campaigns/<id>/ (same files as a campaign export)"""
+
+    def __init__(self, path: Path):
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+
+    def write(self, kind: str, docs: List[Dict[str, Any]]):
+        for doc in docs:
+            if kind == "product":
+                prefix = f"products/{doc['product_id']}"
+                self._zip.writestr(f"{prefix}.json", _dumps(doc, indent=2))
+                if doc.get("content"):
+                    self._zip.writestr(f"{prefix}.md", f"# {doc.get('title', '')}\n\n{doc['content']}")
+            else:
+                for filename, content in campaign_builder.iter_files(doc):
+                    self._zip.writestr(f"campaigns/{doc['campaign_id']}/{filename}", content)
+
+    def close(self, manifest: Dict[str, Any]):
+        self._zip.writestr("manifest.json", _dumps(manifest, indent=2))
+        self._zip.close()
+
+    def abort(self):
+        self._zip.close()
+
+
+class _NDJSONArchive:
+    """One {"type": ..., "data": ...} line per document, gzip-compressed"""
+
+    def __init__(self, path: Path):
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+
+    def write(self, kind: str, docs: List[Dict[str, Any]]):
+        self._file.writelines(_dumps({"type": kind, "data": doc}) + "\n" for doc in docs)
+
+    def close(self, manifest: Dict[str, Any]):
+        self._file.write(_dumps({"type": "manifest", "data": manifest}) + "\n")
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+
+
+class WorkspaceExporter:
+    """Creates, runs and serves workspace export jobs (job records live in db.export_jobs)"""
+
+    def __init__(self):
+        self.directory = Path(WORKSPACE_EXPORT_DIR)
+        self.db = None
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.storage_id: Optional[str] = None
+        self._tasks: set = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def start(self, db):
+        """
+        Call from the app startup event. Never raises: without a usable export
+        directory exports are unavailable (503) until the heartbeat opens it, and
+        abandoned jobs are failed by the heartbeat rather than here.
+        """
+        self.db = db
+        self._semaphore = asyncio.Semaphore(WORKSPACE_EXPORT_CONCURRENCY)
+        await self._open_storage()
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.ensure_future(self._heartbeat())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *filter(None, [self._heartbeat_task]), return_exceptions=True)
+        self._heartbeat_task = None
+
+    @property
+    def available(self) -> bool:
+        """Whether the export directory could be set up"""
+        return self.storage_id is not None
+
+    async def _open_storage(self):
+        try:
+            self.storage_id = await asyncio.to_thread(self._read_storage_id)
+            await asyncio.to_thread(self._sweep)
+        except OSError as e:
+            logger.error(f"Workspace export directory {self.directory} unusable, exports unavailable: {e}")
+
+    def _read_storage_id(self) -> str:
+        """Identity of the export directory, created by the first process to use it"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / STORAGE_ID_FILE
+        if not path.is_file():
+            tmp = path.with_name(f"{STORAGE_ID_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+            tmp.write_text(uuid.uuid4().hex)
+            try:
+                os.link(tmp, path)  # atomic; loses to a concurrent creator
+            except FileExistsError:
+                pass
+            finally:
+                tmp.unlink(missing_ok=True)
+        return path.read_text().strip()
+
+    @staticmethod
+    def _lease_until() -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=WORKSPACE_EXPORT_LEASE_SECONDS)).isoformat()
+
+    async def _fail_stale(self):
+        """Fail unfinished jobs whose lease expired - their owner crashed or was stopped"""
+        result = await self.db.export_jobs.update_many(
+            {"status": {"$in": ACTIVE}, "$or": [
+                {"lease_until": {"$lt": datetime.now(timezone.utc).isoformat()}},
+                {"lease_until": {"$exists": False}}
+            ]},
+            {"$set": {"status": "failed", "error": "Interrupted (the exporting process stopped)"}}
+        )
+        if result.modified_count:
+            logger.warning(f"Marked {result.modified_count} interrupted workspace exports as failed")
+
+    async def _heartbeat(self):
+        """
+        Renew the lease of this process's jobs and fail jobs abandoned by others
+        (first beat right away); retries opening the export directory until it works
+        """
+        while True:
+            if not self.available:
+                await self._open_storage()
+            try:
+                if self._tasks:
+                    await self.db.export_jobs.update_many(
+                        {"owner": self.owner, "status": {"$in": ACTIVE}},
+                        {"$set": {"lease_until": self._lease_until()}}
+                    )
+                await self._fail_stale()
+            except Exception as e:
+                logger.warning(f"Workspace export heartbeat failed: {e}")
+            await asyncio.sleep(WORKSPACE_EXPORT_LEASE_SECONDS / 3)
+
+    def is_local(self, job: Dict[str, Any]) -> bool:
+        """Whether this process sees the storage the job's archive was written to"""
+        return job.get("storage_id") == self.storage_id
+
+    def path_for(self, job: Dict[str, Any]) -> Path:
+        return self.directory / f"{job['job_id']}{FORMATS[job['format']]}"
+
+    async def create_job(self, workspace_id: str, user_id: str, export_format: str = "zip") -> Dict[str, Any]:
+        """Queue an export; an unfinished job for the same workspace is returned instead of a new one"""
+        await self._fail_stale()
+        active = await self.db.export_jobs.find_one(
+            {"workspace_id": workspace_id, "status": {"$in": ACTIVE}}, {"_id": 0}
+        )
+        if active:
+            return active
+        await asyncio.to_thread(self._sweep)
+
+        now = datetime.now(timezone.utc)
+        job = {
+            "job_id": f"wsexp_{uuid.uuid4().hex[:12]}",
+            "workspace_id": workspace_id,
+            "user_id": user_id,
+            "format": export_format,
+            "status": "pending",
+            "owner": self.owner,
+            "storage_id": self.storage_id,
+            "lease_until": self._lease_until(),
+            "counts": {"products": 0, "campaigns": 0},
+            "size_bytes": None,
+            "error": None,
+            "created_at": now.isoformat(),
+            "completed_at": None,
+            "expires_at": None
+        }
+        await self.db.export_jobs.insert_one(dict(job))
+        task = asyncio.ensure_future(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Dict[str, Any]):
+        job_filter = {"job_id": job["job_id"]}
+        path = self.path_for(job)
+        tmp = path.with_name(f".{path.name}.tmp")
+        async with self._semaphore:
+            started = time.perf_counter()
+            await self.db.export_jobs.update_one(
+                job_filter, {"$set": {"status": "running", "lease_until": self._lease_until()}}
+            )
+            try:
+                await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+                archive = await asyncio.to_thread(_ZipArchive if job["format"] == "zip" else _NDJSONArchive, tmp)
+                try:
+                    counts = {
+                        "products": await self._copy(archive, "product", self.db.products, job["workspace_id"]),
+                        "campaigns": await self._copy(archive, "campaign", self.db.campaigns, job["workspace_id"])
+                    }
+                except BaseException:
+                    archive.abort()
+                    raise
+                manifest = {"workspace_id": job["workspace_id"], "job_id": job["job_id"],
+                            "exported_at": datetime.now(timezone.utc).isoformat(), "counts": counts}
+                await asyncio.to_thread(archive.close, manifest)
+                await asyncio.to_thread(os.replace, tmp, path)
+            except BaseException as e:
+                tmp.unlink(missing_ok=True)
+                cancelled = isinstance(e, asyncio.CancelledError)
+                await asyncio.shield(self.db.export_jobs.update_one(
+                    job_filter, {"$set": {"status": "failed", "error": "Cancelled" if cancelled else str(e)}}
+                ))
+                if cancelled:
+                    raise
+                logger.error(f"Workspace export {job['job_id']} failed: {e}")
+                return
+
+            completed = datetime.now(timezone.utc)
+            update = {
+                "status": "completed",
+                "counts": counts,
+                "size_bytes": path.stat().st_size,
+                "completed_at": completed.isoformat(),
+                "expires_at": (completed + timedelta(hours=WORKSPACE_EXPORT_TTL_HOURS)).isoformat()
+            }
+            await self.db.export_jobs.update_one(job_filter, {"$set": update})
+            job.update(update)
+            await self.db.usage.insert_one({
+                "workspace_id": job["workspace_id"],
+                "user_id": job["user_id"],
+                "action": "export",
+                "credits_used": 0,
+                "metadata": {"job_id": job["job_id"], "type": f"workspace_{job['format']}"},
+                "created_at": update["completed_at"]
+            })
+            await webhook_service.export_generated(
+                job["job_id"], job["workspace_id"], job["user_id"], f"workspace_{job['format']}", update["size_bytes"]
+            )
+            logger.info(f"Workspace export {job['job_id']}: {counts} in {time.perf_counter() - started:.1f}s, "
+                        f"{update['size_bytes']} bytes")
+
+    async def _copy(self, archive, kind: str, collection, workspace_id: str) -> int:
+        """Stream one collection into the archive; at most one batch is held in memory"""
+        count = 0
+        batch: List[Dict[str, Any]] = []
+        cursor = collection.find({"workspace_id": workspace_id}, {"_id": 0}).batch_size(WORKSPACE_EXPORT_BATCH)
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= WORKSPACE_EXPORT_BATCH:
+                await asyncio.to_thread(archive.write, kind, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            await asyncio.to_thread(archive.write, kind, batch)
+            count += len(batch)
+        return count
+
+    def is_expired(self, job: Dict[str, Any]) -> bool:
+        expires_at = job.get("expires_at")
+        return bool(expires_at) and datetime.fromisoformat(expires_at) <= datetime.now(timezone.utc)
+
+    def _sweep(self):
+        """Delete archives past their TTL (download links stop working at expires_at anyway)"""
+        if not self.directory.is_dir():
+            return
+        cutoff = time.time() - WORKSPACE_EXPORT_TTL_HOURS * 3600
+        for entry in os.scandir(self.directory):
+            if entry.name == STORAGE_ID_FILE:
+                continue
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.directory),
+            "owner": self.owner,
+            "storage_id": self.storage_id,
+            "available": self.available,
+            "running": len(self._tasks),
+            "concurrency": WORKSPACE_EXPORT_CONCURRENCY,
+            "ttl_hours": WORKSPACE_EXPORT_TTL_HOURS,
+            "lease_seconds": WORKSPACE_EXPORT_LEASE_SECONDS
+        }
+
+
+# Global instance
+workspace_exporter = WorkspaceExporter()
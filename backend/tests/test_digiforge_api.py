@@ -6,6 +6,7 @@ import pytest
 import requests
 import os
 import uuid
+import time
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://noxloop-media-studio.preview.emergentagent.com').rstrip('/')
 
@@ -33,6 +34,44 @@ class TestSystemStatus:
         assert "version" in data
         print(f"✓ Status: LLM={data['llm_provider']}, DB={data['database_connected']}")
 
+    def test_liveness_endpoint(self):
+        """Test /api/health/live answers without dependency checks"""
+        response = requests.get(f"{BASE_URL}/api/health/live")
+        assert response.status_code == 200
+        assert response.json()["status"] == "alive"
+        print("✓ Liveness OK")
+
+    def test_readiness_endpoint(self):
+        """Test /api/health/ready serves cached database and storage checks"""
+        response = requests.get(f"{BASE_URL}/api/health/ready")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["status"] == "ready"
+        assert data["checks"]["database"]["status"] == "healthy"
+        assert data["checks"]["storage"]["status"] == "healthy"
+        print("✓ Readiness OK")
+
+
+class TestRateLimiting:
+    """Global rate limit middleware tests"""
+
+    def test_rate_limit_headers(self):
+        """Test API responses carry RateLimit headers"""
+        response = requests.get(f"{BASE_URL}/api/billing/plans")
+        assert response.status_code == 200
+        assert int(response.headers["RateLimit-Limit"]) > 0
+        assert 0 <= int(response.headers["RateLimit-Remaining"]) < int(response.headers["RateLimit-Limit"])
+        assert int(response.headers["RateLimit-Reset"]) >= 0
+        print(f"✓ Rate limit headers: {response.headers['RateLimit-Remaining']}/{response.headers['RateLimit-Limit']}")
+
+    def test_health_exempt(self):
+        """Test health checks are not rate limited"""
+        response = requests.get(f"{BASE_URL}/api/health/live")
+        assert response.status_code == 200
+        assert "RateLimit-Limit" not in response.headers
+        print("✓ Health exempt from rate limiting")
+
 
 class TestAuthEndpoints:
     """Authentication endpoint tests"""
@@ -180,6 +219,29 @@ class TestWorkspaceEndpoints:
         assert response.status_code == 401
         print("✓ Unauthenticated workspace access rejected")
 
+    def test_workspace_export_job(self, auth_token):
+        """Test background workspace export: job is queued, completes and can be downloaded"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        workspace_id = requests.get(f"{BASE_URL}/api/workspaces", headers=headers).json()[0]["workspace_id"]
+
+        response = requests.post(f"{BASE_URL}/api/workspaces/{workspace_id}/export", headers=headers)
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] in ["pending", "running", "completed"]
+
+        for _ in range(30):
+            job = requests.get(f"{BASE_URL}/api/workspaces/{workspace_id}/exports/{job['job_id']}", headers=headers).json()
+            if job["status"] in ["completed", "failed"]:
+                break
+            time.sleep(1)
+        assert job["status"] == "completed"
+        assert job["download_url"]
+
+        download = requests.get(f"{BASE_URL}{job['download_url']}", headers=headers)
+        assert download.status_code == 200
+        assert download.content[:2] == b"PK"
+        print(f"✓ Workspace export downloaded: {len(download.content)} bytes, counts {job['counts']}")
+
 
 class TestProductEndpoints:
     """Product endpoint tests"""
@@ -300,6 +362,47 @@ class TestCampaignEndpoints:
         assert isinstance(data, list)
         print(f"✓ Campaigns listed: {len(data)} campaign(s)")
 
+    def test_regenerate_campaign_section(self, auth_data):
+        """Test regenerating only the ad variations of an existing campaign"""
+        headers = {"Authorization": f"Bearer {auth_data['token']}"}
+        campaigns = requests.get(
+            f"{BASE_URL}/api/workspaces/{auth_data['workspace_id']}/campaigns", headers=headers
+        ).json()
+        if not campaigns:
+            pytest.skip("No campaign to regenerate")
+        campaign = campaigns[0]
+
+        response = requests.post(
+            f"{BASE_URL}/api/workspaces/{auth_data['workspace_id']}/campaigns/{campaign['campaign_id']}/sections/ads/regenerate",
+            headers=headers,
+            json={"use_rag": False}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["campaign_id"] == campaign["campaign_id"]
+        ads = data["assets"]["ad_variations"]
+        assert isinstance(ads, list) and ads
+        assert all(ad.get("hook") and ad.get("body") and ad.get("cta") for ad in ads)
+        assert data["assets"]["landing_copy"] == campaign["assets"]["landing_copy"]
+        assert "updated_at" in data
+
+        # The regenerated section is stored on the campaign
+        stored = requests.get(
+            f"{BASE_URL}/api/workspaces/{auth_data['workspace_id']}/campaigns/{campaign['campaign_id']}", headers=headers
+        ).json()
+        assert stored["assets"]["ad_variations"] == ads
+        print(f"✓ Campaign section regenerated: {data['campaign_id']} (ads)")
+
+    def test_regenerate_unknown_section(self, auth_data):
+        """Test unknown campaign sections are rejected"""
+        response = requests.post(
+            f"{BASE_URL}/api/workspaces/{auth_data['workspace_id']}/campaigns/camp_missing/sections/intro/regenerate",
+            headers={"Authorization": f"Bearer {auth_data['token']}"}
+        )
+        assert response.status_code == 400
+        print("✓ Unknown campaign section rejected")
+
 
 class TestAdminEndpoints:
     """Admin endpoint tests"""
@@ -0,0 +1,100 @@
+"""
+NOXLOOP Observability Tests
+Tests for the Prometheus metrics endpoint, Server-Timing headers and DB query budgets
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://noxloop-media-studio.preview.emergentagent.com').rstrip('/')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+def metrics_headers():
+    return {"Authorization": f"Bearer {METRICS_TOKEN}"} if METRICS_TOKEN else {}
+
+
+class TestMetricsEndpoint:
+    """Prometheus /metrics endpoint tests"""
+
+    def test_metrics_text_format(self):
+        """Test /metrics returns Prometheus text exposition format"""
+        response = requests.get(f"{BASE_URL}/metrics", headers=metrics_headers())
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE noxloop_http_request_duration_seconds histogram" in response.text
+        assert "# TYPE noxloop_http_requests_in_flight gauge" in response.text
+        print("✓ Metrics endpoint returns Prometheus format")
+
+    def test_metrics_uses_route_templates(self):
+        """Test request latency is labelled by route template, not raw path"""
+        requests.get(f"{BASE_URL}/api/public/product/slug/metrics-test-slug-that-does-not-exist")
+
+        response = requests.get(f"{BASE_URL}/metrics", headers=metrics_headers())
+        assert response.status_code == 200
+        assert 'route="/api/public/product/slug/{slug}"' in response.text
+        assert "metrics-test-slug-that-does-not-exist" not in response.text
+        print("✓ Metrics labelled by route template")
+
+    def test_metrics_requires_token_when_configured(self):
+        """Test /metrics rejects scrapes without the configured token"""
+        if not METRICS_TOKEN:
+            pytest.skip("METRICS_TOKEN not configured")
+        response = requests.get(f"{BASE_URL}/metrics")
+        assert response.status_code == 401
+        print("✓ Metrics endpoint protected by token")
+
+
+class TestServerTiming:
+    """Per-request phase timing exposed via Server-Timing"""
+
+    def test_server_timing_total(self):
+        """Test every response carries a total duration"""
+        response = requests.get(f"{BASE_URL}/api/billing/plans")
+        assert response.status_code == 200
+        assert "total;dur=" in response.headers.get("Server-Timing", "")
+        print(f"✓ Server-Timing: {response.headers['Server-Timing']}")
+
+    def test_server_timing_auth_phase(self):
+        """Test authenticated requests report the auth phase"""
+        response = requests.get(f"{BASE_URL}/api/auth/me", headers={"Authorization": "Bearer invalid.token.value"})
+        assert response.status_code == 401
+        assert "auth;" in response.headers.get("Server-Timing", "")
+        print("✓ Server-Timing includes auth phase")
+
+
+class TestQueryBudgets:
+    """MongoDB commands per request, reported in X-DB-Queries"""
+
+    @pytest.fixture(scope="class")
+    def auth_data(self):
+        response = requests.post(f"{BASE_URL}/api/auth/register", json={
+            "email": f"test_budget_{uuid.uuid4().hex[:8]}@test.com",
+            "password": "testpass123",
+            "name": "Budget Test"
+        })
+        if response.status_code != 200:
+            pytest.skip(f"Registration failed: {response.text}")
+        data = response.json()
+        return {"token": data["token"], "workspace_id": data["default_workspace_id"]}
+
+    def test_list_products_query_budget(self, auth_data):
+        """Test product listing stays within auth + membership + list"""
+        response = requests.get(
+            f"{BASE_URL}/api/workspaces/{auth_data['workspace_id']}/products",
+            headers={"Authorization": f"Bearer {auth_data['token']}"}
+        )
+        assert response.status_code == 200
+        assert int(response.headers["X-DB-Queries"]) <= 3
+        print(f"✓ List products issued {response.headers['X-DB-Queries']} queries")
+
+    def test_members_query_budget(self, auth_data):
+        """Test member listing does not issue one user lookup per member"""
+        response = requests.get(
+            f"{BASE_URL}/api/workspaces/{auth_data['workspace_id']}/members",
+            headers={"Authorization": f"Bearer {auth_data['token']}"}
+        )
+        assert response.status_code == 200
+        assert int(response.headers["X-DB-Queries"]) <= 4
+        print(f"✓ List members issued {response.headers['X-DB-Queries']} queries")
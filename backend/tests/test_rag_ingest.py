@@ -0,0 +1,83 @@
+"""
+NOXLOOP RAG Ingestion Tests
+In-process tests for the ingestion worker against an embedded BM25 index
+(needs mongomock_motor; skipped without it)
+"""
+import asyncio
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from services import rag_ingest
+from services.bm25_index import BM25RetrievalBackend
+from services.rag_client import rag_client
+
+
+PRODUCT = {
+    "product_id": "prod_rag_test",
+    "title": "Guia de tráfego pago",
+    "description": "Como estruturar campanhas de anúncios para infoprodutos",
+    "is_published": True,
+}
+TEMPLATE = {
+    "template_id": "tpl_rag_test",
+    "name": "Sequência de lançamento",
+    "description": "Emails para aquecer a lista antes do carrinho abrir",
+    "prompt_template": "Escreve 5 emails de lançamento para {product}",
+}
+
+
+@pytest.fixture
+def embedded_index(monkeypatch, tmp_path):
+    """Point the global RAG client at a fresh BM25 index under tmp_path"""
+    monkeypatch.setattr(rag_client, "enabled", True)
+    monkeypatch.setattr(rag_client, "backend_name", "bm25")
+    monkeypatch.setattr(rag_client, "cache", None)
+    monkeypatch.setattr(rag_ingest, "RAG_INGEST_ENABLED", True)
+
+    def open_index(name):
+        backend = BM25RetrievalBackend(str(tmp_path / name))
+        monkeypatch.setattr(rag_client, "backend", backend)
+        return backend
+
+    return open_index
+
+
+async def _drain(ingestor):
+    await ingestor._reindex_task
+    await ingestor._queue.join()
+
+
+class TestReindex:
+    """POST /api/admin/rag/reindex behaviour (RAGIngestor.reindex)"""
+
+    def test_reindex_rebuilds_empty_index_from_rag_sources(self, embedded_index):
+        """A wiped index is rebuilt even though every content hash in rag_sources still matches"""
+        async def scenario():
+            db = mongomock_motor.AsyncMongoMockClient()["noxloop_test"]
+            await db.products.insert_one(dict(PRODUCT))
+            await db.templates.insert_one(dict(TEMPLATE))
+
+            backend = embedded_index("index")
+            ingestor = rag_ingest.RAGIngestor()
+            ingestor.start(db)
+            try:
+                assert ingestor.reindex()
+                await _drain(ingestor)
+                assert await db.rag_sources.count_documents({}) == 2
+                assert len(backend.index) > 0
+
+                # Index directory wiped (or a new backend/embedder): rag_sources is unchanged
+                backend = embedded_index("index_wiped")
+                assert len(backend.index) == 0
+                assert await ingestor.ingest("product", PRODUCT["product_id"]) == "unchanged"
+
+                assert ingestor.reindex()
+                await _drain(ingestor)
+                sources = {doc["metadata"]["kind"] for doc in await backend.retrieve("campanhas anúncios emails", 10)}
+                assert sources == {"product", "template"}
+            finally:
+                await ingestor.stop()
+
+        asyncio.run(scenario())
+        print("✓ Reindex rebuilds a wiped index from rag_sources")
@@ -0,0 +1 @@
+"""Operational tools - run as modules from backend/ (not imported by the app)"""
@@ -0,0 +1,243 @@
+"""
+Query Plan Audit
+Runs explain() for every query shape the API issues and flags collection
+scans, in-memory sorts and poor examined/returned ratios.
+
+Run (from backend/):
+    python -m tools.query_audit --mongo-url mongodb://localhost:27017 --db-name noxloop
+    python -m tools.query_audit --json --fail-on-issues     # for release pipelines
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List, Optional
+
+from pymongo import MongoClient
+
+DEFAULT_RATIO_THRESHOLD = 10.0  # docs examined per doc returned
+
+
+class QueryShape:
+    """One query the API issues; filter/sort are built from a sample document
+    so the explain runs with realistic values"""
+
+    def __init__(
+        self, name: str, collection: str, build_filter: Callable[[Dict[str, Any]], Dict[str, Any]],
+        sort: Optional[Dict[str, int]] = None, limit: int = 0, count: bool = False, suggested_index: str = ""
+    ):
+        self.name = name
+        self.collection = collection
+        self.build_filter = build_filter
+        self.sort = sort
+        self.limit = limit
+        self.count = count
+        self.suggested_index = suggested_index
+
+
+def _v(sample: Dict[str, Any], field: str, default: Any = "missing") -> Any:
+    return sample.get(field, default)
+
+
+TODAY = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+# Mirrors the queries in server.py - keep in sync when adding endpoints
+QUERY_SHAPES: List[QueryShape] = [
+    # Auth / users
+    QueryShape("user by email (login/register)", "users", lambda s: {"email": _v(s, "email")}, limit=1,
+               suggested_index="users: {email: 1} unique"),
+    QueryShape("user by id (get_current_user)", "users", lambda s: {"user_id": _v(s, "user_id")}, limit=1,
+               suggested_index="users: {user_id: 1} unique"),
+    QueryShape("users by id list (members)", "users", lambda s: {"user_id": {"$in": [_v(s, "user_id")]}},
+               suggested_index="users: {user_id: 1} unique"),
+    # Workspaces / membership
+    QueryShape("membership check", "workspace_members",
+               lambda s: {"workspace_id": _v(s, "workspace_id"), "user_id": _v(s, "user_id")}, limit=1,
+               suggested_index="workspace_members: {workspace_id: 1, user_id: 1} unique"),
+    QueryShape("default membership", "workspace_members", lambda s: {"user_id": _v(s, "user_id")}, limit=1,
+               suggested_index="workspace_members: {user_id: 1}"),
+    QueryShape("memberships by user", "workspace_members", lambda s: {"user_id": _v(s, "user_id")},
+               suggested_index="workspace_members: {user_id: 1}"),
+    QueryShape("members by workspace", "workspace_members", lambda s: {"workspace_id": _v(s, "workspace_id")},
+               suggested_index="workspace_members: {workspace_id: 1, user_id: 1} unique"),
+    QueryShape("workspace by id", "workspaces", lambda s: {"workspace_id": _v(s, "workspace_id")}, limit=1,
+               suggested_index="workspaces: {workspace_id: 1} unique"),
+    # Products
+    QueryShape("product list by workspace", "products", lambda s: {"workspace_id": _v(s, "workspace_id")},
+               sort={"created_at": -1}, limit=100, suggested_index="products: {workspace_id: 1, created_at: -1}"),
+    QueryShape("product by id + workspace", "products",
+               lambda s: {"product_id": _v(s, "product_id"), "workspace_id": _v(s, "workspace_id")}, limit=1,
+               suggested_index="products: {product_id: 1} unique"),
+    QueryShape("public catalog", "products", lambda s: {"is_published": True},
+               sort={"created_at": -1}, limit=50, suggested_index="products: {is_published: 1, created_at: -1}"),
+    QueryShape("public catalog by type", "products",
+               lambda s: {"is_published": True, "product_type": _v(s, "product_type", "guide")},
+               sort={"created_at": -1}, limit=50,
+               suggested_index="products: {is_published: 1, product_type: 1, created_at: -1}"),
+    QueryShape("public catalog count", "products", lambda s: {"is_published": True}, count=True,
+               suggested_index="products: {is_published: 1, created_at: -1}"),
+    QueryShape("published product by id", "products",
+               lambda s: {"product_id": _v(s, "product_id"), "is_published": True}, limit=1,
+               suggested_index="products: {product_id: 1} unique"),
+    QueryShape("slug lookup", "products", lambda s: {"slug": _v(s, "slug"), "is_published": True}, limit=1,
+               suggested_index="products: {slug: 1} unique sparse"),
+    QueryShape("slug uniqueness check", "products",
+               lambda s: {"slug": _v(s, "slug"), "product_id": {"$ne": _v(s, "product_id")}}, limit=1,
+               suggested_index="products: {slug: 1} unique sparse"),
+    # Campaigns
+    QueryShape("campaign list by workspace", "campaigns", lambda s: {"workspace_id": _v(s, "workspace_id")},
+               sort={"created_at": -1}, limit=100, suggested_index="campaigns: {workspace_id: 1, created_at: -1}"),
+    QueryShape("campaign by id + workspace", "campaigns",
+               lambda s: {"campaign_id": _v(s, "campaign_id"), "workspace_id": _v(s, "workspace_id")}, limit=1,
+               suggested_index="campaigns: {campaign_id: 1} unique"),
+    # Usage counts (admin stats)
+    QueryShape("usage today (prefix regex)", "usage", lambda s: {"created_at": {"$regex": f"^{TODAY}"}}, count=True,
+               suggested_index="usage: {created_at: 1}"),
+    QueryShape("generation count", "usage", lambda s: {"action": {"$in": ["generation", "campaign_generation"]}},
+               count=True, suggested_index="usage: {action: 1}"),
+    QueryShape("export count", "usage", lambda s: {"action": "export"}, count=True,
+               suggested_index="usage: {action: 1}"),
+    # Purchases / payments
+    QueryShape("purchase check", "purchases",
+               lambda s: {"user_id": _v(s, "user_id"), "product_id": _v(s, "product_id"), "status": "completed"}, limit=1,
+               suggested_index="purchases: {user_id: 1, product_id: 1, status: 1}"),
+    QueryShape("purchase by stripe session", "purchases",
+               lambda s: {"stripe_session_id": _v(s, "stripe_session_id"), "user_id": _v(s, "user_id")}, limit=1,
+               suggested_index="purchases: {stripe_session_id: 1} sparse"),
+    QueryShape("my purchases", "purchases", lambda s: {"user_id": _v(s, "user_id"), "status": "completed"},
+               sort={"purchased_at": -1}, limit=100, suggested_index="purchases: {user_id: 1, status: 1, purchased_at: -1}"),
+    QueryShape("payment idempotency", "payments", lambda s: {"provider_id": _v(s, "provider_id")}, limit=1,
+               suggested_index="payments: {provider_id: 1} unique"),
+    QueryShape("payment history", "payments", lambda s: {"user_id": _v(s, "user_id")},
+               sort={"created_at": -1}, limit=50, suggested_index="payments: {user_id: 1, created_at: -1}"),
+    QueryShape("webhook idempotency", "webhook_events", lambda s: {"event_id": _v(s, "event_id")}, limit=1,
+               suggested_index="webhook_events: {event_id: 1} unique"),
+    QueryShape("password reset token", "password_resets", lambda s: {"token": _v(s, "token")}, limit=1,
+               suggested_index="password_resets: {token: 1}"),
+    # Media / templates
+    QueryShape("media by id", "media_assets", lambda s: {"asset_id": _v(s, "asset_id")}, limit=1,
+               suggested_index="media_assets: {asset_id: 1} unique"),
+    QueryShape("media list by type", "media_assets", lambda s: {"type": _v(s, "type", "image")},
+               sort={"created_at": -1}, limit=100, suggested_index="media_assets: {type: 1, created_at: -1}"),
+    QueryShape("template list", "templates", lambda s: {}, sort={"created_at": -1}, limit=100,
+               suggested_index="templates: {created_at: -1}"),
+    QueryShape("template by id", "templates", lambda s: {"template_id": _v(s, "template_id")}, limit=1,
+               suggested_index="templates: {template_id: 1} unique"),
+]
+
+
+def _stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten the stage names of a (classic or SBE) plan tree"""
+    plan = plan.get("queryPlan", plan)
+    stages = [plan.get("stage", "?")]
+    if "inputStage" in plan:
+        stages.extend(_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_stages(child))
+    return stages
+
+
+def analyze(explain: Dict[str, Any], ratio_threshold: float) -> Dict[str, Any]:
+    """Extract plan stages and execution stats from an explain document and list issues"""
+    planner = explain.get("queryPlanner", {})
+    stages = _stages(planner.get("winningPlan", {}))
+    stats = explain.get("executionStats", {})
+    returned = stats.get("nReturned", 0)
+    docs_examined = stats.get("totalDocsExamined", 0)
+    keys_examined = stats.get("totalKeysExamined", 0)
+    ratio = docs_examined / max(returned, 1)
+
+    issues = []
+    if "COLLSCAN" in stages:
+        issues.append("COLLSCAN")
+    if "SORT" in stages:
+        issues.append("IN_MEMORY_SORT")
+    if docs_examined and ratio > ratio_threshold:
+        issues.append(f"EXAMINED_RATIO {ratio:.1f}")
+
+    return {
+        "stages": stages,
+        "n_returned": returned,
+        "docs_examined": docs_examined,
+        "keys_examined": keys_examined,
+        "examined_ratio": round(ratio, 2),
+        "execution_ms": stats.get("executionTimeMillis", 0),
+        "issues": issues
+    }
+
+
+def explain_shape(db, shape: QueryShape) -> Dict[str, Any]:
+    sample = db[shape.collection].find_one({}, {"_id": 0}) or {}
+    query = shape.build_filter(sample)
+    if shape.count:
+        command = {"count": shape.collection, "query": query}
+    else:
+        command = {"find": shape.collection, "filter": query}
+        if shape.sort:
+            command["sort"] = shape.sort
+        if shape.limit:
+            command["limit"] = shape.limit
+    return db.command("explain", command, verbosity="executionStats")
+
+
+def audit(db, ratio_threshold: float = DEFAULT_RATIO_THRESHOLD) -> List[Dict[str, Any]]:
+    rows = []
+    for shape in QUERY_SHAPES:
+        row = {
+            "name": shape.name,
+            "collection": shape.collection,
+            "documents": db[shape.collection].estimated_document_count(),
+            "suggested_index": shape.suggested_index
+        }
+        try:
+            row.update(analyze(explain_shape(db, shape), ratio_threshold))
+        except Exception as e:
+            row.update(stages=[], issues=[f"EXPLAIN_FAILED {e}"])
+        rows.append(row)
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    width = max(len(r["name"]) for r in rows)
+    print(f"{'query':<{width}}  {'collection':<18} {'docs':>8} {'examined':>9} {'returned':>9}  plan / issues")
+    for r in rows:
+        plan = ">".join(r.get("stages", []))
+        issues = ", ".join(r["issues"])
+        print(f"{r['name']:<{width}}  {r['collection']:<18} {r['documents']:>8} {r.get('docs_examined', 0):>9} "
+              f"{r.get('n_returned', 0):>9}  {plan}{'  !! ' + issues if issues else ''}")
+    flagged = [r for r in rows if r["issues"]]
+    if flagged:
+        print(f"\n{len(flagged)} of {len(rows)} query shapes need attention. Suggested indexes:")
+        for index in sorted({r["suggested_index"] for r in flagged if r["suggested_index"]}):
+            print(f"  - {index}")
+    else:
+        print(f"\nAll {len(rows)} query shapes are index-backed.")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Explain every API query shape and flag unindexed ones")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "noxloop"))
+    parser.add_argument("--ratio-threshold", type=float, default=DEFAULT_RATIO_THRESHOLD,
+                        help="Flag queries examining more than this many docs per doc returned")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    parser.add_argument("--fail-on-issues", action="store_true", help="Exit 1 if any query shape is flagged")
+    args = parser.parse_args(argv)
+
+    client = MongoClient(args.mongo_url, serverSelectionTimeoutMS=5000)
+    try:
+        rows = audit(client[args.db_name], args.ratio_threshold)
+    finally:
+        client.close()
+
+    if args.json:
+        print(json.dumps({"db_name": args.db_name, "results": rows}, indent=2, default=str))
+    else:
+        print_report(rows)
+
+    return 1 if args.fail_on_issues and any(r["issues"] for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())